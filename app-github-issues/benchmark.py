@@ -0,0 +1,166 @@
+"""Retrieval benchmark of ContextManager on a synthetic issue corpus.
+
+For every corpus size it measures:
+- ingest rate of add_contexts in contexts per second, including embedding
+- latency p50/p99 of search for new queries, of repeated queries served from the
+  query embedding cache, and per query of one search_many call for all queries
+- recall@k of the approximate (HNSW) search of Chroma against an exact search
+
+The queries are reworded issues from the corpus. The exact top k is computed with
+a brute force dot product over the same embeddings, so recall measures the loss of
+the approximate index only, not the quality of the embeddings.
+
+Run with: python benchmark.py --sizes 10000 100000 1000000 --backend hashing
+"""
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from context_manager import ContextManager
+from embeddings import EMBEDDING_BACKENDS, create_embeddings
+
+COMPONENTS = ["login", "checkout", "search", "profile", "payments", "reports", "export", "notifications", "dashboard", "api gateway", "mobile app", "admin panel"]
+SYMPTOMS = ["crashes", "times out", "returns 500", "is slow", "shows a blank page", "loses data", "logs out the user", "shows wrong totals", "fails to load", "hangs"]
+TRIGGERS = ["after the last release", "on Safari", "for users with many orders", "when the session expires", "with special characters in the name", "under heavy load", "on the first request", "after a password reset", "when the cache is cold", "in the EU region"]
+ERRORS = ["NullReferenceException", "TimeoutError", "HTTP 429", "ConnectionResetError", "KeyError", "OutOfMemoryError", "ValueError", "HTTP 503", "SSL handshake failed", "deadlock detected"]
+FILLER = ["steps", "expected", "actual", "browser", "version", "customer", "reported", "support", "ticket", "urgent", "workaround", "intermittent", "reproduce", "environment", "production", "staging"]
+
+
+def synthetic_issue(rng: random.Random, number: int) -> Tuple[str, str]:
+    component = rng.choice(COMPONENTS)
+    text = (
+        f"{component.capitalize()} {rng.choice(SYMPTOMS)} {rng.choice(TRIGGERS)}. "
+        f"Error: {rng.choice(ERRORS)} in module {component.replace(' ', '_')}_{rng.randrange(50)}. "
+        + " ".join(rng.choice(FILLER) for _ in range(rng.randrange(5, 20)))
+    )
+    return f"issue-{number}", text
+
+
+def corpus(size: int, seed: int) -> Iterator[Tuple[str, str]]:
+    rng = random.Random(seed)
+    for number in range(size):
+        yield synthetic_issue(rng, number)
+
+
+def reworded(rng: random.Random, text: str) -> str:
+    # Drop some words and shuffle the tail, like a user describing the same issue differently
+    words = text.split()
+    kept = [word for word in words if rng.random() > 0.25]
+    head, tail = kept[:8], kept[8:]
+    rng.shuffle(tail)
+    return " ".join(head + tail)
+
+
+def exact_top_k(size: int, seed: int, embeddings, query_vectors: np.ndarray, k: int, chunk: int = 10000) -> List[List[str]]:
+    """The keys of the k most similar issues for every query, by brute force in chunks."""
+    best_scores = np.full((len(query_vectors), k), -np.inf, dtype=np.float32)
+    best_keys = np.empty((len(query_vectors), k), dtype=object)
+    batch: List[Tuple[str, str]] = []
+    for item in corpus(size, seed):
+        batch.append(item)
+        if len(batch) == chunk:
+            _merge_top_k(batch, embeddings, query_vectors, best_scores, best_keys, k)
+            batch = []
+    if batch:
+        _merge_top_k(batch, embeddings, query_vectors, best_scores, best_keys, k)
+    return [list(row) for row in best_keys]
+
+
+def _merge_top_k(batch, embeddings, query_vectors, best_scores, best_keys, k) -> None:
+    vectors = np.asarray(embeddings.embed_documents([text for _, text in batch]), dtype=np.float32)
+    keys = np.array([key for key, _ in batch], dtype=object)
+    scores = query_vectors @ vectors.T
+    all_scores = np.concatenate([best_scores, scores], axis=1)
+    all_keys = np.concatenate([best_keys, np.broadcast_to(keys, scores.shape)], axis=1)
+    order = np.argsort(-all_scores, axis=1)[:, :k]
+    best_scores[:] = np.take_along_axis(all_scores, order, axis=1)
+    best_keys[:] = np.take_along_axis(all_keys, order, axis=1)
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def run(size: int, backend: str, model: str, queries: int, k: int, batch_size: int, seed: int) -> Dict[str, float]:
+    directory = tempfile.mkdtemp(prefix="context-bench-")
+    try:
+        embeddings = create_embeddings(backend, model)
+        manager = ContextManager(directory, embeddings, batch_size=batch_size)
+
+        start = time.perf_counter()
+        ingest_batch: List[Tuple[str, str]] = []
+        for item in corpus(size, seed):
+            ingest_batch.append(item)
+            if len(ingest_batch) == 10000:
+                manager.add_contexts(ingest_batch)
+                ingest_batch = []
+        if ingest_batch:
+            manager.add_contexts(ingest_batch)
+        ingest_seconds = time.perf_counter() - start
+
+        # Queries are rewordings of random issues of the corpus
+        rng = random.Random(seed + 1)
+        targets = set(rng.sample(range(size), min(queries, size)))
+        texts = [reworded(rng, text) for number, (_, text) in enumerate(corpus(size, seed)) if number in targets]
+
+        latencies = []
+        found = []
+        for text in texts:
+            start = time.perf_counter()
+            results = manager.search(text, k=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found.append([result["key"] for result in results])
+        repeated = []
+        for text in texts:
+            start = time.perf_counter()
+            manager.get_context(text)
+            repeated.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        manager.search_many(texts, k=k)
+        batch_ms = (time.perf_counter() - start) * 1000 / len(texts)
+
+        query_vectors = np.asarray([embeddings.embed_query(text) for text in texts], dtype=np.float32)
+        exact = exact_top_k(size, seed, embeddings, query_vectors, k)
+        recall = statistics.mean(len(set(approximate) & set(truth)) / k for approximate, truth in zip(found, exact))
+        return {
+            "documents": size,
+            "ingest_per_second": round(size / ingest_seconds),
+            "query_p50_ms": round(statistics.median(latencies), 2),
+            "query_p99_ms": round(percentile(latencies, 0.99), 2),
+            "repeated_p50_ms": round(statistics.median(repeated), 2),
+            "batched_ms_per_query": round(batch_ms, 2),
+            f"recall@{k}": round(recall, 3),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark ingest, query latency and recall of ContextManager.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="Corpus sizes (default: 10000 100000)")
+    parser.add_argument("--backend", default="hashing", choices=EMBEDDING_BACKENDS, help="Embedding backend (default: hashing)")
+    parser.add_argument("--model", default=None, help="Model of the backend, the number of features for hashing (default: the backend default)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per corpus size (default: 200)")
+    parser.add_argument("--k", type=int, default=10, help="Results per query for recall@k (default: 10)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="add_contexts batch size (default: 1000)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the synthetic corpus (default: 42)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    for size in args.sizes:
+        report = run(size, args.backend, args.model, args.queries, args.k, args.batch_size, args.seed)
+        print("  ".join(f"{name}={value}" for name, value in report.items()), flush=True)
+
+
+if __name__ == "__main__":
+    main()
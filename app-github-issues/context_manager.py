@@ -1,17 +1,155 @@
+import hashlib
 import os
-from langchain.vectorstores import Chroma
-from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.schema import Document
+import chromadb
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from embedding_cache import CachedEmbeddings, EmbeddingCache, model_name
+from embeddings import create_embeddings
+
+COLLECTION_NAME = "langchain"
 
 class ContextManager:
-    def __init__(self):
-        self.embeddings = OpenAIEmbeddings()
-        self.vectorstore = Chroma(embedding_function=self.embeddings, persist_directory="./context_db")
+    def __init__(self, persist_directory="./context_db", embeddings=None, batch_size=256, query_cache_size=1024):
+        """embeddings is an Embeddings instance or a backend name from embeddings.EMBEDDING_BACKENDS.
+        It defaults to the CONTEXT_EMBEDDINGS backend (default: openai) and CONTEXT_EMBEDDINGS_MODEL."""
+        os.makedirs(persist_directory, exist_ok=True)
+        if embeddings is None or isinstance(embeddings, str):
+            embeddings = create_embeddings(embeddings or os.getenv("CONTEXT_EMBEDDINGS", "openai"), os.getenv("CONTEXT_EMBEDDINGS_MODEL"))
+        # Embeddings are cached on disk per model and text, so unchanged contexts are never embedded again
+        self.embeddings = CachedEmbeddings(
+            embeddings,
+            EmbeddingCache(os.path.join(persist_directory, "embedding_cache.sqlite3")),
+            model_name(embeddings),
+            batch_size,
+            query_cache_size,
+        )
+        self.batch_size = batch_size
+        # New stores rank by cosine distance, stores created before keep their distance
+        collection_metadata = {"hnsw:space": "cosine"}
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        # The collection of the vector store, opened through the public chromadb API for batched queries
+        self.collection = self.client.get_or_create_collection(COLLECTION_NAME, metadata=collection_metadata, embedding_function=None)
+        self.vectorstore = Chroma(
+            collection_name=COLLECTION_NAME,
+            embedding_function=self.embeddings,
+            client=self.client,
+            collection_metadata=collection_metadata,
+        )
 
     def add_context(self, key, value):
-        doc = Document(page_content=value, metadata={"key": key})
-        self.vectorstore.add_documents([doc])
+        return self.add_contexts([(key, value)])
+
+    def add_contexts(self, contexts):
+        """Add many (key, value) pairs, or a dict of them, in batches.
+
+        Contexts are identified by a hash of key and value, so contexts that are
+        already stored or repeated in the input are skipped. Only values missing
+        from the embedding cache are embedded. Returns counts of what was done.
+        """
+        items = contexts.items() if isinstance(contexts, dict) else contexts
+        unique = {}
+        total = 0
+        for key, value in items:
+            total += 1
+            unique.setdefault(_context_id(key, value), (key, value))
+
+        misses = self.embeddings.misses
+        added = 0
+        pending = list(unique.items())
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            existing = set(self.vectorstore.get(ids=[context_id for context_id, _ in batch], include=[])["ids"])
+            new = [(context_id, key, value) for context_id, (key, value) in batch if context_id not in existing]
+            if not new:
+                continue
+            # One write per batch, embedded through the cache
+            self.vectorstore.add_texts(
+                texts=[value for _, _, value in new],
+                metadatas=[{"key": key} for _, key, _ in new],
+                ids=[context_id for context_id, _, _ in new],
+            )
+            added += len(new)
+        return {
+            "received": total,
+            "added": added,
+            "skipped": total - added,
+            "embedded": self.embeddings.misses - misses,
+        }
 
     def get_context(self, query):
-        results = self.vectorstore.similarity_search(query, k=1)
-        return results[0].page_content if results else "No relevant context found."
\ No newline at end of file
+        results = self.search(query, k=1)
+        return results[0]["content"] if results else "No relevant context found."
+
+    def search(self, query, k=4, key=None, filter=None, mmr=False, fetch_k=20, lambda_mult=0.5):
+        """The k contexts most relevant to the query, see search_many."""
+        return self.search_many([query], k, key, filter, mmr, fetch_k, lambda_mult)[0]
+
+    def search_many(self, queries, k=4, key=None, filter=None, mmr=False, fetch_k=20, lambda_mult=0.5):
+        """The k most relevant contexts for each of many queries, most relevant first.
+
+        The queries are embedded in one call and searched together in one vector store query.
+        Every result is a dict with key, content, score (cosine similarity, higher is more relevant) and metadata.
+
+        Args:
+            key: Only search contexts with this key, or with one of a list of keys
+            filter: Chroma metadata filter, like {"key": {"$ne": "issue-1"}}, combined with key
+            mmr: Diversify the results with maximal marginal relevance among the fetch_k most similar contexts
+            lambda_mult: With mmr, 1 ranks by relevance only and 0 by diversity only
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        vectors = self.embeddings.embed_queries(queries)
+        include = ["documents", "metadatas", "distances"] + (["embeddings"] if mmr else [])
+        # The langchain wrapper searches one query at a time, the collection takes all of them at once
+        results = self.collection.query(
+            query_embeddings=vectors,
+            n_results=max(k, fetch_k) if mmr else k,
+            where=_where(key, filter),
+            include=include,
+        )
+        similarity = _similarity_fn(self.collection)
+        found = []
+        for number, vector in enumerate(vectors):
+            documents = results["documents"][number]
+            metadatas = results["metadatas"][number]
+            distances = results["distances"][number]
+            order = range(min(k, len(documents)))
+            if mmr and documents:
+                order = maximal_marginal_relevance(np.array(vector, dtype=np.float32), results["embeddings"][number], lambda_mult=lambda_mult, k=k)
+            found.append([
+                {
+                    "key": (metadatas[index] or {}).get("key"),
+                    "content": documents[index],
+                    "score": round(similarity(distances[index]), 4),
+                    "metadata": metadatas[index] or {},
+                }
+                for index in order
+            ])
+        return found
+
+
+def _similarity_fn(collection):
+    # Cosine similarity from the distance of the collection. Chroma's l2 is squared, which for
+    # normalized embeddings is 2 - 2 * cosine similarity, and ip is 1 - the inner product
+    configuration = getattr(collection, "configuration", None) or {}
+    space = (collection.metadata or {}).get("hnsw:space") or (configuration.get("hnsw") or {}).get("space") or "l2"
+    if space == "l2":
+        return lambda distance: 1 - distance / 2
+    return lambda distance: 1 - distance
+
+
+def _where(key, filter):
+    conditions = [filter] if filter else []
+    if isinstance(key, (list, tuple, set)):
+        conditions.append({"key": {"$in": list(key)}})
+    elif key is not None:
+        conditions.append({"key": key})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def _context_id(key, value):
+    return hashlib.sha256(f"{key}\0{value}".encode("utf-8")).hexdigest()
@@ -0,0 +1,143 @@
+"""Persistent embedding cache, so the same text is only embedded once per model."""
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+# sqlite limits the number of parameters of a statement
+_LOOKUP_CHUNK = 500
+
+# Backends that embed a query the same way as a document, so a batch of queries can be
+# embedded with one embed_documents call. Others may prefix queries with an instruction.
+QUERIES_AS_DOCUMENTS = ("HashingEmbeddings", "OpenAIEmbeddings")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """sqlite table of embeddings keyed on (model, text hash), stored as float32."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, text_hash))"
+            )
+
+    def get_many(self, model: str, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        hashes = list(hashes)
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), _LOOKUP_CHUNK):
+                chunk = hashes[start:start + _LOOKUP_CHUNK]
+                rows = self._db.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({', '.join('?' for _ in chunk)})",
+                    (model, *chunk),
+                )
+                for hash_, vector in rows:
+                    found[hash_] = array("f", vector).tolist()
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        # One transaction for the whole batch
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, hash_, array("f", vector).tobytes()) for hash_, vector in vectors.items()],
+            )
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings that look up the cache first and embed the misses in batches.
+
+    Args:
+        embeddings: The embedding model to use for texts that aren't cached
+        cache: Where the embeddings are kept
+        model: Cache namespace of the model, embeddings of different models never mix
+        batch_size: Texts per call to the embedding model
+        query_cache_size: Query embeddings kept in memory, least recently used first out
+        batch_queries: Embed the queries of embed_queries with one embed_documents call. Default:
+            only for the backends in QUERIES_AS_DOCUMENTS, others get one embed_query call per query
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model: str, batch_size: int = 256, query_cache_size: int = 1024, batch_queries: Optional[bool] = None):
+        self.embeddings = embeddings
+        self.batch_queries = type(embeddings).__name__ in QUERIES_AS_DOCUMENTS if batch_queries is None else batch_queries
+        self.cache = cache
+        self.model = model
+        self.batch_size = batch_size
+        self.query_cache_size = query_cache_size
+        self.hits = 0
+        self.misses = 0
+        self.query_hits = 0
+        self.query_misses = 0
+        self._queries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model, set(hashes))
+        missing = {}
+        for hash_, text in zip(hashes, texts):
+            if hash_ not in vectors:
+                missing.setdefault(hash_, text)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        missing_items = list(missing.items())
+        for start in range(0, len(missing_items), self.batch_size):
+            batch = missing_items[start:start + self.batch_size]
+            embedded = dict(zip((hash_ for hash_, _ in batch), self.embeddings.embed_documents([text for _, text in batch])))
+            self.cache.put_many(self.model, embedded)
+            vectors.update(embedded)
+        return [vectors[hash_] for hash_ in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Repeated queries skip the embedding model, which can be a network round trip
+        vector = self._cached_query(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._cache_queries({text: vector})
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries, with the ones that aren't cached in a single call to the embedding model if batch_queries is set."""
+        vectors = {text: self._cached_query(text) for text in texts}
+        missing = [text for text, vector in vectors.items() if vector is None]
+        if len(missing) > 1 and self.batch_queries:
+            embedded = dict(zip(missing, self.embeddings.embed_documents(missing)))
+        else:
+            embedded = {text: self.embeddings.embed_query(text) for text in missing}
+        self._cache_queries(embedded)
+        vectors.update(embedded)
+        return [vectors[text] for text in texts]
+
+    def _cached_query(self, text: str) -> Optional[List[float]]:
+        with self._query_lock:
+            vector = self._queries.get(text)
+            if vector is not None:
+                self._queries.move_to_end(text)
+                self.query_hits += 1
+            return vector
+
+    def _cache_queries(self, vectors: Dict[str, List[float]]) -> None:
+        with self._query_lock:
+            self.query_misses += len(vectors)
+            self._queries.update(vectors)
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+
+
+def model_name(embeddings: Embeddings) -> str:
+    """Cache namespace of an embedding model: its class and model name."""
+    name = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or ""
+    return f"{type(embeddings).__name__}:{name}"
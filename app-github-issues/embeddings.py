@@ -0,0 +1,74 @@
+"""Embedding backends for ContextManager.
+
+- openai: OpenAI embeddings, needs OPENAI_API_KEY and a network round trip per call
+- hashing: Local, CPU only feature hashing of words and word pairs. No model download
+  or API key, which makes it useful for offline use, tests and benchmarks
+- sentence-transformers: A local sentence transformer model. Needs pip install sentence-transformers
+"""
+import math
+import re
+import zlib
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_BACKENDS = ("openai", "hashing", "sentence-transformers")
+DEFAULT_SENTENCE_TRANSFORMER = "all-MiniLM-L6-v2"
+
+_WORD = re.compile(r"\w+")
+
+
+def create_embeddings(backend: str = "openai", model: Optional[str] = None) -> Embeddings:
+    """Create the embeddings of a backend, see EMBEDDING_BACKENDS."""
+    if backend == "openai":
+        from langchain_community.embeddings import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=model) if model else OpenAIEmbeddings()
+    if backend == "hashing":
+        return HashingEmbeddings(int(model) if model else 512)
+    if backend == "sentence-transformers":
+        try:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            import sentence_transformers  # noqa: F401
+        except ImportError as e:
+            raise ImportError("The sentence-transformers backend needs sentence-transformers, install it with: pip install sentence-transformers") from e
+        return HuggingFaceEmbeddings(model_name=model or DEFAULT_SENTENCE_TRANSFORMER)
+    raise ValueError(f"Unknown embedding backend '{backend}'. Use one of: {', '.join(EMBEDDING_BACKENDS)}")
+
+
+class HashingEmbeddings(Embeddings):
+    """Feature hashing of lowercased words and adjacent word pairs into n_features dimensions.
+
+    Every feature is hashed to a dimension and a sign, weighted by 1 + log of its count
+    and the vector is normalized to unit length, so the dot product is the cosine
+    similarity. Texts sharing words and phrases end up close, without any model.
+    """
+
+    def __init__(self, n_features: int = 512):
+        self.n_features = n_features
+        self.model = f"hashing-{n_features}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        words = _WORD.findall(text.lower())
+        counts = {}
+        for feature in words + [f"{first} {second}" for first, second in zip(words, words[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+        # Only the few dimensions that are used, the vector is built at the end
+        sparse = {}
+        for feature, count in counts.items():
+            hashed = zlib.crc32(feature.encode("utf-8"))
+            weight = 1.0 + math.log(count)
+            # The lowest bit picks the sign, so collisions cancel out on average
+            dimension = (hashed >> 1) % self.n_features
+            sparse[dimension] = sparse.get(dimension, 0.0) + (weight if hashed & 1 else -weight)
+        vector = [0.0] * self.n_features
+        norm = math.sqrt(sum(value * value for value in sparse.values()))
+        if norm:
+            for dimension, value in sparse.items():
+                vector[dimension] = value / norm
+        return vector
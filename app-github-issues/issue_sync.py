@@ -0,0 +1,227 @@
+"""Incremental sync of the issues of a GitHub repository into a local sqlite store.
+
+Every run only asks GitHub for issues updated since the last run (the checkpoint),
+sorted by update time. The first page tells how many pages there are through the
+Link header, and the remaining pages are fetched concurrently. The first page is
+always fetched in full, as a 304 has no Link header to tell the number of pages.
+The ETags of the other pages are stored and sent back with If-None-Match, and
+GitHub answers unchanged pages with 304 Not Modified, which doesn't count against
+the rate limit. ETags of pages of an earlier checkpoint are removed.
+
+Every run starts with a probe for the most recently updated issue. Its URL never
+changes, so its ETag from the last run answers whether anything changed at all,
+and a run without changes is a single 304.
+
+Issues updated while a run is paging through the results move to the last page,
+which shifts the other results between pages. When that happens the checkpoint
+isn't advanced, so the next run fetches the same range again and nothing is missed.
+"""
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GITHUB_API_URL = "https://api.github.com"
+MAX_PER_PAGE = 100
+MAX_RETRIES = 3
+
+
+class IssueStore:
+    """sqlite store of the synced issues, the checkpoints and the ETags of the pages."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS issues ("
+                "repo TEXT NOT NULL, number INTEGER NOT NULL, state TEXT NOT NULL, updated_at TEXT NOT NULL, data TEXT NOT NULL, "
+                "PRIMARY KEY (repo, number))"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS checkpoints (repo TEXT PRIMARY KEY, updated_at TEXT NOT NULL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS etags (url TEXT PRIMARY KEY, etag TEXT NOT NULL)")
+
+    def checkpoint(self, repo: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT updated_at FROM checkpoints WHERE repo = ?", (repo,)).fetchone()
+        return row[0] if row else None
+
+    def etag(self, url: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT etag FROM etags WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, repo: str, issues: List[Dict[str, Any]], etags: Dict[str, str], checkpoint: Optional[str], etag_prefix: Optional[str] = None) -> None:
+        """Store the issues, ETags and checkpoint of a run in one transaction.
+
+        ETags of other URLs starting with etag_prefix are removed, as they are of pages
+        that won't be requested again.
+        """
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO issues (repo, number, state, updated_at, data) VALUES (?, ?, ?, ?, ?)",
+                [(repo, issue["number"], issue["state"], issue["updated_at"], json.dumps(issue)) for issue in issues],
+            )
+            if etag_prefix:
+                stale = [url for (url,) in self._db.execute("SELECT url FROM etags WHERE substr(url, 1, ?) = ?", (len(etag_prefix), etag_prefix)) if url not in etags]
+                self._db.executemany("DELETE FROM etags WHERE url = ?", [(url,) for url in stale])
+            self._db.executemany("INSERT OR REPLACE INTO etags (url, etag) VALUES (?, ?)", list(etags.items()))
+            if checkpoint:
+                self._db.execute("INSERT OR REPLACE INTO checkpoints (repo, updated_at) VALUES (?, ?)", (repo, checkpoint))
+
+    def issues(self, repo: str, state: Optional[str] = "open") -> List[Dict[str, Any]]:
+        """The stored issues of a repository, newest first. state None returns open and closed issues."""
+        query = "SELECT data FROM issues WHERE repo = ?"
+        parameters: Tuple[Any, ...] = (repo,)
+        if state:
+            query += " AND state = ?"
+            parameters += (state,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY number DESC", parameters).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class IssueSync:
+    """Syncs the open and closed issues of a repository into an IssueStore.
+
+    Args:
+        repo: owner/name of the repository
+        store: Where issues, checkpoint and ETags are kept
+        token: GitHub token, optional for public repositories
+        workers: Pages fetched concurrently
+        per_page: Issues per page, at most 100
+        api_url: GitHub API, change for GitHub Enterprise
+    """
+
+    def __init__(self, repo: str, store: IssueStore, token: Optional[str] = None, workers: int = 4, per_page: int = MAX_PER_PAGE, api_url: str = GITHUB_API_URL):
+        self.repo = repo
+        self.store = store
+        self.workers = workers
+        self.per_page = min(per_page, MAX_PER_PAGE)
+        self.url = f"{api_url.rstrip('/')}/repos/{repo}/issues"
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=workers))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=workers))
+        self.session.headers["Accept"] = "application/vnd.github+json"
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def sync(self) -> Dict[str, Any]:
+        """Fetch the issues changed since the last run. Returns counts of the requests and issues."""
+        checkpoint = self.store.checkpoint(self.repo)
+        # The most recently updated issue, at a fixed URL so its ETag carries over between runs
+        probe_url = f"{self.url}?{urlencode({'state': 'all', 'sort': 'updated', 'direction': 'desc', 'per_page': 1})}"
+        probe = self._get(probe_url)
+        if probe.status_code == 304:
+            return {"pages": 0, "notModified": 1, "issues": 0, "checkpoint": checkpoint}
+
+        params = {"state": "all", "sort": "updated", "direction": "asc", "per_page": self.per_page}
+        if checkpoint:
+            params["since"] = checkpoint
+        first_url = f"{self.url}?{urlencode(params)}"
+        # Never conditional, the Link header of a full response is the only source of the page count
+        first = self._get(first_url, conditional=False)
+        # Server time of the first page, to notice issues that changed while paging
+        started = _server_time(first)
+        urls = _page_urls(first, first_url)
+        responses = [(first_url, first)]
+        if urls:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                responses.extend(zip(urls, pool.map(self._get, urls)))
+
+        issues = []
+        etags = {}
+        not_modified = 0
+        for url, response in responses:
+            if response.status_code == 304:
+                not_modified += 1
+                # Still the ETag of the page, kept when the ETags of earlier checkpoints are removed
+                etags[url] = response.headers.get("ETag") or self.store.etag(url)
+                continue
+            issues.extend(response.json())
+            etags.update(_etag(url, response))
+
+        latest = max((issue["updated_at"] for issue in issues), default=checkpoint)
+        changed_while_paging = started is not None and latest is not None and latest >= started
+        etags.pop(first_url, None)
+        if not changed_while_paging:
+            # Only now the probe may answer 304, the next run fetches the same range otherwise
+            etags.update(_etag(probe_url, probe))
+            checkpoint = latest
+        self.store.save(self.repo, issues, etags, checkpoint, etag_prefix=f"{self.url}?")
+        return {"pages": len(responses), "notModified": not_modified, "issues": len(issues), "checkpoint": checkpoint}
+
+    def _get(self, url: str, conditional: bool = True) -> requests.Response:
+        headers = {}
+        etag = self.store.etag(url) if conditional else None
+        if etag:
+            headers["If-None-Match"] = etag
+        for attempt in range(MAX_RETRIES + 1):
+            response = self.session.get(url, headers=headers, timeout=30)
+            if response.status_code in (200, 304):
+                return response
+            delay = _rate_limit_delay(response)
+            if delay is None or attempt == MAX_RETRIES:
+                response.raise_for_status()
+                return response
+            time.sleep(delay)
+        return response
+
+
+def _page_urls(response: requests.Response, first_url: str) -> List[str]:
+    # The last page number from the Link header, and the URLs of pages 2 to last
+    last = response.links.get("last", {}).get("url")
+    if not last:
+        return []
+    pages = int(parse_qs(urlparse(last).query).get("page", ["1"])[0])
+    separator = "&" if "?" in first_url else "?"
+    return [f"{first_url}{separator}page={page}" for page in range(2, pages + 1)]
+
+
+def _etag(url: str, response: requests.Response) -> Dict[str, str]:
+    etag = response.headers.get("ETag")
+    return {url: etag} if etag else {}
+
+
+def _server_time(response: requests.Response) -> Optional[str]:
+    date = response.headers.get("Date")
+    if not date:
+        return None
+    return parsedate_to_datetime(date).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _rate_limit_delay(response: requests.Response) -> Optional[float]:
+    # Seconds to wait when throttled, None when the request shouldn't be retried
+    if response.status_code not in (403, 429):
+        return None
+    retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+    if retry_after is not None:
+        return min(60.0, retry_after)
+    if response.headers.get("X-RateLimit-Remaining") == "0" and response.headers.get("X-RateLimit-Reset"):
+        delay = float(response.headers["X-RateLimit-Reset"]) - time.time()
+        # Waiting for a primary rate limit reset can take up to an hour, give up instead
+        return max(1.0, delay) if delay <= 60 else None
+    return None
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
@@ -1,8 +1,9 @@
-import requests
 import os
+import requests
 from dotenv import load_dotenv
 from langchain.chat_models import ChatOpenAI
 from context_manager import ContextManager
+from issue_sync import IssueStore, IssueSync
 
 load_dotenv()
 
@@ -11,19 +12,19 @@ load_dotenv()
 
 llm = ChatOpenAI(model_name="gpt-4", temperature=0)
 
+GITHUB_REPO = os.getenv("GITHUB_REPO", "Bouvet-AI-Sandbox/mcp-bug-triage")
+
 def get_issues():
-    url = "https://api.github.com/repos/Bouvet-AI-Sandbox/mcp-bug-triage/issues"
-    headers = {
-        "Authorization": f"Bearer {os.getenv('GITHUB_TOKEN')}"
-    }
-    response = requests.get(url, headers=headers)
-    
-    # Check if the response is successful
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Error: {response.status_code} - {response.text}")
-        return []
+    """Sync the issues changed since the last run, then return the open issues from the local store."""
+    store = IssueStore(os.getenv("GITHUB_ISSUES_DB", "issues.sqlite3"))
+    sync = IssueSync(GITHUB_REPO, store, os.getenv("GITHUB_TOKEN"), workers=int(os.getenv("GITHUB_SYNC_WORKERS", "4")))
+    try:
+        result = sync.sync()
+        print(f"Synced {result['issues']} changed issues in {result['pages']} pages ({result['notModified']} not modified)")
+    except requests.RequestException as e:
+        # The issues from earlier runs are still in the store
+        print(f"Error: {e}")
+    return store.issues(GITHUB_REPO)
 
 def ask_openai_for_suggestions(issue_body):
     
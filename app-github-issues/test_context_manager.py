@@ -0,0 +1,66 @@
+import pytest
+
+from context_manager import ContextManager
+from embeddings import HashingEmbeddings
+
+CONTEXTS = [
+    ("issue-1", "Login fails on Safari after the last release"),
+    ("issue-1", "Login fails on Safari after the last release, seen again today"),
+    ("issue-2", "Login fails on Safari after the last release for admin users"),
+    ("issue-3", "Login page times out under heavy load"),
+    ("issue-4", "Export to CSV loses the last column"),
+    ("issue-5", "Checkout returns 500 when the cart is empty"),
+]
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ContextManager(str(tmp_path / "db"), HashingEmbeddings(256))
+    manager.add_contexts(CONTEXTS)
+    return manager
+
+
+def test_search_ranks_by_cosine_similarity(manager):
+    """Test that search returns the k most similar contexts with descending cosine similarity scores."""
+    results = manager.search("checkout fails with 500 for an empty cart", k=3)
+    assert results[0]["key"] == "issue-5"
+    assert results[0]["content"] == "Checkout returns 500 when the cart is empty"
+    assert [result["score"] for result in results] == sorted((result["score"] for result in results), reverse=True)
+    assert all(-1 <= result["score"] <= 1 for result in results)
+    assert manager.get_context("csv export column") == "Export to CSV loses the last column"
+
+
+def test_search_many_matches_single_searches(manager):
+    """Test that batched queries return the same results as one search per query."""
+    queries = ["login fails on safari", "export csv", "checkout 500"]
+    assert manager.search_many(queries, k=2) == [manager.search(query, k=2) for query in queries]
+    assert manager.search_many([]) == []
+
+
+def test_search_many_filters_by_key(manager):
+    """Test that key limits results to one key or a list of keys, combined with a metadata filter."""
+    queries = ["login fails on safari", "login times out"]
+    for results in manager.search_many(queries, k=5, key="issue-1"):
+        assert {result["key"] for result in results} == {"issue-1"}
+    for results in manager.search_many(queries, k=5, key=["issue-2", "issue-3"]):
+        assert {result["key"] for result in results} == {"issue-2", "issue-3"}
+
+    filtered = manager.search("login fails on safari", k=5, key=["issue-1", "issue-2"], filter={"key": {"$ne": "issue-1"}})
+    assert [result["key"] for result in filtered] == ["issue-2"]
+
+
+def test_mmr_diversifies_results(manager):
+    """Test that MMR replaces near duplicates of the best match with other relevant contexts."""
+    query = "login fails on safari after the last release"
+    plain = manager.search(query, k=3)
+    diverse = manager.search(query, k=3, mmr=True, fetch_k=6, lambda_mult=0.3)
+
+    assert all(result["content"].startswith("Login fails on Safari") for result in plain)
+    assert diverse[0] == plain[0]
+    assert any(not result["content"].startswith("Login fails on Safari") for result in diverse)
+    assert len({result["content"] for result in diverse}) == 3
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
@@ -0,0 +1,110 @@
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from context_manager import ContextManager
+from embedding_cache import CachedEmbeddings, EmbeddingCache, model_name
+from embeddings import HashingEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeds a text as its length and counts the texts it was asked to embed."""
+
+    def __init__(self, model="counting"):
+        self.model = model
+        self.calls: List[List[str]] = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [float(len(text)), 1.0]
+
+
+def _cached(tmp_path, embeddings, **settings):
+    return CachedEmbeddings(embeddings, EmbeddingCache(str(tmp_path / "cache.sqlite3")), model_name(embeddings), **settings)
+
+
+def test_hits_and_misses(tmp_path):
+    """Test that only texts missing from the cache are embedded, once per distinct text, in batches."""
+    embeddings = CountingEmbeddings()
+    cached = _cached(tmp_path, embeddings, batch_size=2)
+
+    vectors = cached.embed_documents(["a", "bb", "a", "ccc"])
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0], [3.0, 1.0]]
+    assert embeddings.calls == [["a", "bb"], ["ccc"]]
+    assert (cached.hits, cached.misses) == (1, 3)
+
+    cached.embed_documents(["bb", "dddd"])
+    assert embeddings.calls[-1] == ["dddd"]
+    assert (cached.hits, cached.misses) == (2, 4)
+
+
+def test_cache_survives_restart_and_is_separate_per_model(tmp_path):
+    """Test that cached embeddings are reused by a new instance, but never for another model."""
+    _cached(tmp_path, CountingEmbeddings()).embed_documents(["a", "bb"])
+
+    same_model = CountingEmbeddings()
+    restarted = _cached(tmp_path, same_model)
+    restarted.embed_documents(["a", "bb"])
+    assert same_model.calls == []
+    assert restarted.hits == 2
+
+    other_model = CountingEmbeddings(model="counting-v2")
+    changed = _cached(tmp_path, other_model)
+    changed.embed_documents(["a", "bb"])
+    assert other_model.calls == [["a", "bb"]]
+    assert changed.misses == 2
+
+    assert model_name(HashingEmbeddings(256)) != model_name(HashingEmbeddings(512))
+
+
+def test_query_cache_is_lru(tmp_path):
+    """Test that repeated queries skip the model and the least recently used query is evicted."""
+    embeddings = CountingEmbeddings()
+    cached = _cached(tmp_path, embeddings, query_cache_size=2, batch_queries=True)
+
+    cached.embed_query("a")
+    cached.embed_query("bb")
+    cached.embed_query("a")
+    assert len(embeddings.calls) == 2 and cached.query_hits == 1
+
+    cached.embed_query("ccc")
+    cached.embed_query("a")
+    assert len(embeddings.calls) == 3
+    cached.embed_query("bb")
+    assert len(embeddings.calls) == 4
+
+    # Queries missing from the cache are embedded in one call
+    cached.embed_queries(["x", "yy", "a"])
+    assert embeddings.calls[-1] == ["x", "yy"]
+
+
+def test_queries_are_batched_only_for_known_backends(tmp_path):
+    """Test that backends which may embed queries differently from documents get one embed_query call per query."""
+    embeddings = CountingEmbeddings()
+    cached = _cached(tmp_path, embeddings)
+    assert cached.batch_queries is False
+    cached.embed_queries(["x", "yy"])
+    assert embeddings.calls == [["x"], ["yy"]]
+
+    assert _cached(tmp_path, HashingEmbeddings(64)).batch_queries is True
+
+
+def test_add_contexts_skips_stored_contexts(tmp_path):
+    """Test that re-adding contexts neither embeds nor stores them again."""
+    manager = ContextManager(str(tmp_path / "db"), HashingEmbeddings(64), batch_size=2)
+    contexts = [("issue-1", "Login fails"), ("issue-2", "Export is slow"), ("issue-1", "Login fails")]
+
+    assert manager.add_contexts(contexts) == {"received": 3, "added": 2, "skipped": 1, "embedded": 2}
+    assert manager.add_contexts(contexts) == {"received": 3, "added": 0, "skipped": 3, "embedded": 0}
+    # Same text under another key is a new context, but its embedding is cached
+    assert manager.add_contexts({"issue-3": "Login fails"}) == {"received": 1, "added": 1, "skipped": 0, "embedded": 0}
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
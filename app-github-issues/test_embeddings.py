@@ -0,0 +1,45 @@
+import math
+import sys
+
+import pytest
+
+from embeddings import EMBEDDING_BACKENDS, HashingEmbeddings, create_embeddings
+
+
+def test_hashing_embeddings_are_unit_length_and_deterministic():
+    """Test that vectors have unit norm, don't change between instances and are the same for queries and documents."""
+    embeddings = HashingEmbeddings(128)
+    vector = embeddings.embed_query("Login fails on Safari after the last release")
+    assert len(vector) == 128
+    assert math.isclose(math.sqrt(sum(value * value for value in vector)), 1.0)
+    assert HashingEmbeddings(128).embed_documents(["Login fails on Safari after the last release"]) == [vector]
+    # No words, no features
+    assert embeddings.embed_query("...") == [0.0] * 128
+
+
+def test_hashing_embeddings_are_close_for_shared_words():
+    """Test that texts sharing words are more similar than unrelated texts."""
+    embeddings = HashingEmbeddings(512)
+    query, related, unrelated = embeddings.embed_documents(["login fails on safari", "safari login fails", "export to csv"])
+    assert sum(a * b for a, b in zip(query, related)) > sum(a * b for a, b in zip(query, unrelated))
+
+
+def test_create_embeddings():
+    """Test that the hashing backend takes its dimension from model, and unknown backends are rejected."""
+    assert create_embeddings("hashing").n_features == 512
+    embeddings = create_embeddings("hashing", "64")
+    assert embeddings.n_features == 64 and embeddings.model == "hashing-64"
+
+    with pytest.raises(ValueError, match="Use one of: " + ", ".join(EMBEDDING_BACKENDS)):
+        create_embeddings("word2vec")
+
+
+def test_sentence_transformers_not_installed(monkeypatch):
+    """Test that a missing sentence-transformers package gives an error telling how to install it."""
+    monkeypatch.setitem(sys.modules, "sentence_transformers", None)
+    with pytest.raises(ImportError, match="pip install sentence-transformers"):
+        create_embeddings("sentence-transformers")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-v", __file__]))
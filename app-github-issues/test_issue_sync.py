@@ -0,0 +1,179 @@
+import email.utils
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from issue_sync import IssueStore, IssueSync
+
+REPO = "owner/repo"
+
+
+class FakeGitHub:
+    """Issues endpoint with Link pagination, ETags and 304 responses without a Link header, like GitHub."""
+
+    def __init__(self, count=250):
+        self.issues = {number: _issue(number, f"2026-01-01T00:{number // 60:02d}:{number % 60:02d}Z") for number in range(1, count + 1)}
+        self.requests = []
+        self.throttle = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        github = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                query = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+                github.requests.append((query, self.headers.get("If-None-Match")))
+                if github.throttle:
+                    self.send_response(429)
+                    self.send_header("Retry-After", github.throttle.pop(0))
+                    self.end_headers()
+                    return
+
+                since = query.get("since")
+                issues = sorted(
+                    (issue for issue in github.issues.values() if not since or issue["updated_at"] >= since),
+                    key=lambda issue: issue["updated_at"],
+                    reverse=query["direction"] == "desc",
+                )
+                per_page, page = int(query["per_page"]), int(query.get("page", 1))
+                body = json.dumps(issues[(page - 1) * per_page:page * per_page]).encode()
+                etag = f'"{hashlib.sha256(body).hexdigest()}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Date", email.utils.formatdate(usegmt=True))
+                pages = max(1, -(-len(issues) // per_page))
+                if pages > 1:
+                    base = f"{github.url}{urlparse(self.path).path}?" + "&".join(f"{name}={value}" for name, value in query.items() if name != "page")
+                    self.send_header("Link", f'<{base}&page={min(page + 1, pages)}>; rel="next", <{base}&page={pages}>; rel="last"')
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def pages_requested(self):
+        """The requests of the last sync as (page, conditional), without the probe."""
+        return [(int(query.get("page", 1)), etag is not None) for query, etag in self.requests if query["direction"] == "asc"]
+
+
+def _issue(number, updated_at, state="open"):
+    return {"number": number, "title": f"Issue {number}", "state": state, "updated_at": updated_at}
+
+
+@pytest.fixture
+def github():
+    github = FakeGitHub()
+    yield github
+    github.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IssueStore(str(tmp_path / "issues.sqlite3"))
+
+
+def _sync(github, store):
+    github.requests.clear()
+    return IssueSync(REPO, store, "token", per_page=50, api_url=github.url).sync()
+
+
+def test_first_sync_fetches_all_pages(github, store):
+    """Test that the first run follows the Link header to fetch every page."""
+    result = _sync(github, store)
+
+    assert result == {"pages": 5, "notModified": 0, "issues": 250, "checkpoint": "2026-01-01T00:04:10Z"}
+    assert sorted(github.pages_requested()) == [(1, False), (2, False), (3, False), (4, False), (5, False)]
+    assert len(store.issues(REPO, state=None)) == 250
+
+
+def test_unchanged_repository_is_a_single_304(github, store):
+    """Test that a run without changes only sends the probe, which is answered with 304."""
+    _sync(github, store)
+
+    result = _sync(github, store)
+
+    assert result["pages"] == 0 and result["notModified"] == 1
+    assert len(github.requests) == 1 and github.requests[0][1] is not None
+
+
+def test_incremental_sync_fetches_only_changed_issues(github, store):
+    """Test that only issues updated since the checkpoint are fetched and stored."""
+    _sync(github, store)
+    github.issues[5] = _issue(5, "2026-01-02T00:00:00Z", state="closed")
+    github.issues[300] = _issue(300, "2026-01-02T00:00:01Z")
+
+    result = _sync(github, store)
+
+    assert result["pages"] == 1 and result["checkpoint"] == "2026-01-02T00:00:01Z"
+    assert github.requests[1][0]["since"] == "2026-01-01T00:04:10Z"
+    assert {issue["number"] for issue in store.issues(REPO)} == set(range(1, 251)) - {5} | {300}
+
+
+def test_unchanged_first_page_still_finds_new_pages(github, store):
+    """Test that pages after an unchanged first page are fetched, as a 304 has no Link header."""
+    _sync(github, store)
+    for number in range(1, 61):
+        github.issues[number] = _issue(number, f"2026-01-02T00:00:{number % 60:02d}Z")
+    # An issue changed while the run was paging keeps the checkpoint, so the next run fetches the same range
+    github.issues[200] = _issue(200, "2099-01-01T00:00:00Z")
+    assert _sync(github, store)["checkpoint"] == "2026-01-01T00:04:10Z"
+    assert sorted(github.pages_requested()) == [(1, False), (2, False)]
+
+    # The first page of the range is unchanged, the new issues move the last page from 2 to 3
+    for number in range(251, 311):
+        github.issues[number] = _issue(number, f"2026-01-03T00:00:{number % 60:02d}Z")
+    result = _sync(github, store)
+
+    assert sorted(github.pages_requested()) == [(1, False), (2, True), (3, False)]
+    assert result["pages"] == 3
+    assert len(store.issues(REPO, state=None)) == 310
+
+
+def test_etags_of_earlier_checkpoints_are_removed(github, store):
+    """Test that the store only keeps the ETags of the probe and of the pages of the current range."""
+    _sync(github, store)
+    first_range = store._db.execute("SELECT COUNT(*) FROM etags").fetchone()[0]
+    assert first_range == 5
+
+    for round_ in range(3):
+        github.issues[1] = _issue(1, f"2026-01-0{round_ + 2}T00:00:00Z")
+        _sync(github, store)
+
+    urls = [url for (url,) in store._db.execute("SELECT url FROM etags")]
+    assert len(urls) == 1 and "direction=desc" in urls[0]
+
+
+@pytest.mark.parametrize("retry_after", ["1", email.utils.formatdate(time.time() + 1, usegmt=True)])
+def test_throttled_requests_wait_for_retry_after(github, store, retry_after):
+    """Test that a 429 is retried after Retry-After given in seconds or as an HTTP date."""
+    github.throttle = [retry_after]
+
+    result = _sync(github, store)
+
+    assert result["issues"] == 250
+    assert github.requests[0] == github.requests[1]
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
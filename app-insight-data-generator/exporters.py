@@ -0,0 +1,232 @@
+"""Span exporters for the telemetry generator.
+
+Spans can be sent to Azure Monitor, to an OTLP/HTTP endpoint such as a local
+OpenTelemetry collector, or written to newline-delimited JSON or Parquet files
+to generate large datasets offline. Files can later be replayed into Azure
+Monitor or a collector, or served by the Application Insights emulator in
+mcp-server-app-insight.
+
+Every span is one record:
+    {"name", "kind", "trace_id", "span_id", "parent_span_id", "start_time",
+     "end_time", "status", "attributes", "events", "resource"}
+with times in nanoseconds since the epoch and ids as hex strings. Parquet files
+have the same columns, with attributes, events and resource as JSON strings.
+"""
+import glob
+import json
+import os
+
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import Event, ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.trace import SpanContext, SpanKind, Status, StatusCode, TraceFlags
+
+EXPORTERS = ("azure", "otlp", "jsonl", "parquet", "none")
+FILE_EXPORTERS = ("jsonl", "parquet")
+
+_JSON_COLUMNS = ("attributes", "events", "resource")
+
+
+def create_exporter(name, connection_string=None, otlp_endpoint=None, output=".", index=0):
+    """Create the span exporter with the given name. File exporters write <output>/spans-<index>.<name>."""
+    if name == "azure":
+        from azure.monitor.opentelemetry.exporter import AzureMonitorTraceExporter
+        if not connection_string:
+            raise ValueError("APPLICATION_INSIGHT_CONNECTION_STRING must be set for the azure exporter")
+        return AzureMonitorTraceExporter(connection_string=connection_string)
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        # Without an endpoint the exporter uses OTEL_EXPORTER_OTLP_TRACES_ENDPOINT or localhost:4318
+        return OTLPSpanExporter(endpoint=otlp_endpoint) if otlp_endpoint else OTLPSpanExporter()
+    if name == "jsonl":
+        return JsonLinesSpanExporter(os.path.join(output, f"spans-{index}.jsonl"))
+    if name == "parquet":
+        return ParquetSpanExporter(os.path.join(output, f"spans-{index}.parquet"))
+    if name == "none":
+        return NoopSpanExporter()
+    raise ValueError(f"Unknown exporter '{name}'. Use one of: {', '.join(EXPORTERS)}")
+
+
+def clear_span_files(output):
+    """Remove the spans-<index> files of an earlier run from the output directory.
+
+    Every run writes its own files, and files left over from a run with more workers
+    would otherwise be replayed and served together with the new ones.
+    """
+    removed = []
+    for path in glob.glob(os.path.join(output, "spans-*.jsonl")) + glob.glob(os.path.join(output, "spans-*.parquet")):
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+
+class CountingSpanExporter(SpanExporter):
+    """Counts the spans that reached the wrapped exporter, to tell exporter failures
+    apart from spans dropped because the BatchSpanProcessor queue was full."""
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self.exported = 0
+        self.failed = 0
+
+    def export(self, spans):
+        result = self.exporter.export(spans)
+        if result == SpanExportResult.SUCCESS:
+            self.exported += len(spans)
+        else:
+            self.failed += len(spans)
+        return result
+
+    def shutdown(self):
+        self.exporter.shutdown()
+
+    def force_flush(self, timeout_millis=30000):
+        return self.exporter.force_flush(timeout_millis)
+
+
+class NoopSpanExporter(SpanExporter):
+    """Discards spans, to measure generation without any exporter overhead."""
+
+    def export(self, spans):
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Writes one JSON record per span to a file, replacing an existing file."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+
+    def export(self, spans):
+        self._file.write("".join(json.dumps(span_to_record(span)) + "\n" for span in spans))
+        return SpanExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis=30000):
+        self._file.flush()
+        return True
+
+    def shutdown(self):
+        self._file.close()
+
+
+class ParquetSpanExporter(SpanExporter):
+    """Writes every export batch as a row group of a Parquet file, replacing an existing file. Needs pyarrow."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("The parquet exporter needs pyarrow, install it with: pip install pyarrow") from e
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([
+            ("name", pyarrow.string()),
+            ("kind", pyarrow.string()),
+            ("trace_id", pyarrow.string()),
+            ("span_id", pyarrow.string()),
+            ("parent_span_id", pyarrow.string()),
+            ("start_time", pyarrow.int64()),
+            ("end_time", pyarrow.int64()),
+            ("status", pyarrow.string()),
+            ("attributes", pyarrow.string()),
+            ("events", pyarrow.string()),
+            ("resource", pyarrow.string()),
+        ])
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def export(self, spans):
+        records = [span_to_record(span) for span in spans]
+        for record in records:
+            for column in _JSON_COLUMNS:
+                record[column] = json.dumps(record[column])
+        self._writer.write_table(self._pyarrow.Table.from_pylist(records, schema=self._schema))
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        self._writer.close()
+
+
+def span_to_record(span):
+    """Convert a finished span to a JSON serializable record."""
+    return {
+        "name": span.name,
+        "kind": span.kind.name,
+        "trace_id": f"{span.context.trace_id:032x}",
+        "span_id": f"{span.context.span_id:016x}",
+        "parent_span_id": f"{span.parent.span_id:016x}" if span.parent else None,
+        "start_time": span.start_time,
+        "end_time": span.end_time,
+        "status": span.status.status_code.name,
+        "attributes": dict(span.attributes or {}),
+        "events": [
+            {"name": event.name, "timestamp": event.timestamp, "attributes": dict(event.attributes or {})}
+            for event in span.events
+        ],
+        "resource": dict(span.resource.attributes) if span.resource else {},
+    }
+
+
+def record_to_span(record, time_shift_ns=0, resources=None):
+    """Recreate a finished span from a record, optionally moved in time by time_shift_ns.
+
+    Pass the same resources dict for all records of a replay, so spans with the same
+    resource attributes share one Resource instead of recreating it per span.
+    """
+    resource_attributes = record.get("resource") or {}
+    key = json.dumps(resource_attributes, sort_keys=True)
+    resource = resources.get(key) if resources is not None else None
+    if resource is None:
+        # The recorded attributes as is, without the detectors Resource.create would run
+        resource = Resource(resource_attributes)
+        if resources is not None:
+            resources[key] = resource
+    context = SpanContext(int(record["trace_id"], 16), int(record["span_id"], 16), is_remote=False, trace_flags=TraceFlags(TraceFlags.SAMPLED))
+    parent = None
+    if record.get("parent_span_id"):
+        parent = SpanContext(int(record["trace_id"], 16), int(record["parent_span_id"], 16), is_remote=False, trace_flags=TraceFlags(TraceFlags.SAMPLED))
+    return ReadableSpan(
+        name=record["name"],
+        context=context,
+        parent=parent,
+        resource=resource,
+        attributes=record.get("attributes") or {},
+        events=[
+            Event(event["name"], event.get("attributes") or {}, event["timestamp"] + time_shift_ns)
+            for event in record.get("events") or []
+        ],
+        kind=SpanKind[record.get("kind", "INTERNAL")],
+        status=Status(StatusCode[record.get("status", "UNSET")]),
+        start_time=record["start_time"] + time_shift_ns,
+        end_time=record["end_time"] + time_shift_ns,
+    )
+
+
+def span_files(path):
+    """The span files at path: a single file, or every .jsonl and .parquet file in a directory."""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*.jsonl")) + glob.glob(os.path.join(path, "*.parquet")))
+    return [path]
+
+
+def read_records(path):
+    """Yield the span records of a .jsonl or .parquet file."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        for batch in parquet_file.iter_batches():
+            for record in batch.to_pylist():
+                for column in _JSON_COLUMNS:
+                    record[column] = json.loads(record[column]) if record[column] else None
+                yield record
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
@@ -4,14 +4,18 @@ import requests
 import logging
 import os
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 from opentelemetry.instrumentation.requests import RequestsInstrumentor
 from azure.monitor.opentelemetry import configure_azure_monitor
 from opentelemetry.trace import SpanKind, StatusCode
+from exporters import EXPORTERS, FILE_EXPORTERS, CountingSpanExporter, clear_span_files, create_exporter, read_records, record_to_span, span_files
+from profiles import SeededIdGenerator, load_profile
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,12 +25,24 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 CONNECTION_STRING = os.getenv("APPLICATION_INSIGHT_CONNECTION_STRING")
 
-logger.info(f"CONNECTION_STRING={CONNECTION_STRING}")
-# Configure Azure Monitor
-configure_azure_monitor(
-    connection_string=CONNECTION_STRING,
-    enable_live_metrics=False
-)
+URLS = ["https://example.com/login", "https://example.com/api/data", "https://example.com/products"]
+STATUSES = [200, 201, 400, 404, 500]
+EXCEPTION_MESSAGE = "EX-627 - Unexpected exception when verifying user role access to engine"
+
+# Configure the exporter, in the process generating the requests. Only Azure Monitor
+# also receives the log messages, as traces.
+def configure_tracing(args):
+    if args.exporter == "azure":
+        logger.info(f"CONNECTION_STRING={CONNECTION_STRING}")
+        configure_azure_monitor(
+            connection_string=CONNECTION_STRING,
+            enable_live_metrics=False
+        )
+        return None
+    provider = TracerProvider()
+    provider.add_span_processor(BatchSpanProcessor(exporter_for(args)))
+    trace.set_tracer_provider(provider)
+    return provider
 
 # enable_live_metrics=True causes recursion exception on 1.6.5 ref https://github.com/Azure/azure-sdk-for-python/issues/39914
 
@@ -37,11 +53,8 @@ RequestsInstrumentor().instrument()
 
 # Test web request generator
 def generate_web_request(user_id="kjarisk"):
-    urls = ["https://example.com/login", "https://example.com/api/data", "https://example.com/products"]
-    statuses = [200, 201, 400, 404, 500]
-    
-    url = random.choice(urls)
-    status = random.choice(statuses)
+    url = random.choice(URLS)
+    status = random.choice(STATUSES)
     response_time = round(random.uniform(0.1, 5.0), 2)  # Simulate response times
 
     with tracer.start_as_current_span("simulated_request", kind=SpanKind.SERVER) as span:
@@ -53,7 +66,7 @@ def generate_web_request(user_id="kjarisk"):
 
         if status == 500:
             try:
-                raise ValueError("EX-627 - Unexpected exception when verifying user role access to engine")
+                raise ValueError(EXCEPTION_MESSAGE)
             except Exception as e:
                     span.record_exception(e)
         elif status == 400: 
@@ -67,13 +80,272 @@ def generate_web_request(user_id="kjarisk"):
 # Function to deliberately generate and log an exception for testing
 def generate_exception():
     try:
-        raise ValueError("EX-627 - Unexpected exception when verifying user role access to engine")
+        raise ValueError(EXCEPTION_MESSAGE)
     except Exception as e:
         logger.error("Caught exception in generate_exception", exc_info=True)
         with tracer.start_as_current_span("logged_exception", kind=SpanKind.INTERNAL) as span:
             span.record_exception(e)
             span.set_status(StatusCode.ERROR)
 
+# High-rate request: the span is backdated by its response time instead of sleeping through it
+def generate_backdated_request(span_tracer, rng, user_id, end_time_ns):
+    url = rng.choice(URLS)
+    status = rng.choice(STATUSES)
+    response_time = round(rng.uniform(0.1, 5.0), 2)
+
+    span = span_tracer.start_span(
+        "simulated_request",
+        kind=SpanKind.SERVER,
+        start_time=end_time_ns - int(response_time * 1e9),
+        attributes={
+            "http.method": "GET",
+            "http.url": url,
+            "http.status_code": status,
+            "duration": response_time*1000,
+            "User.AuthenticatedUserId": user_id,
+        },
+    )
+    if status == 500:
+        span.record_exception(ValueError(EXCEPTION_MESSAGE), timestamp=end_time_ns)
+    span.end(end_time=end_time_ns)
+
+# Simulated user population, either equally active (uniform) or a few very active users (zipf)
+def user_population(args):
+    if args.users <= 1:
+        return [args.user], [1.0]
+    users = [f"{args.user}-{i:05d}" for i in range(args.users)]
+    if args.user_distribution == "zipf":
+        weights = [1 / (rank ** 1.1) for rank in range(1, args.users + 1)]
+    else:
+        weights = [1.0] * args.users
+    return users, weights
+
+# Tracer provider of a worker process, with its own BatchSpanProcessor and exporter
+def worker_provider(worker, id_generator=None, resource=None):
+    exporter = CountingSpanExporter(create_exporter(
+        worker["exporter"], CONNECTION_STRING, worker["otlp_endpoint"], worker["output"], worker["index"]
+    ))
+    options = {"id_generator": id_generator, "resource": resource}
+    provider = TracerProvider(**{name: value for name, value in options.items() if value is not None})
+    provider.add_span_processor(BatchSpanProcessor(
+        exporter,
+        max_queue_size=worker["max_queue_size"],
+        max_export_batch_size=worker["max_export_batch_size"],
+        schedule_delay_millis=worker["schedule_delay_ms"],
+    ))
+    return provider, exporter
+
+# Settings shared by all worker processes
+def worker_settings(args, index):
+    return {
+        "max_queue_size": args.max_queue_size,
+        "max_export_batch_size": args.max_export_batch_size,
+        "schedule_delay_ms": args.schedule_delay_ms,
+        "exporter": args.exporter,
+        "otlp_endpoint": args.otlp_endpoint,
+        "output": args.output,
+        "index": index,
+        "seed": args.seed,
+    }
+
+# One high-rate worker process
+def run_worker(worker):
+    seeded = worker["seed"] is not None
+    provider, exporter = worker_provider(worker, SeededIdGenerator(f"{worker['seed']}:{worker['index']}:ids") if seeded else None)
+    span_tracer = provider.get_tracer(__name__)
+    rng = random.Random(f"{worker['seed']}:{worker['index']}") if seeded else random.Random()
+    cumulative_weights = []
+    total = 0.0
+    for weight in worker["weights"]:
+        total += weight
+        cumulative_weights.append(total)
+
+    interval = 1 / worker["eps"] if worker["eps"] else 0
+    start = time.perf_counter()
+    for i in range(worker["requests"]):
+        if interval:
+            # Pace to the target rate without drifting, skipping the sleep when behind
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        user_id = rng.choices(worker["users"], cum_weights=cumulative_weights)[0]
+        generate_backdated_request(span_tracer, rng, user_id, time.time_ns())
+    generated_seconds = time.perf_counter() - start
+
+    # Flushes the queue, so every span is either exported, failed or dropped
+    provider.shutdown()
+    return {
+        "generated": worker["requests"],
+        "exported": exporter.exported,
+        "failed": exporter.failed,
+        "generated_seconds": generated_seconds,
+    }
+
+# Generate args.requests requests from args.workers processes at args.eps events per second in total
+def run_high_rate(args):
+    users, weights = user_population(args)
+    workers = max(1, min(args.workers, args.requests))
+    logger.info(f"High-rate mode: {args.requests} requests from {len(users)} users, {workers} workers, target {args.eps or 'unlimited'} EPS, {args.exporter} exporter")
+
+    jobs = []
+    for index in range(workers):
+        jobs.append({
+            "requests": args.requests // workers + (1 if index < args.requests % workers else 0),
+            "eps": args.eps / workers if args.eps else 0,
+            "users": users,
+            "weights": weights,
+            **worker_settings(args, index),
+        })
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run_worker, jobs))
+    log_summary(args, results, time.perf_counter() - start)
+
+# Profile request: span named after the endpoint, timed in simulated time
+def generate_profile_request(span_tracer, request):
+    start_time_ns = to_ns(request["start"])
+    end_time_ns = to_ns(request["end"])
+    span = span_tracer.start_span(
+        request["name"],
+        kind=SpanKind.SERVER,
+        start_time=start_time_ns,
+        attributes={
+            "http.method": request["method"],
+            "http.url": request["url"],
+            "http.status_code": request["status"],
+            "duration": request["duration_ms"],
+            "User.AuthenticatedUserId": request["user_id"],
+        },
+    )
+    if request["exception"]:
+        span.record_exception(ValueError(request["exception"]), timestamp=end_time_ns)
+    span.end(end_time=end_time_ns)
+
+def to_ns(value):
+    return (value - datetime(1970, 1, 1, tzinfo=timezone.utc)) // timedelta(microseconds=1) * 1000
+
+# One profile worker process, generating its share of the segments of the simulated window
+def run_profile_worker(worker):
+    profile = load_profile(worker["profile"])
+    start = datetime.fromisoformat(worker["start"])
+    id_generator = SeededIdGenerator()
+    # A fixed service.instance.id, the SDK default is a new random one per provider
+    resource = Resource.create({"service.name": profile.name, "service.instance.id": f"{profile.name}-{worker['seed']}"})
+    provider, exporter = worker_provider(worker, id_generator, resource)
+    span_tracer = provider.get_tracer(__name__)
+
+    interval = 1 / worker["eps"] if worker["eps"] else 0
+    generated = 0
+    started = time.perf_counter()
+    for index in worker["segments"]:
+        # Ids depend only on the seed and the segment, not on which worker generates it
+        id_generator.reseed(f"{worker['seed']}:{index}:ids")
+        for request in profile.generate_segment(worker["seed"], start, index):
+            if interval:
+                delay = started + generated * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            generate_profile_request(span_tracer, request)
+            generated += 1
+    generated_seconds = time.perf_counter() - started
+
+    provider.shutdown()
+    return {
+        "generated": generated,
+        "exported": exporter.exported,
+        "failed": exporter.failed,
+        "generated_seconds": generated_seconds,
+    }
+
+# Generate the simulated window of a workload profile as fast as possible, or at args.eps
+def run_profile(args):
+    profile = load_profile(args.profile)
+    if args.seed is None:
+        args.seed = random.randrange(2 ** 32)
+    if args.start:
+        start = datetime.fromisoformat(args.start.replace("Z", "+00:00"))
+        start = start if start.tzinfo else start.replace(tzinfo=timezone.utc)
+    elif profile.start:
+        start = profile.start
+    else:
+        start = (datetime.now(timezone.utc) - profile.duration).replace(second=0, microsecond=0)
+    segments = profile.segment_count()
+    workers = max(1, min(args.workers, segments))
+    # Start and seed reproduce the run
+    logger.info(f"Profile {profile.name}: {profile.duration} from {start.isoformat()}, seed {args.seed}, {workers} workers, {args.exporter} exporter")
+
+    jobs = []
+    for index in range(workers):
+        jobs.append({
+            "profile": args.profile,
+            "start": start.isoformat(),
+            "segments": list(range(index, segments, workers)),
+            "eps": args.eps / workers if args.eps else 0,
+            **worker_settings(args, index),
+        })
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run_profile_worker, jobs))
+    log_summary(args, results, time.perf_counter() - started)
+
+# Summary of the worker results: achieved EPS, exported, failed and dropped events
+def log_summary(args, results, elapsed):
+    generated = sum(result["generated"] for result in results)
+    exported = sum(result["exported"] for result in results)
+    failed = sum(result["failed"] for result in results)
+    generated_seconds = max(result["generated_seconds"] for result in results)
+    dropped = generated - exported - failed
+    logger.info("Summary:")
+    # Nothing is generated with --requests 0, and the times can be 0 then too
+    logger.info(f"  Generated events:   {generated} in {generated_seconds:.1f}s, {generated / generated_seconds if generated_seconds else 0:.0f} EPS achieved (target {args.eps or 'unlimited'})")
+    logger.info(f"  Exported events:    {exported} in {elapsed:.1f}s including flush, {exported / elapsed if elapsed else 0:.0f} EPS")
+    logger.info(f"  Export failures:    {failed}")
+    logger.info(f"  Dropped (queue full): {dropped} ({dropped / generated if generated else 0:.1%})")
+
+# Exporter selected on the command line, for a single process
+def exporter_for(args):
+    return create_exporter(args.exporter, CONNECTION_STRING, args.otlp_endpoint, args.output)
+
+# Send spans recorded by the jsonl or parquet exporter to the selected exporter
+def run_replay(args):
+    if args.exporter in FILE_EXPORTERS:
+        raise SystemExit("Replay into another file isn't supported, use --exporter azure, otlp or none")
+    files = span_files(args.replay)
+    time_shift_ns = 0
+    if args.rebase_time:
+        # Move the spans in time so the newest span ends now
+        latest = max((record["end_time"] for path in files for record in read_records(path)), default=time.time_ns())
+        time_shift_ns = time.time_ns() - latest
+    logger.info(f"Replaying {len(files)} files into {args.exporter}, shifted by {time_shift_ns / 1e9:.0f}s")
+
+    exporter = CountingSpanExporter(exporter_for(args))
+    interval = args.max_export_batch_size / args.eps if args.eps else 0
+    start = time.perf_counter()
+    batches = 0
+    batch = []
+    resources = {}
+    for path in files:
+        for record in read_records(path):
+            batch.append(record_to_span(record, time_shift_ns, resources))
+            if len(batch) >= args.max_export_batch_size:
+                if interval:
+                    delay = start + batches * interval - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                exporter.export(batch)
+                batches += 1
+                batch = []
+    if batch:
+        exporter.export(batch)
+    exporter.shutdown()
+    elapsed = time.perf_counter() - start
+
+    logger.info("Summary:")
+    logger.info(f"  Replayed events:    {exporter.exported} in {elapsed:.1f}s, {exporter.exported / elapsed:.0f} EPS")
+    logger.info(f"  Export failures:    {exporter.failed}")
+
 # Parse command line arguments
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Generate test data for Azure Application Insights.')
@@ -81,12 +353,59 @@ def parse_arguments():
                         help='User ID to be used in the telemetry data (default: kjarisk)')
     parser.add_argument('--requests', type=int, default=20,
                         help='Number of test web requests to generate (default: 20)')
+    parser.add_argument('--exporter', choices=EXPORTERS, default='azure',
+                        help='Where spans are sent: azure, otlp (OTLP/HTTP endpoint), jsonl or parquet files, or none to measure generation alone (default: azure)')
+    parser.add_argument('--output', type=str, default='spans',
+                        help='Directory for the jsonl and parquet exporters, one file per worker (default: spans)')
+    parser.add_argument('--otlp-endpoint', type=str, default=None,
+                        help='OTLP/HTTP traces endpoint (default: OTEL_EXPORTER_OTLP_TRACES_ENDPOINT or http://localhost:4318/v1/traces)')
+    parser.add_argument('--replay', type=str, default=None,
+                        help='Replay a jsonl or parquet file, or a directory of them, into --exporter instead of generating requests')
+    parser.add_argument('--rebase-time', action='store_true',
+                        help='Replay: move the spans in time so the newest span ends now')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='Generate the simulated time window of a JSON or YAML workload profile, see profiles/')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the random choices and ids. The same profile, seed and start produce identical spans (default: random)')
+    parser.add_argument('--start', type=str, default=None,
+                        help='Profile: start of the simulated window in ISO 8601 (default: the profile start, or the duration before now)')
+    parser.add_argument('--eps', type=float, default=None,
+                        help='High-rate mode: target events (spans) per second over all workers, 0 for unlimited. Spans are backdated instead of sleeping')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='High-rate mode: number of worker processes (default: number of CPUs)')
+    parser.add_argument('--users', type=int, default=1,
+                        help='High-rate mode: number of simulated users, named <user>-00000 and up (default: 1, only --user)')
+    parser.add_argument('--user-distribution', choices=['uniform', 'zipf'], default='uniform',
+                        help='High-rate mode: how requests are spread over the users (default: uniform)')
+    parser.add_argument('--max-queue-size', type=int, default=2048,
+                        help='High-rate mode: BatchSpanProcessor queue size per worker, spans are dropped when full (default: 2048)')
+    parser.add_argument('--max-export-batch-size', type=int, default=512,
+                        help="High-rate mode: BatchSpanProcessor export batch size. Replay: spans per export (default: 512)")
+    parser.add_argument('--schedule-delay-ms', type=int, default=5000,
+                        help='High-rate mode: BatchSpanProcessor delay between exports (default: 5000)')
     return parser.parse_args()
 
 # Run test data generation loop
 if __name__ == "__main__":
     args = parse_arguments()
-    logger.info(f"Starting test web request generator with user ID: {args.user}...")
-    
-    for _ in range(args.requests):  # Generate test requests
-        generate_web_request(args.user)
\ No newline at end of file
+    if args.exporter in FILE_EXPORTERS and not args.replay:
+        removed = clear_span_files(args.output)
+        if removed:
+            logger.info(f"Removed {len(removed)} span files of an earlier run from {args.output}")
+    if args.replay:
+        run_replay(args)
+    elif args.profile:
+        run_profile(args)
+    elif args.eps is not None:
+        run_high_rate(args)
+    else:
+        if args.seed is not None:
+            random.seed(args.seed)
+        provider = configure_tracing(args)
+        logger.info(f"Starting test web request generator with user ID: {args.user}...")
+        
+        for _ in range(args.requests):  # Generate test requests
+            generate_web_request(args.user)
+
+        if provider is not None:
+            provider.shutdown()
\ No newline at end of file
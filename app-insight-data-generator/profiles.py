@@ -0,0 +1,236 @@
+"""Workload profiles for deterministic, production-like telemetry.
+
+A profile (JSON or YAML) describes the endpoint mix, status and latency
+distributions, the user population, a daily rate curve and error bursts. The
+simulated time window is split into segments of SEGMENT_SECONDS. Each segment
+gets its own random generator derived from the seed and the segment number, so
+the same profile, seed and start time produce the same requests however many
+workers share the segments.
+
+Example:
+
+    endpoints:
+      - name: GET /api/data
+        url: https://example.com/api/data
+        weight: 5
+        statuses: {200: 0.95, 404: 0.03, 500: 0.02}
+        latency: {distribution: lognormal, median_ms: 120, sigma: 0.8}
+    users: {count: 5000, distribution: zipf, zipf_s: 1.1}
+    rate:
+      daily: {"00:00": 5, "09:00": 60, "17:00": 40, "22:00": 10}
+    error_bursts:
+      - {start: "14:00", minutes: 15, error_rate: 0.4, status: 503}
+    duration_minutes: 1440
+"""
+import bisect
+import json
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+from opentelemetry.sdk.trace.id_generator import IdGenerator
+
+SEGMENT_SECONDS = 60
+LATENCY_DISTRIBUTIONS = ("lognormal", "pareto", "uniform")
+USER_DISTRIBUTIONS = ("uniform", "zipf")
+DEFAULT_EXCEPTION_MESSAGE = "EX-627 - Unexpected exception when verifying user role access to engine"
+
+
+class SeededIdGenerator(IdGenerator):
+    """Trace and span ids from a seeded random generator, reseeded per segment."""
+
+    def __init__(self, seed=0):
+        self._random = random.Random(seed)
+
+    def reseed(self, seed):
+        self._random.seed(seed)
+
+    def generate_span_id(self):
+        return self._random.getrandbits(64) or 1
+
+    def generate_trace_id(self):
+        return self._random.getrandbits(128) or 1
+
+
+class WorkloadProfile:
+    """A validated workload profile. Load one with load_profile."""
+
+    def __init__(self, config):
+        self.name = config.get("name", "profile")
+        self.duration = timedelta(minutes=float(config.get("duration_minutes", 60)))
+        self.start = _parse_start(config["start"]) if config.get("start") else None
+        self.endpoints = [_endpoint(endpoint) for endpoint in _required(config, "endpoints")]
+        self._endpoint_weights = _cumulative([endpoint["weight"] for endpoint in self.endpoints])
+
+        users = config.get("users", {})
+        self.user_ids = [
+            f"{users.get('prefix', 'user-')}{i:05d}{users.get('domain', '@example.com')}"
+            for i in range(int(users.get("count", 100)))
+        ]
+        distribution = users.get("distribution", "uniform")
+        if distribution not in USER_DISTRIBUTIONS:
+            raise ValueError(f"Unknown user distribution '{distribution}'. Use one of: {', '.join(USER_DISTRIBUTIONS)}")
+        zipf_s = float(users.get("zipf_s", 1.1))
+        self._user_weights = _cumulative([
+            1 / (rank ** zipf_s) if distribution == "zipf" else 1.0 for rank in range(1, len(self.user_ids) + 1)
+        ])
+
+        rate = config.get("rate", {"eps": 10})
+        if "daily" in rate:
+            points = sorted((_minute_of_day(at), float(eps)) for at, eps in rate["daily"].items())
+            self._rate_points = points
+        else:
+            self._rate_points = [(0, float(rate.get("eps", 10)))]
+        self.error_bursts = [_burst(burst) for burst in config.get("error_bursts", [])]
+
+    def rate(self, at):
+        """Events per second at a point in time, interpolated linearly on the daily curve."""
+        if len(self._rate_points) == 1:
+            return self._rate_points[0][1]
+        minute = at.hour * 60 + at.minute + at.second / 60
+        minutes = [point[0] for point in self._rate_points]
+        index = bisect.bisect_right(minutes, minute)
+        (before, before_eps) = self._rate_points[index - 1] if index > 0 else (self._rate_points[-1][0] - 1440, self._rate_points[-1][1])
+        (after, after_eps) = self._rate_points[index] if index < len(self._rate_points) else (self._rate_points[0][0] + 1440, self._rate_points[0][1])
+        return before_eps + (after_eps - before_eps) * (minute - before) / (after - before)
+
+    def segment_count(self):
+        return math.ceil(self.duration.total_seconds() / SEGMENT_SECONDS)
+
+    def generate_segment(self, seed, start, index):
+        """Yield the requests of one segment of the window starting at start, in time order.
+
+        Inter-arrival times are exponential with the rate at the time of the previous
+        request, which makes the arrivals a Poisson process following the rate curve.
+        """
+        rng = random.Random(f"{seed}:{index}")
+        segment_start = start + timedelta(seconds=index * SEGMENT_SECONDS)
+        segment_end = min(segment_start + timedelta(seconds=SEGMENT_SECONDS), start + self.duration)
+        offset = 0.0
+        length = (segment_end - segment_start).total_seconds()
+        while True:
+            rate = self.rate(segment_start + timedelta(seconds=offset))
+            if rate <= 0:
+                # Nothing happens now, look again a second later
+                offset += 1.0
+                if offset >= length:
+                    return
+                continue
+            offset += rng.expovariate(rate)
+            if offset >= length:
+                return
+            yield self._request(rng, segment_start + timedelta(seconds=offset))
+
+    def _request(self, rng, at):
+        endpoint = self.endpoints[bisect.bisect_left(self._endpoint_weights, rng.random() * self._endpoint_weights[-1])]
+        statuses, status_weights = endpoint["statuses"]
+        status = statuses[bisect.bisect_left(status_weights, rng.random() * status_weights[-1])]
+        for burst in self.error_bursts:
+            if _in_burst(burst, at, endpoint["name"]) and rng.random() < burst["error_rate"]:
+                status = burst["status"]
+        user_id = self.user_ids[bisect.bisect_left(self._user_weights, rng.random() * self._user_weights[-1])]
+        duration_ms = _latency(rng, endpoint["latency"])
+        return {
+            "start": at,
+            "end": at + timedelta(milliseconds=duration_ms),
+            "name": endpoint["name"],
+            "method": endpoint["method"],
+            "url": endpoint["url"],
+            "status": status,
+            "duration_ms": round(duration_ms, 3),
+            "user_id": user_id,
+            "exception": endpoint["exception"] if status >= 500 else None,
+        }
+
+
+def load_profile(path):
+    """Load a workload profile from a .json, .yaml or .yml file."""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError("YAML profiles need PyYAML, install it with: pip install pyyaml") from e
+            config = yaml.safe_load(f)
+        else:
+            config = json.load(f)
+    return WorkloadProfile(config)
+
+
+def _endpoint(config):
+    name = _required(config, "name")
+    method = config.get("method", name.split(" ")[0] if " " in name else "GET")
+    statuses = {int(status): float(weight) for status, weight in config.get("statuses", {200: 1}).items()}
+    latency = dict(config.get("latency", {"distribution": "lognormal", "median_ms": 200, "sigma": 0.5}))
+    if latency.get("distribution") not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"Endpoint '{name}': unknown latency distribution '{latency.get('distribution')}'. Use one of: {', '.join(LATENCY_DISTRIBUTIONS)}")
+    return {
+        "name": name,
+        "method": method,
+        "url": config.get("url", f"https://example.com{name.split(' ')[-1]}"),
+        "weight": float(config.get("weight", 1)),
+        "statuses": (list(statuses), _cumulative(list(statuses.values()))),
+        "latency": latency,
+        "exception": config.get("exception", DEFAULT_EXCEPTION_MESSAGE),
+    }
+
+
+def _burst(config):
+    return {
+        "start": _minute_of_day(_required(config, "start")),
+        "minutes": float(config.get("minutes", 10)),
+        "error_rate": float(config.get("error_rate", 0.5)),
+        "status": int(config.get("status", 500)),
+        "endpoints": set(config["endpoints"]) if config.get("endpoints") else None,
+    }
+
+
+def _in_burst(burst, at, endpoint_name):
+    if burst["endpoints"] is not None and endpoint_name not in burst["endpoints"]:
+        return False
+    minute = at.hour * 60 + at.minute + at.second / 60
+    return 0 <= (minute - burst["start"]) % 1440 < burst["minutes"]
+
+
+def _latency(rng, latency):
+    distribution = latency["distribution"]
+    if distribution == "lognormal":
+        value = rng.lognormvariate(math.log(float(latency.get("median_ms", 200))), float(latency.get("sigma", 0.5)))
+    elif distribution == "pareto":
+        value = float(latency.get("scale_ms", 50)) * rng.paretovariate(float(latency.get("alpha", 1.5)))
+    else:
+        value = rng.uniform(float(latency.get("min_ms", 100)), float(latency.get("max_ms", 5000)))
+    return min(value, float(latency.get("max_ms", 120000)))
+
+
+def _cumulative(weights):
+    if not weights or sum(weights) <= 0:
+        raise ValueError("Weights must contain at least one positive value")
+    total = 0.0
+    cumulative = []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def _minute_of_day(value):
+    # Unquoted HH:MM in YAML 1.1 is a base 60 number, which already is the minute of the day
+    if isinstance(value, int):
+        return value
+    hours, minutes = str(value).split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _parse_start(value):
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _required(config, key):
+    if key not in config:
+        raise ValueError(f"Profile is missing '{key}'")
+    return config[key]
@@ -0,0 +1,83 @@
+import json
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+
+import pytest
+
+import main
+from exporters import read_records, span_files
+from profiles import WorkloadProfile
+
+START = datetime(2026, 1, 5, tzinfo=timezone.utc)
+
+PROFILE = {
+    "name": "test",
+    "duration_minutes": 5,
+    "endpoints": [
+        {"name": "GET /api/data", "url": "https://example.com/api/data", "weight": 3, "statuses": {"200": 0.9, "500": 0.1}},
+        {"name": "GET /api/reports", "url": "https://example.com/api/reports", "statuses": {"200": 1},
+         "latency": {"distribution": "pareto", "scale_ms": 50, "alpha": 1.5}},
+    ],
+    "users": {"count": 50, "distribution": "zipf", "zipf_s": 1.2},
+    "rate": {"eps": 4},
+}
+
+
+def _run_profile(monkeypatch, tmp_path, workers, output):
+    profile_path = tmp_path / "profile.json"
+    profile_path.write_text(json.dumps(PROFILE))
+    monkeypatch.setattr(sys, "argv", [
+        "main.py", "--profile", str(profile_path), "--seed", "42", "--start", "2026-01-05T00:00:00Z",
+        "--exporter", "jsonl", "--output", str(tmp_path / output), "--workers", str(workers),
+    ])
+    main.run_profile(main.parse_arguments())
+    return sorted(json.dumps(record, sort_keys=True) for path in span_files(str(tmp_path / output)) for record in read_records(path))
+
+
+def test_seeded_profile_identical_across_worker_counts(monkeypatch, tmp_path):
+    """Test that the same profile, seed and start produce identical spans with 1 and 3 workers."""
+    one = _run_profile(monkeypatch, tmp_path, 1, "one")
+    three = _run_profile(monkeypatch, tmp_path, 3, "three")
+    assert len(one) > 500
+    assert one == three
+    assert len(span_files(str(tmp_path / "three"))) == 3
+
+
+def test_segments_depend_only_on_seed_and_index():
+    """Test that a segment is the same whichever order segments are generated in, and differs per seed."""
+    profile = WorkloadProfile(PROFILE)
+    forward = [list(profile.generate_segment(42, START, index)) for index in range(profile.segment_count())]
+    backward = [list(profile.generate_segment(42, START, index)) for index in reversed(range(profile.segment_count()))]
+    assert forward == backward[::-1]
+    assert forward[0] != list(profile.generate_segment(43, START, 0))
+    for index, segment in enumerate(forward):
+        assert all(START.timestamp() + index * 60 <= request["start"].timestamp() < START.timestamp() + (index + 1) * 60 for request in segment)
+
+
+def test_daily_rate_curve_and_error_bursts():
+    """Test that the rate is interpolated on the daily curve and bursts override statuses."""
+    profile = WorkloadProfile({
+        **PROFILE,
+        "rate": {"daily": {"00:00": 0, "12:00": 120}},
+        "error_bursts": [{"start": "11:00", "minutes": 10, "error_rate": 1.0, "status": 503}],
+        "duration_minutes": 1440,
+    })
+    assert profile.rate(START.replace(hour=6)) == pytest.approx(60)
+    assert profile.rate(START.replace(hour=18)) == pytest.approx(60)
+    assert list(profile.generate_segment(1, START, 0)) == []
+
+    in_burst = list(profile.generate_segment(1, START, 11 * 60 + 5))
+    assert in_burst and {request["status"] for request in in_burst} == {503}
+
+
+def test_zipf_users_are_skewed():
+    """Test that with a zipf distribution the first users make most of the requests."""
+    profile = WorkloadProfile({**PROFILE, "duration_minutes": 30})
+    users = Counter(request["user_id"] for index in range(profile.segment_count()) for request in profile.generate_segment(7, START, index))
+    assert users.most_common(1)[0][0] == profile.user_ids[0]
+    assert users[profile.user_ids[0]] > 5 * users[profile.user_ids[-1]]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-v", __file__]))
@@ -0,0 +1,92 @@
+"""Benchmark the compact encoding against the verbatim JSON result.
+
+Builds a 50k-row fixture shaped like the raw user_activity result and compares
+payload size and serialization time of both encodings.
+
+Run with: python bench_compact.py [rows]
+"""
+import gzip
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from compact import decode_result, encode_result
+
+COLUMNS = [
+    ("timestamp", "datetime"),
+    ("name", "string"),
+    ("url", "string"),
+    ("resultCode", "string"),
+    ("duration", "real"),
+    ("exceptionCount", "long"),
+    ("exceptions", "dynamic"),
+    ("traceCount", "long"),
+    ("traces", "dynamic"),
+]
+
+ENDPOINTS = ["GET /api/orders", "GET /api/orders/{id}", "POST /api/orders", "GET /api/products", "GET /health"]
+EXCEPTIONS = [
+    {"outerType": "System.TimeoutException", "outerMessage": "The operation has timed out.", "stackTrace": "at Orders.Repository.Get()"},
+    {"outerType": "System.NullReferenceException", "outerMessage": "Object reference not set to an instance of an object.", "stackTrace": "at Orders.Api.Map()"},
+]
+TRACES = [
+    {"message": "Request started", "severityLevel": 1, "fromPath": "app/api.py", "fromFunction": "handle:42"},
+    {"message": "Loaded order from cache", "severityLevel": 0, "fromPath": "app/cache.py", "fromFunction": "get:17"},
+]
+
+
+def build_fixture(rows: int, seed: int = 42) -> dict:
+    """Build an Application Insights result with the columns of the raw user_activity query."""
+    rng = random.Random(seed)
+    timestamp = datetime(2025, 4, 1, tzinfo=timezone.utc)
+    data = []
+    for _ in range(rows):
+        timestamp -= timedelta(microseconds=rng.randint(1_000, 2_000_000))
+        name = rng.choice(ENDPOINTS)
+        failed = rng.random() < 0.05
+        exceptions = [rng.choice(EXCEPTIONS)] if failed else []
+        traces = rng.sample(TRACES, rng.randint(0, 2))
+        data.append([
+            timestamp.strftime("%Y-%m-%dT%H:%M:%S.%f").rstrip("0").rstrip(".") + "Z",
+            name,
+            "https://shop.example.com" + name.split(" ")[1].replace("{id}", str(rng.randint(1, 50))),
+            "500" if failed else "200",
+            round(rng.lognormvariate(3, 1), 4),
+            len(exceptions),
+            json.dumps(exceptions),
+            len(traces),
+            json.dumps(traces),
+        ])
+    return {"tables": [{"name": "PrimaryResult", "columns": [{"name": n, "type": t} for n, t in COLUMNS], "rows": data}]}
+
+
+def timed(function, repeat: int = 5):
+    """Return the result and the best time in milliseconds of repeated calls."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main(rows: int) -> None:
+    fixture = build_fixture(rows)
+
+    verbatim, verbatim_ms = timed(lambda: json.dumps(fixture))
+    compact, compact_ms = timed(lambda: json.dumps(encode_result(fixture)))
+    _, decode_ms = timed(lambda: decode_result(json.loads(compact)))
+    assert decode_result(json.loads(compact)) == json.loads(verbatim), "Round trip changed the result"
+
+    print(f"{rows} rows")
+    print(f"{'encoding':<10}{'bytes':>12}{'gzip bytes':>12}{'serialize ms':>14}")
+    for name, payload, elapsed in (("json", verbatim, verbatim_ms), ("compact", compact, compact_ms)):
+        print(f"{name:<10}{len(payload):>12}{len(gzip.compress(payload.encode())):>12}{elapsed:>14.1f}")
+    print(f"compact is {len(compact) / len(verbatim):.1%} of the json size, decoding takes {decode_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
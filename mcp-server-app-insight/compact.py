@@ -0,0 +1,176 @@
+"""Compact columnar encoding of Application Insights query results.
+
+The Application Insights REST API returns every table as a list of columns and
+a list of rows. Timestamps, URLs, operation names and exception messages repeat
+on almost every row, so forwarding the rows verbatim spends most of the payload
+on repetition. The compact encoding stores each table column by column:
+
+- string-like columns are dictionary encoded: the distinct values once, plus
+  one index per row
+- datetime columns are delta encoded: the first timestamp in 100ns ticks, plus
+  the difference to the previous row in ticks
+- numeric columns are typed arrays: little-endian int64 or float64 values,
+  base64 encoded
+
+A column that can't be encoded without loss (e.g. a datetime column with nulls)
+falls back to dictionary encoding or to a plain list of values. decode_result
+turns a compact result back into the original tables.
+"""
+import base64
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# Encodings of the user_activity tool
+JSON = "json"
+COMPACT = "compact"
+ENCODINGS = (JSON, COMPACT)
+
+# Column encodings
+PLAIN = "plain"
+DICTIONARY = "dict"
+DELTA = "delta"
+TYPED_ARRAY = "array"
+
+# Naive UTC, so isoformat() has no offset
+_EPOCH = datetime(1970, 1, 1)
+_ONE_SECOND = timedelta(seconds=1)
+_TICKS_PER_SECOND = 10_000_000
+_INTEGER_TYPES = ("int", "long")
+_REAL_TYPES = ("real", "double", "decimal")
+_INT64_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+
+def encode_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Encode an Application Insights query result with the compact columnar encoding."""
+    return {
+        "encoding": COMPACT,
+        "tables": [_encode_table(table) for table in result.get("tables", [])],
+    }
+
+
+def decode_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode a compact result back into Application Insights tables with columns and rows."""
+    if result.get("encoding") != COMPACT:
+        raise ValueError(f"Not a compact result: encoding is {result.get('encoding')!r}")
+    return {"tables": [_decode_table(table) for table in result["tables"]]}
+
+
+def _encode_table(table: Dict[str, Any]) -> Dict[str, Any]:
+    rows = table.get("rows", [])
+    columns = []
+    for position, column in enumerate(table.get("columns", [])):
+        values = [row[position] for row in rows]
+        encoded = {"name": column["name"], "type": column["type"]}
+        encoded.update(_encode_column(column["type"], values))
+        columns.append(encoded)
+    return {"name": table.get("name"), "rowCount": len(rows), "columns": columns}
+
+
+def _decode_table(table: Dict[str, Any]) -> Dict[str, Any]:
+    columns = [{"name": column["name"], "type": column["type"]} for column in table["columns"]]
+    values = [_decode_column(column) for column in table["columns"]]
+    return {"name": table.get("name"), "columns": columns, "rows": [list(row) for row in zip(*values)]}
+
+
+def _encode_column(column_type: str, values: List[Any]) -> Dict[str, Any]:
+    if column_type == "datetime":
+        encoded = _encode_delta(values)
+        if encoded is not None:
+            return encoded
+    elif column_type in _INTEGER_TYPES:
+        if all(type(value) is int and _INT64_RANGE[0] <= value <= _INT64_RANGE[1] for value in values):
+            return _encode_array("q", values)
+        return {"encoding": PLAIN, "values": values}
+    elif column_type in _REAL_TYPES:
+        if all(type(value) in (int, float) for value in values):
+            return _encode_array("d", values)
+        return {"encoding": PLAIN, "values": values}
+    elif column_type == "bool":
+        return {"encoding": PLAIN, "values": values}
+
+    # Strings, guids, timespans and dynamic values (sent as JSON strings)
+    dictionary: Dict[Any, int] = {}
+    try:
+        indexes = [dictionary.setdefault(value, len(dictionary)) for value in values]
+    except TypeError:
+        # Dynamic values can also arrive as lists or objects, which can't be dictionary keys
+        return {"encoding": PLAIN, "values": values}
+    return {"encoding": DICTIONARY, "dictionary": list(dictionary), "indexes": indexes}
+
+
+def _decode_column(column: Dict[str, Any]) -> List[Any]:
+    encoding = column["encoding"]
+    if encoding == PLAIN:
+        return column["values"]
+    if encoding == DICTIONARY:
+        dictionary = column["dictionary"]
+        return [dictionary[index] for index in column["indexes"]]
+    if encoding == DELTA:
+        values = []
+        ticks = column["start"]
+        for delta in column["deltas"]:
+            ticks += delta
+            values.append(_format_ticks(ticks))
+        return values
+    if encoding == TYPED_ARRAY:
+        data = array(column["dtype"])
+        data.frombytes(base64.b64decode(column["data"]))
+        if sys.byteorder == "big":
+            data.byteswap()
+        return data.tolist()
+    raise ValueError(f"Unknown column encoding {encoding!r}")
+
+
+def _encode_delta(values: List[Any]) -> Optional[Dict[str, Any]]:
+    """Delta encode timestamps, or return None if they wouldn't decode to the same strings."""
+    ticks = []
+    for value in values:
+        parsed = _parse_ticks(value) if isinstance(value, str) else None
+        if parsed is None:
+            return None
+        ticks.append(parsed)
+    start = ticks[0] if ticks else 0
+    deltas = [current - previous for previous, current in zip([start] + ticks, ticks)]
+    return {"encoding": DELTA, "start": start, "deltas": deltas}
+
+
+def _encode_array(dtype: str, values: List[Any]) -> Dict[str, Any]:
+    data = array(dtype, values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return {"encoding": TYPED_ARRAY, "dtype": dtype, "data": base64.b64encode(data.tobytes()).decode("ascii")}
+
+
+def _parse_ticks(value: str) -> Optional[int]:
+    """Parse a timestamp in the format written by _format_ticks into 100ns ticks since the epoch.
+
+    Returns None for any other format, as it wouldn't survive the round trip.
+    """
+    seconds, _, fraction = value.partition(".")
+    if fraction:
+        fraction = fraction[:-1] if fraction.endswith("Z") else ""
+        if not fraction or len(fraction) > 7 or fraction.endswith("0") or not fraction.isdigit():
+            return None
+    elif seconds.endswith("Z"):
+        seconds = seconds[:-1]
+    else:
+        return None
+    if len(seconds) != 19 or seconds[10] != "T":
+        return None
+    try:
+        parsed = datetime.fromisoformat(seconds)
+    except ValueError:
+        return None
+    whole = (parsed - _EPOCH) // _ONE_SECOND
+    return whole * _TICKS_PER_SECOND + int(fraction.ljust(7, "0") or 0)
+
+
+def _format_ticks(ticks: int) -> str:
+    """Format ticks the way Application Insights does: trailing zeros of the fraction dropped."""
+    whole, fraction = divmod(ticks, _TICKS_PER_SECOND)
+    formatted = (_EPOCH + timedelta(seconds=whole)).isoformat()
+    if fraction:
+        formatted += "." + f"{fraction:07d}".rstrip("0")
+    return formatted + "Z"
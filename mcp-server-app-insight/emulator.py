@@ -0,0 +1,434 @@
+"""Local stand-in for the Application Insights query API.
+
+Implements the `/v1/apps/{id}/query` contract (GET with query parameters or POST
+with a JSON body) on top of synthetic telemetry shaped like the data produced by
+app-insight-data-generator: requests to a few example.com URLs with random
+status codes, an EX-627 exception on every 500 and a log trace per request.
+
+The emulator doesn't execute KQL. It recognizes the queries built by queries.py
+(output mode, user ids and limits) and answers them with tables of the same
+columns. Latency, server errors and throttling can be injected to exercise the
+MCP server under realistic conditions.
+
+Instead of synthetic telemetry, the emulator can serve spans recorded by the
+generator's jsonl or parquet exporter (--telemetry).
+
+Run with: python emulator.py --port 8081 --latency-ms 200 --error-rate 0.01
+and start the server with APPLICATION_INSIGHT_API_URL=http://localhost:8081
+"""
+import argparse
+import bisect
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from queries import USER_COLUMN
+from timespan import aligned_window
+
+_QUERY_PATH = re.compile(r"^/v1/apps/(?P<app_id>[^/]+)/query$")
+_SINGLE_USER = re.compile(r"\['User\.AuthenticatedUserId'\] == (\"(?:[^\"\\]|\\.)*\")")
+_MANY_USERS = re.compile(USER_COLUMN + r" in \((.*?)\);", re.DOTALL)
+_LIMIT = re.compile(r"top (\d+) by (timestamp|requests|exceptions) desc")
+
+URLS = ["https://example.com/login", "https://example.com/api/data", "https://example.com/products"]
+STATUSES = [200, 201, 400, 404, 500]
+EXCEPTION_MESSAGE = "EX-627 - Unexpected exception when verifying user role access to engine"
+BAD_REQUEST_MESSAGE = "Bad request from user likely due to outdated client software."
+
+RAW_COLUMNS = [
+    ("timestamp", "datetime"), ("name", "string"), ("url", "string"), ("resultCode", "string"), ("duration", "real"),
+    ("exceptionCount", "long"), ("exceptions", "dynamic"), ("traceCount", "long"), ("traces", "dynamic"),
+]
+SUMMARY_COLUMNS = [
+    ("section", "string"), ("requests", "long"), ("failedRequests", "long"),
+    ("p50Duration", "real"), ("p95Duration", "real"), ("p99Duration", "real"),
+    ("firstSeen", "datetime"), ("lastSeen", "datetime"), ("name", "string"), ("resultCode", "string"),
+    ("exceptions", "long"), ("sampleMessage", "string"), ("outerType", "string"),
+]
+
+
+class SyntheticTelemetry:
+    """Deterministic requests, exceptions and traces per user.
+
+    Args:
+        requests_per_day: Number of requests each user makes per day
+        seed: Seed for the telemetry, the same seed gives the same telemetry
+    """
+
+    def __init__(self, requests_per_day: int = 50, seed: int = 0):
+        self.requests_per_day = requests_per_day
+        self.seed = seed
+
+    def requests(self, user_id: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """The user's requests in the window, newest first."""
+        requests = []
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < end:
+            rng = random.Random(f"{self.seed}:{user_id}:{day.date()}")
+            for _ in range(self.requests_per_day):
+                timestamp = day + timedelta(microseconds=rng.randrange(86_400_000_000))
+                request = self._request(rng, timestamp)
+                if start <= timestamp < end:
+                    requests.append(request)
+            day += timedelta(days=1)
+        requests.sort(key=lambda request: request["timestamp"], reverse=True)
+        return requests
+
+    @staticmethod
+    def _request(rng: random.Random, timestamp: datetime) -> Dict[str, Any]:
+        url = rng.choice(URLS)
+        status = rng.choice(STATUSES)
+        response_time = round(rng.uniform(0.1, 5.0), 2)
+        exceptions = []
+        traces = [{
+            "message": f"Request to {url} | Status: {status} | Response Time: {response_time}s",
+            "severityLevel": 1,
+            "fromPath": "main.py",
+            "fromFunction": "generate_web_request:65",
+        }]
+        if status == 500:
+            exceptions.append({
+                "outerType": "builtins.ValueError",
+                "outerMessage": EXCEPTION_MESSAGE,
+                "innermostType": "builtins.ValueError",
+                "innermostMessage": EXCEPTION_MESSAGE,
+                "stackTrace": 'File "main.py", line 57, in generate_web_request',
+            })
+        elif status == 400:
+            traces.insert(0, {"message": BAD_REQUEST_MESSAGE, "severityLevel": 1, "fromPath": "main.py", "fromFunction": "generate_web_request:61"})
+        return {
+            "timestamp": timestamp,
+            "name": "simulated_request",
+            "url": url,
+            "resultCode": str(status),
+            "success": status < 400,
+            "duration": response_time * 1000,
+            "exceptions": exceptions,
+            "traces": traces,
+        }
+
+
+class RecordedTelemetry:
+    """Requests and exceptions from spans recorded by the generator's jsonl or parquet exporter.
+
+    Server spans with a User.AuthenticatedUserId attribute are requests, their
+    exception events are exceptions. Recorded spans have no log traces.
+
+    Args:
+        path: A .jsonl or .parquet file, or a directory of them
+    """
+
+    def __init__(self, path: str):
+        self._requests: Dict[str, List[Dict[str, Any]]] = {}
+        for file_path in _span_files(path):
+            for record in _read_records(file_path):
+                request = self._request(record)
+                if request is not None:
+                    self._requests.setdefault(record["attributes"]["User.AuthenticatedUserId"], []).append(request)
+        for requests in self._requests.values():
+            requests.sort(key=lambda request: request["timestamp"])
+        self._timestamps = {user_id: [request["timestamp"] for request in requests] for user_id, requests in self._requests.items()}
+
+    @property
+    def users(self) -> List[str]:
+        return sorted(self._requests)
+
+    def requests(self, user_id: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """The user's requests in the window, newest first."""
+        timestamps = self._timestamps.get(user_id, [])
+        requests = self._requests.get(user_id, [])
+        return requests[bisect.bisect_left(timestamps, start):bisect.bisect_left(timestamps, end)][::-1]
+
+    @staticmethod
+    def _request(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        attributes = record.get("attributes") or {}
+        if record.get("kind") != "SERVER" or "User.AuthenticatedUserId" not in attributes:
+            return None
+        status = int(attributes.get("http.status_code", 200))
+        exceptions = [{
+            "outerType": event["attributes"].get("exception.type"),
+            "outerMessage": event["attributes"].get("exception.message"),
+            "innermostType": event["attributes"].get("exception.type"),
+            "innermostMessage": event["attributes"].get("exception.message"),
+            "stackTrace": event["attributes"].get("exception.stacktrace"),
+        } for event in record.get("events") or [] if event["name"] == "exception"]
+        return {
+            "timestamp": datetime.fromtimestamp(record["start_time"] / 1e9, timezone.utc),
+            "name": record["name"],
+            "url": attributes.get("http.url"),
+            "resultCode": str(status),
+            "success": status < 400,
+            "duration": (record["end_time"] - record["start_time"]) / 1e6,
+            "exceptions": exceptions,
+            "traces": [],
+        }
+
+
+class AppInsightsEmulator:
+    """HTTP server answering Application Insights queries from synthetic telemetry.
+
+    Args:
+        host: Interface to listen on
+        port: Port to listen on, 0 picks a free port
+        api_key: Required x-api-key header value. None accepts any key
+        requests_per_day: Synthetic requests per user and day
+        latency_ms: Added latency of every response
+        jitter_ms: Random extra latency of up to this many milliseconds
+        error_rate: Share of queries answered with 500
+        throttle_rate: Share of queries answered with 429 and Retry-After
+        seed: Seed of the telemetry and of the injected latency and errors
+        telemetry: Telemetry to serve instead of SyntheticTelemetry, e.g. RecordedTelemetry
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        api_key: Optional[str] = None,
+        requests_per_day: int = 50,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0,
+        throttle_rate: float = 0,
+        seed: int = 0,
+        telemetry: Optional[Any] = None,
+    ):
+        self.api_key = api_key
+        self.telemetry = telemetry or SyntheticTelemetry(requests_per_day, seed)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.queries = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> "AppInsightsEmulator":
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "AppInsightsEmulator":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def handle_query(self, headers: Dict[str, str], query: str, timespan: Optional[str]) -> Tuple[int, Dict[str, str], Dict[str, Any]]:
+        """Answer a query. Returns the status code, extra headers and JSON body."""
+        with self._lock:
+            self.queries += 1
+            delay = (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000
+            draw = self._random.random()
+        if delay:
+            time.sleep(delay)
+
+        if self.api_key is not None and headers.get("x-api-key") != self.api_key:
+            return 403, {}, _error("InvalidApiKeyError", "Valid authentication was not provided")
+        if draw < self.throttle_rate:
+            return 429, {"Retry-After": "1"}, _error("ThrottledError", "Too many requests, retry after 1 second")
+        if draw < self.throttle_rate + self.error_rate:
+            return 500, {}, _error("InternalServerError", "Injected server error")
+
+        window = aligned_window(timespan or "P1D", 1)
+        if window is None:
+            return 400, {}, _error("BadArgumentError", f"Invalid timespan '{timespan}'")
+        try:
+            return 200, {}, self._answer(query, window.start, window.end)
+        except ValueError as e:
+            return 400, {}, _error("BadArgumentError", str(e))
+
+    def _answer(self, query: str, start: datetime, end: datetime) -> Dict[str, Any]:
+        many = _MANY_USERS.search(query)
+        single = _SINGLE_USER.search(query)
+        if many:
+            user_ids = json.loads(f"[{many.group(1)}]")
+        elif single:
+            user_ids = [json.loads(single.group(1))]
+        else:
+            raise ValueError("The emulator only answers the user activity queries of queries.py")
+        limits = {kind: int(limit) for limit, kind in _LIMIT.findall(query)}
+        summary = 'section = "overview"' in query
+        errors_only = "where success == false or toint(resultCode) >= 400" in query
+
+        columns = SUMMARY_COLUMNS if summary else RAW_COLUMNS
+        rows = []
+        for user_id in user_ids:
+            requests = self.telemetry.requests(user_id, start, end)
+            if summary:
+                user_rows = _summary_rows(requests, limits.get("requests", 1000), limits.get("exceptions", 1000))
+            else:
+                if errors_only:
+                    requests = [request for request in requests if not request["success"]]
+                user_rows = [_raw_row(request) for request in requests[:limits.get("timestamp", 1000)]]
+            rows.extend([user_id] + row if many else row for row in user_rows)
+
+        if many:
+            columns = [(USER_COLUMN, "string")] + columns
+        return {"tables": [{
+            "name": "PrimaryResult",
+            "columns": [{"name": name, "type": column_type} for name, column_type in columns],
+            "rows": rows,
+        }]}
+
+    def _handler_class(self):
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                self._query(params.get("query", [""])[0], params.get("timespan", [None])[0])
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send(400, {}, _error("BadArgumentError", "Request body is not valid JSON"))
+                    return
+                self._query(body.get("query", ""), body.get("timespan"))
+
+            def _query(self, query: str, timespan: Optional[str]):
+                if not _QUERY_PATH.match(urlparse(self.path).path):
+                    self._send(404, {}, _error("PathNotFoundError", f"Unknown path {self.path}"))
+                    return
+                headers = {name.lower(): value for name, value in self.headers.items()}
+                self._send(*emulator.handle_query(headers, query, timespan))
+
+            def _send(self, status: int, headers: Dict[str, str], body: Dict[str, Any]):
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(content)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _raw_row(request: Dict[str, Any]) -> List[Any]:
+    return [
+        _format(request["timestamp"]), request["name"], request["url"], request["resultCode"], request["duration"],
+        len(request["exceptions"]), json.dumps(request["exceptions"]),
+        len(request["traces"]), json.dumps(request["traces"]),
+    ]
+
+
+def _summary_rows(requests: List[Dict[str, Any]], requests_limit: int, exceptions_limit: int) -> List[List[Any]]:
+    rows = []
+    if requests:
+        durations = [request["duration"] for request in requests]
+        rows.append([
+            "overview", len(requests), sum(not request["success"] for request in requests), *_percentiles(durations),
+            _format(requests[-1]["timestamp"]), _format(requests[0]["timestamp"]), None, None, None, None, None,
+        ])
+
+    groups: Dict[Tuple[str, str], List[float]] = {}
+    for request in requests:
+        groups.setdefault((request["name"], request["resultCode"]), []).append(request["duration"])
+    by_count = sorted(groups.items(), key=lambda item: len(item[1]), reverse=True)[:requests_limit]
+    for (name, result_code), durations in by_count:
+        rows.append(["requests", len(durations), None, *_percentiles(durations), None, None, name, result_code, None, None, None])
+
+    exceptions: Dict[str, List[str]] = {}
+    for request in requests:
+        for exception in request["exceptions"]:
+            exceptions.setdefault(exception["outerType"], []).append(exception["outerMessage"])
+    by_count = sorted(exceptions.items(), key=lambda item: len(item[1]), reverse=True)[:exceptions_limit]
+    for outer_type, messages in by_count:
+        rows.append(["exceptions", None, None, None, None, None, None, None, None, None, len(messages), messages[0], outer_type])
+    return rows
+
+
+def _percentiles(values: List[float]) -> List[float]:
+    ordered = sorted(values)
+    return [ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in (50, 95, 99)]
+
+
+def _format(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f").rstrip("0").rstrip(".") + "Z"
+
+
+def _span_files(path: str) -> List[str]:
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*.jsonl")) + glob.glob(os.path.join(path, "*.parquet")))
+    return [path]
+
+
+def _read_records(path: str):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches():
+            for record in batch.to_pylist():
+                for column in ("attributes", "events"):
+                    record[column] = json.loads(record[column]) if record[column] else None
+                yield record
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _error(code: str, message: str) -> Dict[str, Any]:
+    return {"error": {"code": code, "message": message}}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Emulate the Application Insights query API with synthetic telemetry.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8081, help="Port to listen on (default: 8081)")
+    parser.add_argument("--api-key", default=None, help="Required x-api-key header value (default: any key)")
+    parser.add_argument("--requests-per-day", type=int, default=50, help="Synthetic requests per user and day (default: 50)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added latency of every response (default: 0)")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra latency of up to this many ms (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of queries answered with 500 (default: 0)")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="Share of queries answered with 429 (default: 0)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the telemetry and injected faults (default: 0)")
+    parser.add_argument("--telemetry", default=None, help="Serve spans recorded by the generator's jsonl or parquet exporter, a file or directory")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    telemetry = RecordedTelemetry(args.telemetry) if args.telemetry else None
+    emulator = AppInsightsEmulator(
+        args.host, args.port, args.api_key, args.requests_per_day,
+        args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, args.seed, telemetry,
+    )
+    if telemetry:
+        print(f"Serving recorded telemetry of {len(telemetry.users)} users from {args.telemetry}")
+    print(f"Application Insights emulator listening on {emulator.url}")
+    try:
+        emulator.serve_forever()
+    except KeyboardInterrupt:
+        emulator.stop()
@@ -0,0 +1,161 @@
+"""Load test of the MCP server against the local Application Insights emulator.
+
+Starts the emulator and server.py, then drives N concurrent SSE sessions that
+each call user_activity a number of times, and reports throughput, p50/p99
+latency of the tool calls and the memory of the server process.
+
+Run with: python loadtest.py --sessions 20 --calls 10 --latency-ms 200
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+from emulator import AppInsightsEmulator
+
+SERVER_URL = "http://localhost:8080/sse"
+
+
+def start_server(api_url: str, env: Optional[Dict[str, str]] = None, timeout: float = 15.0) -> subprocess.Popen:
+    """Start server.py against the given query API and wait until it accepts connections."""
+    server_env = os.environ.copy()
+    server_env.update({
+        "APPLICATION_INSIGHT_APP_ID": "emulator",
+        "APPLICATION_INSIGHT_API_KEY": "emulator",
+        "APPLICATION_INSIGHT_API_URL": api_url,
+    })
+    server_env.update(env or {})
+    process = subprocess.Popen(
+        [sys.executable, "server.py"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=server_env,
+    )
+    if not wait_for_port("localhost", 8080, timeout, process):
+        stop_server(process)
+        raise RuntimeError("server.py didn't start listening on port 8080")
+    return process
+
+
+def wait_for_port(host: str, port: int, timeout: float, process: Optional[subprocess.Popen] = None) -> bool:
+    """Poll until a TCP connection to host:port succeeds. Gives up when the process exits."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def stop_server(process: subprocess.Popen, timeout: float = 1.0) -> None:
+    """Stop the server, killing it if open SSE streams hold up the graceful shutdown."""
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def memory_mb(pid: int) -> Dict[str, Optional[float]]:
+    """Current (VmRSS) and peak (VmHWM) resident memory of a process in MB. Linux only."""
+    memory = {"rss_mb": None, "peak_rss_mb": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    memory["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("VmHWM:"):
+                    memory["peak_rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return memory
+
+
+async def run_session(session_number: int, calls: int, users: int, arguments: Dict[str, Any], latencies: List[float], errors: List[str]) -> None:
+    """One SSE session calling user_activity for a round robin of users."""
+    async with sse_client(SERVER_URL, timeout=30) as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            for call in range(calls):
+                user_id = f"user{(session_number * calls + call) % users}@example.com"
+                start = time.perf_counter()
+                result = await session.call_tool("user_activity", {"userId": user_id, **arguments})
+                latencies.append((time.perf_counter() - start) * 1000)
+                text = result.content[0].text if result.content else ""
+                if result.isError or not text or '"error"' in text[:20]:
+                    errors.append(text[:200])
+
+
+async def run_load(sessions: int, calls: int, users: int, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the sessions concurrently against the running server and summarize the tool calls."""
+    latencies: List[float] = []
+    errors: List[str] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(n, calls, users, arguments, latencies, errors) for n in range(sessions)))
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latencies)
+    return {
+        "sessions": sessions,
+        "calls": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 2),
+        "calls_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(ordered), 1) if ordered else None,
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 1) if ordered else None,
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Load test the MCP server against the Application Insights emulator.")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent SSE sessions (default: 10)")
+    parser.add_argument("--calls", type=int, default=10, help="user_activity calls per session (default: 10)")
+    parser.add_argument("--users", type=int, default=None, help="Distinct users, fewer than sessions x calls gives cache hits (default: sessions x calls)")
+    parser.add_argument("--mode", default="raw", help="Output mode of user_activity (default: raw)")
+    parser.add_argument("--duration", default="P1D", help="Duration of user_activity (default: P1D)")
+    parser.add_argument("--requests-per-day", type=int, default=50, help="Synthetic requests per user and day (default: 50)")
+    parser.add_argument("--latency-ms", type=float, default=100, help="Emulator latency per query (default: 100)")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Emulator random extra latency (default: 50)")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of queries failing with 500 (default: 0)")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="Share of queries throttled with 429 (default: 0)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+    emulator = AppInsightsEmulator(
+        requests_per_day=args.requests_per_day,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+    ).start()
+    server = start_server(emulator.url)
+    try:
+        arguments = {"duration": args.duration, "mode": args.mode, "limit": 1000, "encoding": "json"}
+        report = asyncio.run(run_load(args.sessions, args.calls, args.users or args.sessions * args.calls, arguments))
+        report.update(memory_mb(server.pid))
+        report["emulator_queries"] = emulator.queries
+    finally:
+        stop_server(server)
+        emulator.stop()
+
+    for name, value in report.items():
+        print(f"{name:<18}{value}")
+
+
+if __name__ == "__main__":
+    main()
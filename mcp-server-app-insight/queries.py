@@ -0,0 +1,217 @@
+"""KQL queries used by the Application Insights MCP server.
+
+Reductions such as summaries and row limits are part of the queries, so the
+Application Insights backend does the work and only the reduced result is sent
+back to the server and on to the LLM.
+
+Exceptions and traces are never joined row by row onto requests, as a request
+with 3 exceptions and 40 traces would then yield 120 rows. Instead the user's
+operation ids are collected first, exceptions and traces are semi-joined on
+them and aggregated to one row per operation, and only then joined onto the
+requests. The result has exactly one row per request.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+from timespan import TimeWindow
+
+# Output modes of the user_activity tool
+RAW = "raw"
+SUMMARY = "summary"
+ERRORS_ONLY = "errors-only"
+OUTPUT_MODES = (SUMMARY, ERRORS_ONLY, RAW)
+
+# Maximum number of exceptions and traces listed per request
+MAX_ITEMS_PER_REQUEST = 20
+
+# Column with the user id in users_activity results
+USER_COLUMN = "userId"
+
+_EXCEPTION_ITEM = 'bag_pack("outerType", outerType, "outerMessage", outerMessage, "innermostType", innermostType, "innermostMessage", innermostMessage, "stackTrace", tostring(details[0].rawStack))'
+_TRACE_ITEM = 'bag_pack("message", message, "severityLevel", severityLevel, "fromPath", tostring(customDimensions["code.filepath"]), "fromFunction", strcat(tostring(customDimensions["code.function"]), ":", tostring(customDimensions["code.lineno"])))'
+_ERROR_FILTER = "where success == false or toint(resultCode) >= 400"
+
+
+def user_activity_query(user_id: str, mode: str = RAW, limit: int = 1000, window: Optional[TimeWindow] = None) -> str:
+    """Build the KQL query for a user's activity in the given output mode.
+
+    Args:
+        user_id: The email address of the user to get activity for
+        mode: One of OUTPUT_MODES
+        limit: Maximum number of rows returned (per section in summary mode)
+        window: Time window applied to every table in the query. The timespan sent
+            with the query still applies when no window is given
+
+    Returns:
+        The KQL query
+    """
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode '{mode}'. Use one of: {', '.join(OUTPUT_MODES)}")
+
+    in_window = f"| where timestamp between ({window.kql_range})" if window else ""
+
+    user_requests = f"""
+        let userRequests = requests
+        {in_window}
+        | where customDimensions['User.AuthenticatedUserId'] == {_kql_string(user_id)};"""
+
+    if mode == SUMMARY:
+        return user_requests + f"""
+        union
+        (
+            userRequests
+            | summarize requests = count(), failedRequests = countif(success == false),
+                p50Duration = percentile(duration, 50), p95Duration = percentile(duration, 95), p99Duration = percentile(duration, 99),
+                firstSeen = min(timestamp), lastSeen = max(timestamp)
+            | extend section = "overview"
+        ),
+        (
+            userRequests
+            | summarize requests = count(), p50Duration = percentile(duration, 50), p95Duration = percentile(duration, 95), p99Duration = percentile(duration, 99) by name, resultCode
+            | top {limit} by requests desc
+            | extend section = "requests"
+        ),
+        (
+            exceptions
+            {in_window}
+            | where operation_Id in ((userRequests | distinct operation_Id))
+            | summarize exceptions = count(), sampleMessage = take_any(outerMessage) by outerType
+            | top {limit} by exceptions desc
+            | extend section = "exceptions"
+        )
+        | project-reorder section
+    """
+
+    selected_requests = "userRequests"
+    if mode == ERRORS_ONLY:
+        selected_requests = f"userRequests | {_ERROR_FILTER}"
+
+    # Merging requests with their exceptions and traces, one row per request
+    return user_requests + f"""
+        let selectedRequests = {selected_requests}
+        | top {limit} by timestamp desc
+        | project timestamp, name, url, resultCode, duration, operation_Id;
+        let operationIds = selectedRequests | distinct operation_Id;
+        let operationExceptions = exceptions
+        {in_window}
+        | where operation_Id in (operationIds)
+        | summarize exceptionCount = count(), exceptions = make_list({_EXCEPTION_ITEM}, {MAX_ITEMS_PER_REQUEST}) by operation_Id;
+        let operationTraces = traces
+        {in_window}
+        | where operation_Id in (operationIds)
+        | summarize traceCount = count(), traces = make_list({_TRACE_ITEM}, {MAX_ITEMS_PER_REQUEST}) by operation_Id;
+        selectedRequests
+        | join kind=leftouter operationExceptions on operation_Id
+        | join kind=leftouter operationTraces on operation_Id
+        | order by timestamp desc
+        | project timestamp, name, url, resultCode, duration, exceptionCount = coalesce(exceptionCount, 0), exceptions, traceCount = coalesce(traceCount, 0), traces
+    """
+
+
+def users_activity_query(user_ids: List[str], mode: str = RAW, limit: int = 1000, window: Optional[TimeWindow] = None) -> str:
+    """Build one KQL query for the activity of several users, with a userId column on every row.
+
+    The limit applies per user (and per section in summary mode), so one busy user
+    can't crowd out the others. Use partition_by_user to split the result.
+
+    Args:
+        user_ids: The email addresses of the users to get activity for
+        mode: One of OUTPUT_MODES
+        limit: Maximum number of rows returned per user
+        window: Time window applied to every table in the query
+
+    Returns:
+        The KQL query
+    """
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode '{mode}'. Use one of: {', '.join(OUTPUT_MODES)}")
+    if not user_ids:
+        raise ValueError("At least one user id is required")
+
+    in_window = f"| where timestamp between ({window.kql_range})" if window else ""
+    users = ", ".join(_kql_string(user_id) for user_id in user_ids)
+
+    user_requests = f"""
+        let userRequests = requests
+        {in_window}
+        | extend {USER_COLUMN} = tostring(customDimensions['User.AuthenticatedUserId'])
+        | where {USER_COLUMN} in ({users});"""
+
+    if mode == SUMMARY:
+        return user_requests + f"""
+        union
+        (
+            userRequests
+            | summarize requests = count(), failedRequests = countif(success == false),
+                p50Duration = percentile(duration, 50), p95Duration = percentile(duration, 95), p99Duration = percentile(duration, 99),
+                firstSeen = min(timestamp), lastSeen = max(timestamp) by {USER_COLUMN}
+            | extend section = "overview"
+        ),
+        (
+            userRequests
+            | summarize requests = count(), p50Duration = percentile(duration, 50), p95Duration = percentile(duration, 95), p99Duration = percentile(duration, 99) by {USER_COLUMN}, name, resultCode
+            | partition hint.strategy=native by {USER_COLUMN} (top {limit} by requests desc)
+            | extend section = "requests"
+        ),
+        (
+            exceptions
+            {in_window}
+            | where operation_Id in ((userRequests | distinct operation_Id))
+            | join kind=inner (userRequests | distinct operation_Id, {USER_COLUMN}) on operation_Id
+            | summarize exceptions = count(), sampleMessage = take_any(outerMessage) by {USER_COLUMN}, outerType
+            | partition hint.strategy=native by {USER_COLUMN} (top {limit} by exceptions desc)
+            | extend section = "exceptions"
+        )
+        | project-reorder {USER_COLUMN}, section
+    """
+
+    selected_requests = "userRequests"
+    if mode == ERRORS_ONLY:
+        selected_requests = f"userRequests | {_ERROR_FILTER}"
+
+    # Same shape as user_activity_query, with the row limit applied per user
+    return user_requests + f"""
+        let selectedRequests = {selected_requests}
+        | partition hint.strategy=native by {USER_COLUMN} (top {limit} by timestamp desc)
+        | project {USER_COLUMN}, timestamp, name, url, resultCode, duration, operation_Id;
+        let operationIds = selectedRequests | distinct operation_Id;
+        let operationExceptions = exceptions
+        {in_window}
+        | where operation_Id in (operationIds)
+        | summarize exceptionCount = count(), exceptions = make_list({_EXCEPTION_ITEM}, {MAX_ITEMS_PER_REQUEST}) by operation_Id;
+        let operationTraces = traces
+        {in_window}
+        | where operation_Id in (operationIds)
+        | summarize traceCount = count(), traces = make_list({_TRACE_ITEM}, {MAX_ITEMS_PER_REQUEST}) by operation_Id;
+        selectedRequests
+        | join kind=leftouter operationExceptions on operation_Id
+        | join kind=leftouter operationTraces on operation_Id
+        | order by {USER_COLUMN} asc, timestamp desc
+        | project {USER_COLUMN}, timestamp, name, url, resultCode, duration, exceptionCount = coalesce(exceptionCount, 0), exceptions, traceCount = coalesce(traceCount, 0), traces
+    """
+
+
+def partition_by_user(result: Dict[str, Any], user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Split a users_activity_query result into one result per user.
+
+    Each user's result has the same tables as a user_activity result, without the
+    userId column. Users without any rows get empty tables.
+    """
+    partitioned = {user_id: {"tables": []} for user_id in user_ids}
+    for table in result.get("tables", []):
+        names = [column["name"] for column in table["columns"]]
+        position = names.index(USER_COLUMN)
+        columns = table["columns"][:position] + table["columns"][position + 1:]
+        rows_by_user = {user_id: [] for user_id in user_ids}
+        for row in table["rows"]:
+            rows = rows_by_user.get(row[position])
+            if rows is not None:
+                rows.append(row[:position] + row[position + 1:])
+        for user_id, rows in rows_by_user.items():
+            partitioned[user_id]["tables"].append({"name": table["name"], "columns": columns, "rows": rows})
+    return partitioned
+
+
+def _kql_string(value: str) -> str:
+    """Quote a value as a KQL string literal. JSON escaping is valid KQL escaping."""
+    return json.dumps(value)
@@ -0,0 +1,100 @@
+"""Byte-budgeted LRU cache for Application Insights query results.
+
+Results are cached per query key together with the end of the aligned time
+window they were computed for (see timespan.py). A lookup in the same window is
+a fresh hit. A lookup in a later window can optionally be served the previous
+result while the caller refreshes it in the background (stale-while-revalidate).
+"""
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional
+
+
+@dataclass
+class CachedResult:
+    value: Any
+    window_end: datetime
+    size: int
+    stale: bool = False
+
+
+class QueryResultCache:
+    """LRU cache bounded by the total JSON size of the cached results.
+
+    Args:
+        max_bytes: Budget for the total JSON size of cached results. 0 disables caching
+        stale_seconds: How far behind the current window a result may be and still be
+            served while it is refreshed. 0 disables stale-while-revalidate
+    """
+
+    def __init__(self, max_bytes: int = 50 * 1024 * 1024, stale_seconds: float = 0):
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        self._entries: "OrderedDict[Hashable, CachedResult]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, window_end: datetime) -> Optional[CachedResult]:
+        """Return the cached result for key in the given window, a stale result, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.window_end == window_end:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return CachedResult(entry.value, entry.window_end, entry.size)
+            if entry is not None and 0 <= (window_end - entry.window_end).total_seconds() <= self.stale_seconds:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                return CachedResult(entry.value, entry.window_end, entry.size, stale=True)
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, window_end: datetime, value: Any) -> None:
+        """Cache a JSON serializable result, evicting least recently used results over budget."""
+        size = len(json.dumps(value))
+        with self._lock:
+            existing = self._entries.pop(key, None)
+            if existing is not None:
+                self._bytes -= existing.size
+            if size > self.max_bytes:
+                return
+            self._entries[key] = CachedResult(value, window_end, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+    def start_refresh(self, key: Hashable) -> bool:
+        """Claim the background refresh of key. Returns False if one is already running."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def finish_refresh(self, key: Hashable) -> None:
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.stale_hits) / lookups, 3) if lookups else None,
+            }
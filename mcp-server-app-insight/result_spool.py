@@ -0,0 +1,165 @@
+"""Spool large Application Insights results to disk in pages.
+
+Parsing a query response with response.json() holds the whole body and every
+row in memory at once, which doesn't scale to multi-day queries. SpoolWriter is
+fed the response body chunk by chunk, parses it with a streaming JSON parser and
+writes the rows to page files of a bounded size, so only the current chunk and
+page are ever in memory. The pages are then served one at a time as MCP
+resources.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import ijson
+from ijson.common import ObjectBuilder
+
+_TABLE = "tables.item"
+_ROW = "tables.item.rows.item"
+_COLUMN = "tables.item.columns.item"
+
+
+class ResultSpool:
+    """Directory of spooled results, each a manifest and numbered page files.
+
+    Args:
+        directory: Where results are spooled. Defaults to a new temporary directory
+        ttl_seconds: How long a result can be read after it was spooled
+    """
+
+    def __init__(self, directory: Optional[str] = None, ttl_seconds: float = 3600):
+        self.directory = directory or tempfile.mkdtemp(prefix="appinsights-spool-")
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._results: Dict[str, Dict[str, Any]] = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def create(self, page_size: int = 1000) -> "SpoolWriter":
+        """Start spooling a new result with at most page_size rows per page."""
+        self.expire()
+        result_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.directory, result_id))
+        return SpoolWriter(self, result_id, page_size)
+
+    def manifest(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """The manifest of a completed result, or None if it's unknown or expired."""
+        with self._lock:
+            entry = self._results.get(result_id)
+        if entry is None or time.monotonic() > entry["expires_at"]:
+            return None
+        return entry["manifest"]
+
+    def read_page(self, result_id: str, page: int) -> Optional[Dict[str, Any]]:
+        """Read one page of a completed result, or None if it doesn't exist."""
+        manifest = self.manifest(result_id)
+        if manifest is None or not 0 <= page < manifest["pages"]:
+            return None
+        with open(self._page_path(result_id, page), encoding="utf-8") as f:
+            return json.load(f)
+
+    def expire(self) -> None:
+        """Delete the files of expired results."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [result_id for result_id, entry in self._results.items() if now > entry["expires_at"]]
+            for result_id in expired:
+                del self._results[result_id]
+        for result_id in expired:
+            self.discard(result_id)
+
+    def discard(self, result_id: str) -> None:
+        shutil.rmtree(os.path.join(self.directory, result_id), ignore_errors=True)
+
+    def _complete(self, result_id: str, manifest: Dict[str, Any]) -> None:
+        with self._lock:
+            self._results[result_id] = {"manifest": manifest, "expires_at": time.monotonic() + self.ttl_seconds}
+
+    def _page_path(self, result_id: str, page: int) -> str:
+        return os.path.join(self.directory, result_id, f"{page}.json")
+
+
+class SpoolWriter:
+    """Incrementally parses a query response body and writes its rows to pages.
+
+    Feed the body with feed() as it arrives and call close() at the end, or
+    discard() if the response can't be completed.
+    """
+
+    def __init__(self, spool: ResultSpool, result_id: str, page_size: int):
+        self.spool = spool
+        self.result_id = result_id
+        self.page_size = max(1, page_size)
+        self.rows = 0
+        self.pages = 0
+        self._tables: List[Dict[str, Any]] = []
+        self._table: Optional[Dict[str, Any]] = None
+        self._page_rows: List[Any] = []
+        self._row: Optional[ObjectBuilder] = None
+        self._events = ijson.sendable_list()
+        self._parser = ijson.parse_coro(self._events, use_float=True)
+
+    def feed(self, chunk: bytes) -> None:
+        """Parse the next chunk of the response body, writing every page that fills up."""
+        self._parser.send(chunk)
+        for prefix, event, value in self._events:
+            self._handle(prefix, event, value)
+        del self._events[:]
+
+    def close(self) -> Dict[str, Any]:
+        """Finish parsing and return the manifest of the spooled result."""
+        self._parser.close()
+        for prefix, event, value in self._events:
+            self._handle(prefix, event, value)
+        del self._events[:]
+        manifest = {"resultId": self.result_id, "rows": self.rows, "pages": self.pages, "tables": self._tables}
+        self.spool._complete(self.result_id, manifest)
+        return manifest
+
+    def discard(self) -> None:
+        self.spool.discard(self.result_id)
+
+    def _handle(self, prefix: str, event: str, value: Any) -> None:
+        if self._row is not None:
+            self._row.event(event, value)
+            if prefix == _ROW and event == "end_array":
+                self._page_rows.append(self._row.value)
+                self._row = None
+                if len(self._page_rows) >= self.page_size:
+                    self._write_page()
+        elif prefix == _ROW and event == "start_array":
+            self._row = ObjectBuilder()
+            self._row.event(event, value)
+        elif prefix == _TABLE and event == "start_map":
+            self._table = {"name": None, "columns": [], "rows": 0, "firstPage": self.pages, "pages": 0}
+        elif prefix == _TABLE and event == "end_map":
+            self._write_page()
+            self._tables.append(self._table)
+            self._table = None
+        elif prefix == f"{_TABLE}.name" and event == "string":
+            self._table["name"] = value
+        elif prefix == _COLUMN and event == "start_map":
+            self._table["columns"].append({})
+        elif prefix.startswith(f"{_COLUMN}.") and event in ("string", "number", "boolean", "null"):
+            self._table["columns"][-1][prefix[len(_COLUMN) + 1:]] = value
+
+    def _write_page(self) -> None:
+        if not self._page_rows:
+            return
+        page = {
+            "table": self._table["name"],
+            "page": self.pages,
+            "columns": self._table["columns"],
+            "rows": self._page_rows,
+        }
+        with open(self.spool._page_path(self.result_id, self.pages), "w", encoding="utf-8") as f:
+            json.dump(page, f)
+        self.rows += len(self._page_rows)
+        self._table["rows"] += len(self._page_rows)
+        self._table["pages"] += 1
+        self.pages += 1
+        self._page_rows = []
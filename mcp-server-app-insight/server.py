@@ -1,24 +1,72 @@
 # server.py
 """MCP server for Application Insights data retrieval."""
+import asyncio
+import email.utils
+import logging
 import os
-from typing import Dict, Any, Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
 
-import requests
+import httpx
+import ijson
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP, Context
 from pydantic import Field
 
+from compact import COMPACT, ENCODINGS, JSON, encode_result
+from queries import OUTPUT_MODES, RAW, SUMMARY, partition_by_user, user_activity_query, users_activity_query
+from result_cache import QueryResultCache
+from result_spool import ResultSpool
+from timespan import TimeWindow, aligned_window
+
 # Load environment variables
 load_dotenv()
 
 # Get Application Insights credentials
 APPLICATION_INSIGHT_APP_ID = os.getenv("APPLICATION_INSIGHT_APP_ID")
 APPLICATION_INSIGHT_API_KEY = os.getenv("APPLICATION_INSIGHT_API_KEY")
+# Base URL of the query API, e.g. the local emulator (emulator.py) for load tests
+APPLICATION_INSIGHT_API_URL = os.getenv("APPLICATION_INSIGHT_API_URL", "https://api.applicationinsights.io").rstrip("/")
 
 # Validate environment variables
 if not APPLICATION_INSIGHT_APP_ID or not APPLICATION_INSIGHT_API_KEY:
     raise ValueError("APPLICATION_INSIGHT_APP_ID and APPLICATION_INSIGHT_API_KEY must be set in .env file")
 
+# Shared async HTTP client, so a slow query never blocks other sessions on the event loop
+# and keep-alive connections to the Application Insights API are reused between calls
+http_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(float(os.getenv("APPLICATION_INSIGHT_TIMEOUT", "60")), connect=10.0),
+)
+
+logger = logging.getLogger(__name__)
+
+# Application Insights throttles queries per API key. At most this many queries run at
+# once, and throttled queries (429) are retried this many times after Retry-After.
+query_slots = asyncio.Semaphore(int(os.getenv("APPLICATION_INSIGHT_MAX_PARALLEL_QUERIES", "4")))
+MAX_RETRIES = int(os.getenv("APPLICATION_INSIGHT_MAX_RETRIES", "3"))
+MAX_RETRY_DELAY = 60.0
+
+# users_activity compiles this many users into one query with `in (...)`
+USERS_PER_QUERY = int(os.getenv("APPLICATION_INSIGHT_USERS_PER_QUERY", "50"))
+
+# Cache for user_activity results. Relative durations are aligned to buckets of this
+# many seconds, which is also how old the newest cached telemetry can get.
+CACHE_BUCKET_SECONDS = int(os.getenv("APPLICATION_INSIGHT_CACHE_BUCKET_SECONDS", "300"))
+result_cache = QueryResultCache(
+    max_bytes=int(os.getenv("APPLICATION_INSIGHT_CACHE_MAX_BYTES", str(50 * 1024 * 1024))),
+    stale_seconds=float(os.getenv("APPLICATION_INSIGHT_CACHE_STALE_SECONDS", "0")),
+)
+
+# Large results of user_activity_pages are spooled to disk and read page by page
+result_spool = ResultSpool(
+    directory=os.getenv("APPLICATION_INSIGHT_SPOOL_DIR"),
+    ttl_seconds=float(os.getenv("APPLICATION_INSIGHT_SPOOL_TTL_SECONDS", "3600")),
+)
+RESULT_PAGE_URI = "appinsights://results/{result_id}/{page}"
+
+# Keeps background refreshes alive until they are done
+_background_tasks = set()
+
 # Create an MCP server
 mcp = FastMCP(
     name="AppInsightsServer", 
@@ -29,66 +77,299 @@ mcp = FastMCP(
 
 
 @mcp.tool()
-def user_activity(
+async def user_activity(
     userId: str = Field(description="The email address of the user to get activity for"), 
     duration: str = Field(description="Duration to get activity for in ISO8601 format. Default: P1D (1 day)", default="P1D"),
+    mode: str = Field(description="Output mode. 'summary': request counts and p50/p95/p99 duration by name and resultCode plus top exception types. 'errors-only': failed requests with their exceptions and traces. 'raw': all requests with their exceptions and traces. Default: raw", default=RAW),
+    limit: int = Field(description="Maximum number of rows to return, newest first (per section in summary mode). Default: 1000", default=1000),
+    encoding: str = Field(description="Result encoding. 'json': tables with columns and rows as returned by Application Insights. 'compact': columnar tables with dictionary encoded strings, delta encoded timestamps and numeric columns as base64 typed arrays. Default: json", default=JSON),
     ctx: Context = Field(description="MCP context"),
 ) -> Dict[str, Any]:
     """Get a list of all HTTP requests for a specific user in a given duration.
     
     Returns Application Insights data including requests, exceptions, and traces.
+    Start with mode 'summary' or 'errors-only' for busy users to keep the result small.
+    """
+    if mode not in OUTPUT_MODES:
+        return {"error": f"Unknown mode '{mode}'. Use one of: {', '.join(OUTPUT_MODES)}"}
+    if encoding not in ENCODINGS:
+        return {"error": f"Unknown encoding '{encoding}'. Use one of: {', '.join(ENCODINGS)}"}
+    result = await _app_insight_call(userId, duration, ctx, mode, limit)
+    if result and encoding == COMPACT:
+        return encode_result(result)
+    return result
+
+
+@mcp.tool()
+async def users_activity(
+    userIds: List[str] = Field(description="The email addresses of the users to get activity for"),
+    duration: str = Field(description="Duration to get activity for in ISO8601 format. Default: P1D (1 day)", default="P1D"),
+    mode: str = Field(description="Output mode, see user_activity. Start with 'summary' when triaging many users. Default: summary", default=SUMMARY),
+    limit: int = Field(description="Maximum number of rows to return per user, newest first (per section in summary mode). Default: 100", default=100),
+    encoding: str = Field(description="Result encoding per user, see user_activity. Default: json", default=JSON),
+    ctx: Context = Field(description="MCP context"),
+) -> Dict[str, Any]:
+    """Get the activity of many users at once, e.g. the users affected by an incident.
+    
+    Returns the result for each user under 'users', in the same format as user_activity,
+    and the users whose query failed under 'errors'.
     """
-    return _app_insight_call(userId, duration, ctx)
+    if mode not in OUTPUT_MODES:
+        return {"error": f"Unknown mode '{mode}'. Use one of: {', '.join(OUTPUT_MODES)}"}
+    if encoding not in ENCODINGS:
+        return {"error": f"Unknown encoding '{encoding}'. Use one of: {', '.join(ENCODINGS)}"}
+    user_ids = list(dict.fromkeys(user_id.strip() for user_id in userIds if user_id.strip()))
+    if not user_ids:
+        return {"error": "No user ids given"}
+
+    window = aligned_window(duration, CACHE_BUCKET_SECONDS)
+    chunks = [user_ids[i:i + USERS_PER_QUERY] for i in range(0, len(user_ids), USERS_PER_QUERY)]
+    await ctx.debug(f"Querying activity of {len(user_ids)} users in {len(chunks)} queries")
+
+    async def query_chunk(chunk: List[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        query = users_activity_query(chunk, mode, limit, window)
+        cache_key = ("users_activity", tuple(chunk), _window_key(duration, window), mode, limit)
+        try:
+            return await _cached_query(cache_key, query, duration, window, f"{len(chunk)} users", ctx)
+        except httpx.HTTPError as e:
+            return None, f"Error: {e!r}"
+
+    # Chunks run concurrently, query_slots bounds how many reach Application Insights at once
+    results = await asyncio.gather(*(query_chunk(chunk) for chunk in chunks))
+
+    users: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for chunk, (result, error) in zip(chunks, results):
+        if error:
+            await ctx.error(f"Query for {len(chunk)} users failed: {error}")
+            errors.update({user_id: error for user_id in chunk})
+            continue
+        for user_id, user_result in partition_by_user(result, chunk).items():
+            users[user_id] = encode_result(user_result) if encoding == COMPACT else user_result
+    return {"users": users, "errors": errors}
 
 
-def _app_insight_call(userId: str, duration: str, ctx: Context) -> Optional[Dict[str, Any]]:
-    """Make a query to Application Insights API.
+@mcp.tool()
+async def user_activity_pages(
+    userId: str = Field(description="The email address of the user to get activity for"),
+    duration: str = Field(description="Duration to get activity for in ISO8601 format. Default: P7D (7 days)", default="P7D"),
+    mode: str = Field(description="Output mode, see user_activity. Default: raw", default=RAW),
+    limit: int = Field(description="Maximum number of rows, newest first. Default: 100000", default=100000),
+    pageSize: int = Field(description="Maximum number of rows per page. Default: 1000", default=1000),
+    ctx: Context = Field(description="MCP context"),
+) -> Dict[str, Any]:
+    """Get a large activity result of a user, e.g. for several days, page by page.
+    
+    The result is written to pages as it is received. Returns the number of rows and
+    pages per table. Read the pages as resources appinsights://results/{resultId}/{page}.
+    """
+    if mode not in OUTPUT_MODES:
+        return {"error": f"Unknown mode '{mode}'. Use one of: {', '.join(OUTPUT_MODES)}"}
+
+    window = aligned_window(duration, CACHE_BUCKET_SECONDS)
+    query = user_activity_query(userId, mode, limit, window)
+    writer = result_spool.create(pageSize)
+
+    async def spool_body(response: httpx.Response) -> Dict[str, Any]:
+        # Only the current chunk and page are held in memory, full pages go to disk
+        pages = 0
+        async for chunk in response.aiter_bytes():
+            writer.feed(chunk)
+            if writer.pages > pages:
+                pages = writer.pages
+                await ctx.report_progress(writer.rows)
+        return writer.close()
+
+    await ctx.debug(f"Querying Application Insights for {userId} in {window.timespan if window else duration}, spooling pages of {pageSize} rows")
+    try:
+        manifest, error = await _post_query(query, window.timespan if window else duration, spool_body)
+    except ijson.JSONError as e:
+        manifest, error = None, f"Error: invalid response from Application Insights, {e}"
+    except BaseException:
+        writer.discard()
+        raise
+    if error:
+        writer.discard()
+        await ctx.error(error)
+        return {"error": error}
+
+    await ctx.report_progress(manifest["rows"], manifest["rows"])
+    return {**manifest, "pageUri": RESULT_PAGE_URI.format(result_id=manifest["resultId"], page="{page}")}
+
+
+@mcp.resource(RESULT_PAGE_URI, name="result_page", description="One page of a result spooled by user_activity_pages", mime_type="application/json")
+def result_page(result_id: str, page: int) -> Dict[str, Any]:
+    """Rows of one page of a spooled result, with the table name and columns."""
+    content = result_spool.read_page(result_id, int(page))
+    if content is None:
+        raise ValueError(f"Page {page} of result {result_id} doesn't exist or has expired")
+    return content
+
+
+@mcp.resource("appinsights://cache/stats", name="cache_stats", description="Hit and miss counters and size of the query result cache", mime_type="application/json")
+def cache_stats() -> Dict[str, Any]:
+    """Statistics of the query result cache for operators."""
+    return result_cache.stats()
+
+
+async def _app_insight_call(userId: str, duration: str, ctx: Context, mode: str = RAW, limit: int = 1000) -> Optional[Dict[str, Any]]:
+    """Make a query to Application Insights API, using cached results where possible.
+    
+    Relative durations are aligned to absolute time buckets, so repeated calls for
+    the same user within a bucket are answered from the cache.
     
     Args:
         userId: The email address of the user to get activity for
         duration: Duration to get activity for in ISO8601 format
         ctx: MCP context
+        mode: Output mode, see queries.OUTPUT_MODES
+        limit: Maximum number of rows to return
         
     Returns:
         Dictionary containing the Application Insights data or None if the request failed
     """
-    # Define KQL query - merging requests, exceptions, and traces into a single result
-    query = f"""
-        requests
-        | where customDimensions['User.AuthenticatedUserId'] == "{userId}"        
-        | join kind=leftouter (
-            exceptions
-            | project operation_Id, outerType, outerMessage, innermostType, innermostMessage, exceptionStackTrace=details[0].rawStack
-        ) on operation_Id
-        | join kind=leftouter (
-            traces
-            | project operation_Id, traceMessage = message, traceSeverityLevel = severityLevel, traceFromPath=customDimensions["code.filepath"], traceFromFunction=strcat(tostring(customDimensions["code.function"]), ":",tostring(customDimensions["code.lineno"]))
-        ) on operation_Id
-        | project timestamp, name, url, resultCode, duration, outerType, outerMessage, innermostType, innermostMessage, exceptionStackTrace, traceMessage, traceSeverityLevel, traceFromPath, traceFromFunction
+    window = aligned_window(duration, CACHE_BUCKET_SECONDS)
+    query = user_activity_query(userId, mode, limit, window)
+    cache_key = ("user_activity", userId, _window_key(duration, window), mode, limit)
+    result, error = await _cached_query(cache_key, query, duration, window, userId, ctx)
+    if error:
+        await ctx.error(error)
+    return result
+
+
+async def _cached_query(
+    cache_key: Hashable, query: str, duration: str, window: Optional[TimeWindow], subject: str, ctx: Context
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Run a query for an aligned time window through the result cache.
+    
+    Args:
+        cache_key: Key of the result in the cache
+        query: The KQL query, filtered on window if there is one
+        duration: Duration or interval the window was aligned from
+        window: Aligned time window, or None to query without cache
+        subject: Who the query is for, used in debug messages
+        ctx: MCP context
+        
+    Returns:
+        Tuple of the query result and an error message, one of which is None
     """
+    if window is None:
+        await ctx.debug(f"Duration {duration} can't be aligned to a time window, querying without cache")
+        return await _run_query(query, duration)
 
-    # Construct the REST API URL
-    url = f"https://api.applicationinsights.io/v1/apps/{APPLICATION_INSIGHT_APP_ID}/query"
+    cached = result_cache.get(cache_key, window.end)
+    if cached:
+        await ctx.debug(f"Returning {'stale' if cached.stale else 'cached'} result for {subject} in {window.timespan}")
+        if cached.stale and result_cache.start_refresh(cache_key):
+            _run_in_background(_refresh(cache_key, query, window))
+        return cached.value, None
+
+    await ctx.debug(f"Querying Application Insights for {subject} in {window.timespan}")
+    result, error = await _run_query(query, window.timespan)
+    if not error:
+        result_cache.put(cache_key, window.end, result)
+    return result, error
+
+
+def _window_key(duration: str, window: Optional[TimeWindow]) -> Hashable:
+    """Relative durations are keyed by their length, absolute ones by the interval itself."""
+    if window is None:
+        return duration
+    return window.timespan if "/" in duration else window.end - window.start
 
-    ctx.debug(f"Preparing request to {url}")
 
-    # Set the parameters and headers, including the API key
-    params = {
+async def _run_query(query: str, timespan: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Run a KQL query against the Application Insights API.
+    
+    Returns:
+        Tuple of the query result and an error message, one of which is None
+    """
+    return await _post_query(query, timespan, _read_json)
+
+
+async def _read_json(response: httpx.Response) -> Dict[str, Any]:
+    await response.aread()
+    return response.json()
+
+
+async def _post_query(
+    query: str, timespan: str, read_body: Callable[[httpx.Response], Awaitable[Any]]
+) -> Tuple[Optional[Any], Optional[str]]:
+    """Send a KQL query to the Application Insights API and read a successful response with read_body.
+    
+    The response body is streamed, so read_body can process it as it arrives.
+    
+    Returns:
+        Tuple of the value returned by read_body and an error message, one of which is None
+    """
+    # Construct the REST API URL
+    url = f"{APPLICATION_INSIGHT_API_URL}/v1/apps/{APPLICATION_INSIGHT_APP_ID}/query"
+
+    # Queries are sent as POST, as queries for many users don't fit in a URL
+    body = {
         "query": query,
-        "timespan": duration
+        "timespan": timespan
     }
     headers = {
         "x-api-key": APPLICATION_INSIGHT_API_KEY
     }
 
-    # Make the GET request
-    response = requests.get(url, params=params, headers=headers)
+    # If the MCP client cancels the tool call, the request and any pending retry are cancelled too
+    attempt = 0
+    while True:
+        async with query_slots:
+            async with http_client.stream("POST", url, json=body, headers=headers) as response:
+                if response.status_code == 200:
+                    return await read_body(response), None
+                await response.aread()
+        if response.status_code != 429 or attempt >= MAX_RETRIES:
+            return None, f"Error: {response.status_code}, {response.text}"
+        delay = _retry_delay(response, attempt)
+        logger.info(f"Application Insights throttled the query, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        attempt += 1
 
-    if response.status_code == 200:
-        return response.json()
-    else:
-        ctx.error(f"Error: {response.status_code}, {response.text}")
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying a throttled query, from Retry-After if sent."""
+    delay = _parse_retry_after(response.headers.get("Retry-After"))
+    if delay is None:
+        delay = 2.0 ** attempt
+    return min(max(delay, 0.0), MAX_RETRY_DELAY)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
         return None
+    return retry_at.timestamp() - time.time()
+
+
+async def _refresh(cache_key, query: str, window: TimeWindow) -> None:
+    """Refresh a stale cache entry after its stale value was returned."""
+    try:
+        result, error = await _run_query(query, window.timespan)
+        if error:
+            logger.warning(f"Background refresh of {cache_key} failed: {error}")
+        else:
+            result_cache.put(cache_key, window.end, result)
+    finally:
+        result_cache.finish_refresh(cache_key)
+
+
+def _run_in_background(coroutine) -> None:
+    """Run a coroutine without awaiting it, keeping a reference until it is done."""
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from bench_compact import build_fixture
+from compact import COMPACT, DELTA, DICTIONARY, PLAIN, TYPED_ARRAY, decode_result, encode_result
+
+
+def _result(columns, rows):
+    return {"tables": [{"name": "PrimaryResult", "columns": [{"name": n, "type": t} for n, t in columns], "rows": rows}]}
+
+
+def test_round_trip_of_raw_result():
+    """Test that a raw user_activity result survives encoding and decoding unchanged."""
+    fixture = build_fixture(500)
+    encoded = json.loads(json.dumps(encode_result(fixture)))
+    assert encoded["encoding"] == COMPACT
+    assert decode_result(encoded) == fixture
+    assert len(json.dumps(encoded)) < len(json.dumps(fixture)) / 2
+
+
+def test_column_encodings():
+    """Test that strings are dictionary encoded, timestamps delta encoded and numbers typed arrays."""
+    result = _result(
+        [("timestamp", "datetime"), ("name", "string"), ("duration", "real"), ("count", "long"), ("success", "bool")],
+        [
+            ["2025-04-01T12:00:01.5Z", "GET /", 12.5, 1, True],
+            ["2025-04-01T12:00:00Z", "GET /", 3.25, 0, False],
+            ["2025-04-01T11:59:59.1234567Z", "POST /", 0.0, 7, True],
+        ],
+    )
+    columns = encode_result(result)["tables"][0]["columns"]
+    assert [column["encoding"] for column in columns] == [DELTA, DICTIONARY, TYPED_ARRAY, TYPED_ARRAY, PLAIN]
+    assert columns[0]["deltas"] == [0, -15000000, -8765433]
+    assert columns[1]["dictionary"] == ["GET /", "POST /"]
+    assert columns[1]["indexes"] == [0, 0, 1]
+    assert decode_result(encode_result(result)) == result
+
+
+def test_lossy_columns_fall_back():
+    """Test that columns with nulls or unusual formats fall back to lossless encodings."""
+    result = _result(
+        [("timestamp", "datetime"), ("other", "datetime"), ("count", "long"), ("duration", "real")],
+        [
+            ["2025-04-01T12:00:00Z", "2025-04-01T12:00:00.500Z", 1, 1.5],
+            [None, "2025-04-01T12:00:00Z", None, "NaN"],
+        ],
+    )
+    columns = encode_result(result)["tables"][0]["columns"]
+    assert [column["encoding"] for column in columns] == [DICTIONARY, DICTIONARY, PLAIN, PLAIN]
+    assert decode_result(encode_result(result)) == result
+
+
+def test_unhashable_dynamic_values_fall_back_to_plain():
+    """Test that dynamic columns with list or object values are encoded plain instead of failing."""
+    result = _result(
+        [("name", "string"), ("exceptions", "dynamic"), ("traces", "dynamic")],
+        [
+            ["GET /", [{"outerType": "ValueError"}], '[{"message": "a"}]'],
+            ["GET /", None, '[{"message": "a"}]'],
+            ["POST /", {"outerType": "KeyError"}, None],
+        ],
+    )
+    columns = encode_result(result)["tables"][0]["columns"]
+    assert [column["encoding"] for column in columns] == [DICTIONARY, PLAIN, DICTIONARY]
+    assert decode_result(json.loads(json.dumps(encode_result(result)))) == result
+
+
+def test_decode_rejects_json_result():
+    """Test that decoding a result that isn't compact raises an error."""
+    with pytest.raises(ValueError):
+        decode_result(_result([("name", "string")], [["a"]]))
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
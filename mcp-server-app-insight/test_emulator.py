@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from emulator import AppInsightsEmulator, RecordedTelemetry
+from loadtest import run_load, start_server, stop_server
+from queries import SUMMARY, user_activity_query, users_activity_query
+
+
+def _query(emulator: AppInsightsEmulator, query: str, timespan: str = "P2D", api_key: str = "key") -> httpx.Response:
+    return httpx.post(f"{emulator.url}/v1/apps/app/query", json={"query": query, "timespan": timespan}, headers={"x-api-key": api_key})
+
+
+def test_emulator_answers_user_activity_queries():
+    """Test that the emulator answers the queries of queries.py with tables of the same columns."""
+    with AppInsightsEmulator(api_key="key", requests_per_day=30) as emulator:
+        raw = _query(emulator, user_activity_query("a@example.com", limit=10)).json()["tables"][0]
+        assert [column["name"] for column in raw["columns"]][:3] == ["timestamp", "name", "url"]
+        assert len(raw["rows"]) == 10
+        assert raw["rows"] == sorted(raw["rows"], reverse=True), "Rows should be newest first"
+
+        summary = _query(emulator, user_activity_query("a@example.com", SUMMARY)).json()["tables"][0]
+        assert summary["rows"][0][0] == "overview"
+
+        users = _query(emulator, users_activity_query(["a@example.com", "b@example.com"], limit=3)).json()["tables"][0]
+        assert {row[0] for row in users["rows"]} == {"a@example.com", "b@example.com"}
+        assert len(users["rows"]) == 6
+
+        assert _query(emulator, user_activity_query("a@example.com"), api_key="wrong").status_code == 403
+        assert _query(emulator, "requests | take 10").status_code == 400
+
+
+def test_emulator_injects_faults():
+    """Test that the emulator injects throttling and server errors at the configured rates."""
+    with AppInsightsEmulator(throttle_rate=0.5, error_rate=0.5) as emulator:
+        statuses = [_query(emulator, user_activity_query("a@example.com")).status_code for _ in range(20)]
+    assert set(statuses) == {429, 500}
+
+
+def test_emulator_serves_recorded_spans(tmp_path):
+    """Test that spans recorded by the generator's jsonl exporter are served as requests and exceptions."""
+    def span(user_id, start_ms, status, events=()):
+        return {
+            "name": "simulated_request", "kind": "SERVER", "trace_id": "0" * 32, "span_id": "1" * 16, "parent_span_id": None,
+            "start_time": (1743508800000 + start_ms) * 1_000_000, "end_time": (1743508800000 + start_ms + 250) * 1_000_000,
+            "status": "UNSET", "attributes": {"http.url": "https://example.com/login", "http.status_code": status, "User.AuthenticatedUserId": user_id},
+            "events": list(events), "resource": {},
+        }
+    exception = {"name": "exception", "timestamp": 0, "attributes": {"exception.type": "ValueError", "exception.message": "EX-627", "exception.stacktrace": "..."}}
+    records = [span("a@example.com", 0, 200), span("a@example.com", 1000, 500, [exception]), span("b@example.com", 0, 200)]
+    (tmp_path / "spans-0.jsonl").write_text("".join(json.dumps(record) + "\n" for record in records))
+
+    telemetry = RecordedTelemetry(str(tmp_path))
+    assert telemetry.users == ["a@example.com", "b@example.com"]
+    with AppInsightsEmulator(telemetry=telemetry) as emulator:
+        response = _query(emulator, user_activity_query("a@example.com"), timespan="2025-04-01T00:00:00Z/2025-04-02T00:00:00Z")
+    rows = response.json()["tables"][0]["rows"]
+    assert [(row[0], row[3], row[4], row[5]) for row in rows] == [
+        ("2025-04-01T12:00:01Z", "500", 250.0, 1),
+        ("2025-04-01T12:00:00Z", "200", 250.0, 0),
+    ]
+    assert json.loads(rows[0][6])[0]["outerMessage"] == "EX-627"
+
+
+def test_load_against_emulator():
+    """Test concurrent SSE sessions calling user_activity through the server against the emulator."""
+    with AppInsightsEmulator(latency_ms=20) as emulator:
+        server = start_server(emulator.url)
+        try:
+            arguments = {"duration": "P1D", "mode": "raw", "limit": 100, "encoding": "json"}
+            report = asyncio.run(run_load(sessions=3, calls=2, users=6, arguments=arguments))
+        finally:
+            stop_server(server)
+    assert report["calls"] == 6
+    assert report["errors"] == 0
+    assert emulator.queries == 6
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
@@ -0,0 +1,161 @@
+import os
+import re
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from dotenv import load_dotenv
+
+from queries import ERRORS_ONLY, MAX_ITEMS_PER_REQUEST, RAW, SUMMARY, partition_by_user, user_activity_query, users_activity_query
+from timespan import TimeWindow, aligned_window
+
+load_dotenv()
+
+WINDOW = TimeWindow(datetime(2025, 4, 1, tzinfo=timezone.utc), datetime(2025, 4, 2, tzinfo=timezone.utc))
+
+
+def test_summary_mode_aggregates_in_kql():
+    """Test that summary mode is computed by the backend with summarize and top."""
+    query = user_activity_query("user@example.com", SUMMARY, limit=10)
+    assert "summarize requests = count()" in query
+    assert "percentile(duration, 99)" in query
+    assert "top 10 by requests desc" in query
+    assert "top 10 by exceptions desc" in query
+    assert "traces" not in query
+
+
+def test_errors_only_mode_filters_failed_requests():
+    """Test that errors-only mode filters failed requests before joining."""
+    query = user_activity_query("user@example.com", ERRORS_ONLY, limit=50)
+    assert "where success == false or toint(resultCode) >= 400" in query
+    assert "top 50 by timestamp desc" in query
+
+
+def test_raw_mode_is_limited():
+    """Test that raw mode applies the row limit in the query."""
+    query = user_activity_query("user@example.com", RAW, limit=1000)
+    assert "top 1000 by timestamp desc" in query
+
+
+def test_user_id_is_escaped():
+    """Test that the user id can't break out of the KQL string literal."""
+    query = user_activity_query('a" or 1==1 //', RAW)
+    assert '== "a\\" or 1==1 //"' in query
+
+
+def test_unknown_mode_rejected():
+    """Test that an unknown output mode raises an error."""
+    with pytest.raises(ValueError):
+        user_activity_query("user@example.com", "everything")
+
+
+def test_every_table_filtered_on_window():
+    """Test that requests, exceptions and traces are all filtered on the same time window."""
+    window_filter = "where timestamp between (datetime(2025-04-01T00:00:00Z) .. datetime(2025-04-02T00:00:00Z))"
+    assert user_activity_query("user@example.com", RAW, window=WINDOW).count(window_filter) == 3
+    assert user_activity_query("user@example.com", SUMMARY, window=WINDOW).count(window_filter) == 2
+    assert "between" not in user_activity_query("user@example.com", RAW)
+
+
+def test_exceptions_and_traces_aggregated_before_join():
+    """Test that exceptions and traces are reduced to one row per operation before joining onto requests."""
+    query = user_activity_query("user@example.com", RAW, limit=100, window=WINDOW)
+    assert "where operation_Id in (operationIds)" in query
+    assert f"), {MAX_ITEMS_PER_REQUEST}) by operation_Id;" in query
+    assert query.count("summarize") == 2
+    # The row limit is applied to requests before any join
+    assert query.index("top 100 by timestamp desc") < query.index("join")
+    assert "join kind=leftouter operationExceptions on operation_Id" in query
+    assert "join kind=leftouter operationTraces on operation_Id" in query
+
+
+def test_users_compiled_into_one_query():
+    """Test that several users are queried with `in (...)` and the limit applies per user."""
+    query = users_activity_query(["a@example.com", 'b"@example.com'], RAW, limit=10, window=WINDOW)
+    assert 'userId in ("a@example.com", "b\\"@example.com")' in query
+    assert "partition hint.strategy=native by userId (top 10 by timestamp desc)" in query
+    assert query.count("between") == 3
+
+    summary = users_activity_query(["a@example.com"], SUMMARY, limit=5)
+    assert "by userId, name, resultCode" in summary
+    assert "partition hint.strategy=native by userId (top 5 by exceptions desc)" in summary
+
+    with pytest.raises(ValueError):
+        users_activity_query([], RAW)
+
+
+def test_partition_by_user():
+    """Test that a multi-user result is split per user without the userId column."""
+    result = {"tables": [{
+        "name": "PrimaryResult",
+        "columns": [{"name": "userId", "type": "string"}, {"name": "name", "type": "string"}],
+        "rows": [["a@example.com", "GET /"], ["b@example.com", "GET /b"], ["a@example.com", "POST /"]],
+    }]}
+    partitioned = partition_by_user(result, ["a@example.com", "b@example.com", "c@example.com"])
+    assert partitioned["a@example.com"]["tables"][0]["rows"] == [["GET /"], ["POST /"]]
+    assert partitioned["a@example.com"]["tables"][0]["columns"] == [{"name": "name", "type": "string"}]
+    assert partitioned["b@example.com"]["tables"][0]["rows"] == [["GET /b"]]
+    assert partitioned["c@example.com"]["tables"][0]["rows"] == []
+
+
+def _statements(query):
+    """The let tables of a query by name, and its final statement, each as a list of pipeline operators."""
+    *lets, final = [statement.strip() for statement in query.split(";")]
+    tables = {}
+    for statement in lets:
+        name, expression = re.match(r"let (\w+) = (.*)", statement, re.S).groups()
+        tables[name] = [operator.strip() for operator in expression.split("|")]
+    return tables, [operator.strip() for operator in final.split("|")]
+
+
+@pytest.mark.parametrize("mode", [RAW, ERRORS_ONLY])
+@pytest.mark.parametrize("build", [
+    lambda mode: user_activity_query("user@example.com", mode, limit=100, window=WINDOW),
+    lambda mode: users_activity_query(["a@example.com", "b@example.com"], mode, limit=100, window=WINDOW),
+])
+def test_one_row_per_request_offline(build, mode):
+    """Test that every join of the raw and errors-only queries keeps one row per request."""
+    # A left outer join never drops a request and only repeats one when the right side
+    # has several rows per key, so each right side must be summarized by the join key
+    tables, final = _statements(build(mode))
+    assert final[0] == "selectedRequests"
+    joins = [operator for operator in final[1:] if operator.startswith("join")]
+    assert len(joins) == 2
+    for join in joins:
+        kind, right, key = re.fullmatch(r"join kind=(\w+) (\w+) on (\w+)", join).groups()
+        assert kind == "leftouter"
+        assert tables[right][-1].startswith("summarize ")
+        assert tables[right][-1].endswith(f") by {key}")
+    assert all(operator.split()[0] in ("join", "order", "project") for operator in final[1:])
+    assert not any(operator.startswith(("mv-expand", "join", "union")) for operator in tables["selectedRequests"])
+
+
+@pytest.mark.skipif(
+    not (os.getenv("APPLICATION_INSIGHT_APP_ID") and os.getenv("APPLICATION_INSIGHT_API_KEY") and os.getenv("TEST_USER_ID")),
+    reason="Needs APPLICATION_INSIGHT_APP_ID, APPLICATION_INSIGHT_API_KEY and TEST_USER_ID",
+)
+def test_one_row_per_request_against_application_insights():
+    """Test against Application Insights that the raw query returns exactly one row per request."""
+    user_id = os.getenv("TEST_USER_ID")
+    window = aligned_window("P7D", 300)
+    url = f"https://api.applicationinsights.io/v1/apps/{os.getenv('APPLICATION_INSIGHT_APP_ID')}/query"
+    headers = {"x-api-key": os.getenv("APPLICATION_INSIGHT_API_KEY")}
+
+    def rows(query: str) -> list:
+        response = httpx.post(url, headers=headers, json={"query": query, "timespan": window.timespan}, timeout=60)
+        response.raise_for_status()
+        return response.json()["tables"][0]["rows"]
+
+    request_count = rows(f"""
+        requests
+        | where timestamp between ({window.kql_range})
+        | where customDimensions['User.AuthenticatedUserId'] == "{user_id}"
+        | count
+    """)[0][0]
+    result = rows(user_activity_query(user_id, RAW, limit=100000, window=window))
+    assert len(result) == request_count
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from result_cache import QueryResultCache
+from timespan import aligned_window, parse_duration
+
+
+def _at(minute: int, second: int = 0) -> datetime:
+    return datetime(2025, 4, 1, 12, minute, second, tzinfo=timezone.utc)
+
+
+def test_parse_duration():
+    """Test that ISO8601 durations with week, day and time parts are parsed."""
+    assert parse_duration("P1D") == timedelta(days=1)
+    assert parse_duration("PT36H") == timedelta(hours=36)
+    assert parse_duration("P1DT30M") == timedelta(days=1, minutes=30)
+    assert parse_duration("P2W") == timedelta(weeks=2)
+    assert parse_duration("P1M") is None
+    assert parse_duration("P") is None
+
+
+def test_relative_duration_aligned_to_bucket():
+    """Test that calls within the same bucket get the same window, ending after now."""
+    first = aligned_window("P1D", 300, now=_at(1, 10))
+    second = aligned_window("P1D", 300, now=_at(4, 59))
+    assert first == second
+    assert first.end == _at(5)
+    assert first.end - first.start == timedelta(days=1)
+    assert first.timespan == "2025-03-31T12:05:00Z/2025-04-01T12:05:00Z"
+
+    assert aligned_window("P1D", 300, now=_at(5, 1)).end == _at(10)
+
+
+def test_absolute_interval_used_as_is():
+    """Test that an absolute interval is kept unchanged."""
+    window = aligned_window("2025-04-01T00:00:00Z/2025-04-02T00:00:00Z", 300)
+    assert window.timespan == "2025-04-01T00:00:00Z/2025-04-02T00:00:00Z"
+    assert aligned_window("yesterday/today", 300) is None
+
+
+def test_hits_within_window_and_misses_after():
+    """Test that a result is a hit in its own window and a miss in a later one."""
+    cache = QueryResultCache()
+    cache.put("key", _at(5), {"tables": []})
+
+    assert cache.get("key", _at(5)).value == {"tables": []}
+    assert cache.get("key", _at(10)) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_stale_while_revalidate():
+    """Test that a result from a recent earlier window is served as stale."""
+    cache = QueryResultCache(stale_seconds=600)
+    cache.put("key", _at(5), {"tables": []})
+
+    cached = cache.get("key", _at(10))
+    assert cached.stale
+    assert cache.start_refresh("key")
+    assert not cache.start_refresh("key"), "Only one refresh should run per key"
+    cache.finish_refresh("key")
+
+    assert cache.get("key", _at(20)) is None
+
+
+def test_byte_budget_evicts_least_recently_used():
+    """Test that the byte budget evicts the least recently used results."""
+    cache = QueryResultCache(max_bytes=100)
+    cache.put("a", _at(5), "a" * 40)
+    cache.put("b", _at(5), "b" * 40)
+    cache.get("a", _at(5))
+    cache.put("c", _at(5), "c" * 40)
+
+    assert cache.get("b", _at(5)) is None
+    assert cache.get("a", _at(5)) is not None
+    assert cache.stats()["bytes"] <= 100
+    assert cache.stats()["evictions"] == 1
+
+    cache.put("huge", _at(5), "x" * 1000)
+    assert cache.get("huge", _at(5)) is None
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
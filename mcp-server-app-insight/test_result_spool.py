@@ -0,0 +1,72 @@
+import json
+import tracemalloc
+
+import pytest
+
+from bench_compact import build_fixture
+from result_spool import ResultSpool
+
+
+def _spool(spool: ResultSpool, body: bytes, page_size: int, chunk_size: int = 4096) -> dict:
+    writer = spool.create(page_size)
+    for start in range(0, len(body), chunk_size):
+        writer.feed(body[start:start + chunk_size])
+    return writer.close()
+
+
+def test_rows_written_to_pages(tmp_path):
+    """Test that the rows of every table are split into pages that read back unchanged."""
+    fixture = build_fixture(2500)
+    fixture["tables"].append({"name": "Second", "columns": [{"name": "n", "type": "long"}], "rows": [[1], [2]]})
+    spool = ResultSpool(str(tmp_path))
+    manifest = _spool(spool, json.dumps(fixture).encode(), page_size=1000, chunk_size=777)
+
+    assert manifest["rows"] == 2502
+    assert manifest["pages"] == 4
+    assert [(t["name"], t["rows"], t["firstPage"], t["pages"]) for t in manifest["tables"]] == [
+        ("PrimaryResult", 2500, 0, 3),
+        ("Second", 2, 3, 1),
+    ]
+    assert manifest["tables"][0]["columns"] == fixture["tables"][0]["columns"]
+
+    rows = []
+    for page in range(3):
+        rows += spool.read_page(manifest["resultId"], page)["rows"]
+    assert rows == fixture["tables"][0]["rows"]
+    assert spool.read_page(manifest["resultId"], 3) == {"table": "Second", "page": 3, "columns": [{"name": "n", "type": "long"}], "rows": [[1], [2]]}
+    assert spool.read_page(manifest["resultId"], 4) is None
+
+
+def test_memory_stays_flat_as_result_grows(tmp_path):
+    """Test that spooling holds only a page in memory, however many rows the response has."""
+    row = json.dumps(["2025-04-01T12:00:00Z", "GET /api/orders", "https://shop.example.com/api/orders", "200", 12.5])
+
+    def peak_bytes(rows: int) -> int:
+        spool = ResultSpool(str(tmp_path / str(rows)))
+        writer = spool.create(page_size=500)
+        tracemalloc.start()
+        writer.feed(b'{"tables":[{"name":"PrimaryResult","columns":[],"rows":[')
+        for i in range(rows):
+            writer.feed((("," if i else "") + row).encode())
+        writer.feed(b"]}]}")
+        assert writer.close()["rows"] == rows
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    small, large = peak_bytes(2_000), peak_bytes(20_000)
+    assert large < small * 1.5
+
+
+def test_expired_results_are_deleted(tmp_path):
+    """Test that results can't be read after their time to live and their files are deleted."""
+    spool = ResultSpool(str(tmp_path), ttl_seconds=0)
+    manifest = _spool(spool, json.dumps(build_fixture(10)).encode(), page_size=5)
+    spool.expire()
+    assert spool.read_page(manifest["resultId"], 0) is None
+    assert not (tmp_path / manifest["resultId"]).exists()
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
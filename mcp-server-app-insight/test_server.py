@@ -1,7 +1,10 @@
+import email.utils
 import time
+import socket
 import subprocess
 import sys
 import os
+import httpx
 import requests
 import json
 import sseclient
@@ -23,8 +26,14 @@ def server_process(test_env_vars) -> Generator[subprocess.Popen, None, None]:
                               stderr=subprocess.PIPE,
                               env=test_env)
     
-    # Wait for the server to start
-    time.sleep(3)
+    # Wait until the server accepts connections, or exits
+    deadline = time.time() + 15
+    while time.time() < deadline and process.poll() is None:
+        try:
+            socket.create_connection(("localhost", 8080), timeout=0.5).close()
+            break
+        except OSError:
+            time.sleep(0.1)
     
     # Check if server started successfully
     if process.poll() is not None:
@@ -250,6 +259,27 @@ def test_server_info(server_process):
         assert server_process.poll() is None, "Server should be running"
         
         
+@pytest.mark.parametrize("retry_after, expected", [
+    ("7", 7),
+    # HTTP dates given as seconds from now
+    (7, 7),
+    (-7, 0),
+    ("soon", 4),
+    (None, 4),
+])
+def test_retry_delay(monkeypatch, test_env_vars, retry_after, expected):
+    """Test that Retry-After is used given in seconds or as an HTTP date, with backoff otherwise."""
+    for name, value in test_env_vars.items():
+        monkeypatch.setenv(name, value)
+    import server
+
+    if isinstance(retry_after, int):
+        retry_after = email.utils.formatdate(time.time() + retry_after, usegmt=True)
+    headers = {"Retry-After": retry_after} if retry_after else {}
+    delay = server._retry_delay(httpx.Response(429, headers=headers), attempt=2)
+    assert delay == pytest.approx(expected, abs=1.5)
+
+
 if __name__ == "__main__":
     # When run directly, use pytest to execute the tests
     import sys
@@ -0,0 +1,83 @@
+"""Helpers for turning ISO8601 durations into aligned absolute query windows.
+
+A relative duration such as P1D means "the last day" and moves every second.
+Aligning the end of the window to a fixed bucket boundary makes repeated calls
+within the same bucket ask for exactly the same time range, so their results
+can be cached and every table in a query can be filtered on the same window.
+"""
+import math
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+_DURATION_PATTERN = re.compile(
+    r"^P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?"
+    r"(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$"
+)
+
+
+@dataclass(frozen=True)
+class TimeWindow:
+    start: datetime
+    end: datetime
+
+    @property
+    def timespan(self) -> str:
+        """The window as an ISO8601 interval accepted by the Application Insights API."""
+        return f"{_format(self.start)}/{_format(self.end)}"
+
+    @property
+    def kql_range(self) -> str:
+        """The window as KQL datetime literals for use in `between (...)`."""
+        return f"datetime({_format(self.start)}) .. datetime({_format(self.end)})"
+
+
+def parse_duration(duration: str) -> Optional[timedelta]:
+    """Parse an ISO8601 duration (weeks, days and time parts). Returns None if unsupported."""
+    match = _DURATION_PATTERN.match(duration.strip().upper())
+    if not match or duration.strip().upper() in ("P", "PT"):
+        return None
+    parts = {name: float(value) for name, value in match.groupdict().items() if value}
+    return timedelta(**parts)
+
+
+def aligned_window(duration: str, bucket_seconds: int, now: Optional[datetime] = None) -> Optional[TimeWindow]:
+    """Convert a duration or an absolute interval into an absolute time window.
+
+    Relative durations end at the next bucket boundary after now, so the window
+    always includes the most recent telemetry and is identical for every call
+    within the same bucket. Absolute "start/end" intervals are used as is.
+
+    Returns:
+        The time window or None if the duration isn't supported
+    """
+    if "/" in duration:
+        start, end = (_parse_datetime(part) for part in duration.split("/", 1))
+        if start is None or end is None:
+            return None
+        return TimeWindow(start, end)
+
+    length = parse_duration(duration)
+    if length is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    end_epoch = math.ceil(now.timestamp() / bucket_seconds) * bucket_seconds
+    end = datetime.fromtimestamp(end_epoch, timezone.utc)
+    return TimeWindow(end - length, end)
+
+
+def _parse_datetime(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _format(value: datetime) -> str:
+    value = value.astimezone(timezone.utc)
+    fraction = f".{value.microsecond:06d}" if value.microsecond else ""
+    return value.strftime("%Y-%m-%dT%H:%M:%S") + fraction + "Z"
@@ -0,0 +1,141 @@
+"""Shared HTTP client for the Azure DevOps REST API.
+
+All tools in server.py go through a single AzureDevOpsClient so that bursts of
+tool calls reuse warm keep-alive connections instead of paying a new TCP+TLS
+handshake to dev.azure.com for every request. The client is asynchronous, so a
+slow Azure DevOps request never blocks other MCP sessions on the event loop.
+"""
+import asyncio
+import base64
+import email.utils
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+# Status codes worth retrying. 429 means the request was throttled and never
+# processed, so it is retried for every method; 5xx is only retried for
+# idempotent requests to avoid creating duplicate work items.
+THROTTLED_STATUS = 429
+RETRYABLE_SERVER_STATUS = (500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class AzureDevOpsClient:
+    """Connection-pooled async client for one Azure DevOps organization.
+
+    Safe to share between concurrent tool calls on the event loop.
+
+    Args:
+        organization: Azure DevOps organization name
+        pat: Personal Access Token used for basic authentication
+        pool_size: Maximum number of keep-alive connections kept in the pool
+        connect_timeout: Seconds to wait for a connection to be established
+        read_timeout: Seconds to wait for the server to send a response
+        max_retries: Number of retries on throttling (429) and server errors (5xx)
+        backoff_factor: Base delay in seconds for exponential backoff between retries
+        max_backoff: Upper bound in seconds for a single backoff delay
+    """
+
+    def __init__(
+        self,
+        organization: str,
+        pat: str,
+        pool_size: int = 20,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 4,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        self.base_url = f"https://dev.azure.com/{organization}"
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+        # Connection failures happen before the request is sent and are always safe
+        # to retry, which the transport does. Status based retries are handled in
+        # request() so that Retry-After and method idempotency can be honored.
+        self._client = httpx.AsyncClient(
+            headers=_auth_header(pat),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=httpx.AsyncHTTPTransport(retries=max_retries),
+        )
+
+    def url(self, path: str) -> str:
+        """Build an absolute URL for a path relative to the organization."""
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    async def get(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, idempotent: bool = False, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, idempotent=idempotent, **kwargs)
+
+    async def request(self, method: str, path: str, idempotent: Optional[bool] = None, **kwargs: Any) -> httpx.Response:
+        """Send a request, retrying with backoff on throttling and transient server errors.
+
+        Cancelling the calling task (e.g. when the MCP client aborts the tool call)
+        cancels the request in flight and any pending backoff.
+
+        Args:
+            method: HTTP method
+            path: Path relative to the organization URL, or an absolute URL
+            idempotent: Whether 5xx responses may be retried. Defaults to True for
+                idempotent HTTP methods. Queries sent as POST (e.g. WIQL) can opt in.
+            **kwargs: Passed on to httpx (params, json, headers, ...)
+
+        Returns:
+            The last response received. Callers check the status code as before.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        url = self.url(path)
+
+        attempt = 0
+        while True:
+            response = await self._client.request(method, url, **kwargs)
+            retryable = response.status_code == THROTTLED_STATUS or (
+                idempotent and response.status_code in RETRYABLE_SERVER_STATUS
+            )
+            if not retryable or attempt >= self.max_retries:
+                return response
+            await asyncio.sleep(self._retry_delay(response, attempt))
+            attempt += 1
+
+    def _retry_delay(self, response: httpx.Response, attempt: int) -> float:
+        """Delay before the next attempt. Azure DevOps sends Retry-After when throttling."""
+        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        backoff = self.backoff_factor * (2 ** attempt)
+        # Full jitter avoids synchronized retries from parallel tool calls
+        return min(random.uniform(0, backoff), self.max_backoff)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def _auth_header(pat: str) -> Dict[str, str]:
+    """Create the authorization header for Azure DevOps API."""
+    encoded_auth = base64.b64encode(f":{pat}".encode()).decode()
+    return {"Authorization": f"Basic {encoded_auth}"}
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
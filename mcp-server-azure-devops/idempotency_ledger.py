@@ -0,0 +1,93 @@
+"""Durable idempotency ledger for create_user_stories_bulk.
+
+Every idempotency key has one row in a sqlite table that is never evicted, only
+expired after its TTL. A call claims its key atomically before creating anything,
+so two concurrent calls with the same key can't both create the stories, and the
+stories created so far are recorded after every batch, so a retry after a crash
+or restart only creates the rest. A claim that is never released, e.g. because the
+server stopped while creating, can be taken over after its lease expires.
+"""
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+CLAIMED = "claimed"
+CONFLICT = "conflict"
+IN_PROGRESS = "in_progress"
+
+
+@dataclass
+class Claim:
+    status: str
+    created: Dict[str, Any] = field(default_factory=dict)
+
+
+class IdempotencyLedger:
+    """sqlite ledger of the stories created per idempotency key.
+
+    Args:
+        db_path: sqlite file of the ledger, ":memory:" keeps it in memory only
+        ttl: Seconds a released key is remembered
+        lease: Seconds a claim blocks other calls with the same key
+    """
+
+    def __init__(self, db_path: str, ttl: float = 24 * 3600, lease: float = 600):
+        self.ttl = ttl
+        self.lease = lease
+        self._lock = threading.Lock()
+        # Transactions are explicit, so a claim can lock the database before reading
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ledger ("
+            "key TEXT PRIMARY KEY, stories_hash TEXT NOT NULL, created TEXT NOT NULL, "
+            "claimed_until REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def claim(self, key: str, stories_hash: str) -> Claim:
+        """Claim a key for a set of stories.
+
+        Returns a Claim with status CLAIMED and the stories created by earlier calls,
+        CONFLICT when the key was used for different stories, or IN_PROGRESS when
+        another call holds the key.
+        """
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock, so no other process can claim in between
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM ledger WHERE expires_at <= ?", (now,))
+                row = self._db.execute("SELECT stories_hash, created, claimed_until FROM ledger WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self._db.execute(
+                        "INSERT INTO ledger (key, stories_hash, created, claimed_until, expires_at) VALUES (?, ?, ?, ?, ?)",
+                        (key, stories_hash, "{}", now + self.lease, now + self.ttl),
+                    )
+                    claim = Claim(CLAIMED)
+                elif row[0] != stories_hash:
+                    claim = Claim(CONFLICT)
+                elif row[2] > now:
+                    claim = Claim(IN_PROGRESS)
+                else:
+                    self._db.execute("UPDATE ledger SET claimed_until = ? WHERE key = ?", (now + self.lease, key))
+                    claim = Claim(CLAIMED, json.loads(row[1]))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return claim
+
+    def record(self, key: str, created: Dict[str, Any]) -> None:
+        """Record the stories created so far under a claimed key."""
+        with self._lock:
+            self._db.execute("UPDATE ledger SET created = ? WHERE key = ?", (json.dumps(created), key))
+
+    def release(self, key: str, created: Dict[str, Any]) -> None:
+        """Record the stories created and release the claim, keeping the key for ttl seconds."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE ledger SET created = ?, claimed_until = 0, expires_at = ? WHERE key = ?",
+                (json.dumps(created), time.time() + self.ttl, key),
+            )
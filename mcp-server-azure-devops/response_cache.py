@@ -0,0 +1,145 @@
+"""In-process cache for Azure DevOps tool results.
+
+Entries carry their own TTL and an optional ETag. Expired entries are kept until
+they are evicted so that callers can revalidate them with If-None-Match instead
+of downloading the data again. The cache is bounded by entry count and by the
+JSON size of the cached values, evicting the least recently used entries first.
+An optional sqlite file mirrors the cache so warm data survives restarts.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    etag: Optional[str] = None
+    size: int = 0
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry TTL, ETag and optional sqlite backing.
+
+    Args:
+        max_entries: Maximum number of cached entries
+        max_bytes: Maximum total JSON size of the cached values
+        db_path: Optional sqlite file used to persist entries across restarts
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 10 * 1024 * 1024, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, etag TEXT, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._load()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry for key, fresh or expired, or None if it isn't cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def set(self, key: str, value: Any, ttl: float, etag: Optional[str] = None) -> None:
+        """Cache a JSON serializable value for ttl seconds."""
+        serialized = json.dumps(value)
+        entry = CacheEntry(value=value, expires_at=time.time() + ttl, etag=etag, size=len(serialized))
+        with self._lock:
+            self._remove(key)
+            if entry.size > self.max_bytes:
+                # Too large to cache; make sure no outdated copy is served either
+                if self._db:
+                    self._db.commit()
+                return
+            self._entries[key] = entry
+            self._bytes += entry.size
+            if self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, etag, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, serialized, etag, entry.expires_at),
+                )
+            self._evict()
+            if self._db:
+                self._db.commit()
+
+    def touch(self, key: str, ttl: float) -> None:
+        """Mark an entry as fresh again, e.g. after a 304 Not Modified revalidation."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.expires_at = time.time() + ttl
+            self._entries.move_to_end(key)
+            if self._db:
+                self._db.execute("UPDATE cache SET expires_at = ? WHERE key = ?", (entry.expires_at, key))
+                self._db.commit()
+
+    def invalidate(self, prefix: str = "") -> int:
+        """Remove all entries whose key starts with prefix. Returns the number removed."""
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                self._remove(key)
+            if self._db:
+                self._db.commit()
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "persistent": self._db is not None,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        if self._db:
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+
+    def _load(self) -> None:
+        """Warm the in-memory cache from sqlite, keeping the most recently expiring entries."""
+        rows = self._db.execute("SELECT key, value, etag, expires_at FROM cache ORDER BY expires_at").fetchall()
+        for key, serialized, etag, expires_at in rows:
+            entry = CacheEntry(value=json.loads(serialized), expires_at=expires_at, etag=etag, size=len(serialized))
+            self._entries[key] = entry
+            self._bytes += entry.size
+        self._evict()
+        self._db.commit()
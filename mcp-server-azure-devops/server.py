@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
 """MCP server for Azure DevOps data retrieval."""
+import asyncio
+import base64
+import hashlib
+import json
 import os
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
-import requests
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP, Context
-from pydantic import Field
+from pydantic import BaseModel, Field
+
+from devops_client import AzureDevOpsClient
+from idempotency_ledger import CLAIMED, CONFLICT, IdempotencyLedger
+from response_cache import CacheEntry, ResponseCache
 
 # Load environment variables
 load_dotenv()
@@ -19,6 +26,61 @@ AZURE_DEVOPS_PAT = os.getenv("AZURE_DEVOPS_PAT")
 if not AZURE_DEVOPS_ORG or not AZURE_DEVOPS_PAT:
     raise ValueError("AZURE_DEVOPS_ORG and AZURE_DEVOPS_PAT must be set in .env file")
 
+# Shared connection-pooled client used by all tools
+client = AzureDevOpsClient(
+    organization=AZURE_DEVOPS_ORG,
+    pat=AZURE_DEVOPS_PAT,
+    pool_size=int(os.getenv("AZURE_DEVOPS_POOL_SIZE", "20")),
+    connect_timeout=float(os.getenv("AZURE_DEVOPS_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.getenv("AZURE_DEVOPS_READ_TIMEOUT", "30")),
+    max_retries=int(os.getenv("AZURE_DEVOPS_MAX_RETRIES", "4")),
+    backoff_factor=float(os.getenv("AZURE_DEVOPS_BACKOFF_FACTOR", "0.5")),
+)
+
+# Cache for tool results. Projects and teams change rarely, story queries often.
+cache = ResponseCache(
+    max_entries=int(os.getenv("AZURE_DEVOPS_CACHE_MAX_ENTRIES", "256")),
+    max_bytes=int(os.getenv("AZURE_DEVOPS_CACHE_MAX_BYTES", str(10 * 1024 * 1024))),
+    db_path=os.getenv("AZURE_DEVOPS_CACHE_PATH"),
+)
+PROJECTS_TTL = float(os.getenv("AZURE_DEVOPS_PROJECTS_TTL", "3600"))
+TEAMS_TTL = float(os.getenv("AZURE_DEVOPS_TEAMS_TTL", "3600"))
+STORIES_TTL = float(os.getenv("AZURE_DEVOPS_STORIES_TTL", "60"))
+
+# Page size used when only a continuation_token is passed to get_user_stories
+DEFAULT_PAGE_SIZE = 50
+
+# The work items API accepts at most 200 ids per request
+WORK_ITEM_BATCH_SIZE = 200
+
+# Fields projected into user stories. Requesting only these instead of $expand=all
+# keeps relations, history links and unused fields off the wire.
+USER_STORY_FIELDS = [
+    "System.Id",
+    "System.Title",
+    "System.State",
+    "System.AssignedTo",
+    "System.CreatedDate",
+    "System.Description",
+]
+
+# Bounds concurrent requests for work item hydration and the bulk creation fallback
+request_slots = asyncio.Semaphore(int(os.getenv("AZURE_DEVOPS_WORKERS", "4")))
+
+# The $batch API accepts at most 200 operations per request
+CREATE_BATCH_SIZE = 200
+
+# Stories created per idempotency key, kept apart from the cache so they are never evicted.
+# The default path is next to this module, so the ledger doesn't depend on the working directory.
+IDEMPOTENCY_PATH = os.getenv(
+    "AZURE_DEVOPS_IDEMPOTENCY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "idempotency.sqlite3")
+)
+ledger = IdempotencyLedger(
+    IDEMPOTENCY_PATH,
+    ttl=float(os.getenv("AZURE_DEVOPS_IDEMPOTENCY_TTL", str(24 * 3600))),
+    lease=float(os.getenv("AZURE_DEVOPS_IDEMPOTENCY_LEASE", "600")),
+)
+
 # Create an MCP server
 mcp = FastMCP(
     name="AzureDevOpsServer",
@@ -27,28 +89,33 @@ mcp = FastMCP(
     port=8081
 )
 
-def _get_auth_header():
-    """Create the authorization header for Azure DevOps API."""
-    import base64
-    auth_str = f":{AZURE_DEVOPS_PAT}"
-    encoded_auth = base64.b64encode(auth_str.encode()).decode()
-    return {"Authorization": f"Basic {encoded_auth}"}
-
 @mcp.tool()
-def get_user_stories(
+async def get_user_stories(
     team_project: str = Field(description="The team project name"),
     team: Optional[str] = Field(description="The team name (optional)", default=None),
     state: Optional[str] = Field(description="Filter by state (e.g., 'New', 'Active', 'Closed')", default=None),
     assigned_to: Optional[str] = Field(description="Filter by assigned user email", default=None),
     top: int = Field(description="Number of work items to return", default=100),
+    page_size: Optional[int] = Field(description="Return results in pages of this size together with a continuation_token (optional). When set, top is ignored", default=None),
+    continuation_token: Optional[str] = Field(description="Token returned by a previous paged call to fetch the next page (optional)", default=None),
     ctx: Context = Field(description="MCP context"),
 ) -> Dict[str, Any]:
     """Get user stories from Azure DevOps for a specific team project.
     
     Returns a list of user stories with details like ID, title, state, and assigned to.
+    For large backlogs, set page_size and pass the returned continuation_token to get the next page.
+    Paged results are ordered by ID, newest first. The last page has no continuation_token.
     """
-    # Construct the base URL for Azure DevOps API
-    base_url = f"https://dev.azure.com/{AZURE_DEVOPS_ORG}"
+    paged = page_size is not None or continuation_token is not None
+    if paged and not page_size:
+        page_size = DEFAULT_PAGE_SIZE
+    
+    # Story queries are cached briefly and invalidated when a story is created in the project
+    cache_key = _stories_cache_key(team_project) + json.dumps([team, state, assigned_to, top, page_size, continuation_token])
+    cached = cache.get(cache_key)
+    if cached and cached.fresh:
+        await ctx.debug(f"Returning cached user stories for {team_project}")
+        return cached.value
     
     # Build the WIQL query
     wiql_query = {
@@ -66,24 +133,36 @@ def get_user_stories(
     if assigned_to:
         conditions.append(f"[System.AssignedTo] = '{assigned_to}'")
     
+    # Paging resumes after the last id of the previous page (keyset pagination), so no
+    # state is kept on the server and later pages are only fetched when asked for
+    query_filter = _query_filter_hash(team_project, team, state, assigned_to)
+    if continuation_token:
+        after_id = _decode_continuation_token(continuation_token, query_filter)
+        if after_id is None:
+            return {"error": "Invalid continuation_token. Start again without a token"}
+        conditions.append(f"[System.Id] < {after_id}")
+    
     # Add conditions to the query
     if conditions:
         wiql_query["query"] += "AND " + " AND ".join(conditions)
     
-    # Add order by
-    wiql_query["query"] += " ORDER BY [System.CreatedDate] DESC"
+    # Add order by. Ids are assigned in creation order, so paging by id keeps newest first.
+    if paged:
+        wiql_query["query"] += " ORDER BY [System.Id] DESC"
+    else:
+        wiql_query["query"] += " ORDER BY [System.CreatedDate] DESC"
     
-    ctx.debug(f"WIQL Query: {wiql_query['query']}")
+    await ctx.debug(f"WIQL Query: {wiql_query['query']}")
     
-    # Make the WIQL API request
-    wiql_url = f"{base_url}/_apis/wit/wiql?api-version=6.0"
-    headers = _get_auth_header()
-    headers["Content-Type"] = "application/json"
+    # Make the WIQL API request. $top makes Azure DevOps return only the ids we will use.
+    limit = page_size if paged else top
+    wiql_url = f"_apis/wit/wiql?api-version=6.0&$top={limit}"
     
-    wiql_response = requests.post(wiql_url, json=wiql_query, headers=headers)
+    # WIQL is a read-only query, so it is safe to retry on server errors
+    wiql_response = await client.post(wiql_url, json=wiql_query, idempotent=True)
     
     if wiql_response.status_code != 200:
-        ctx.error(f"Error in WIQL query: {wiql_response.status_code}, {wiql_response.text}")
+        await ctx.error(f"Error in WIQL query: {wiql_response.status_code}, {wiql_response.text}")
         return {"error": f"Failed to query work items: {wiql_response.text}"}
     
     wiql_data = wiql_response.json()
@@ -91,41 +170,89 @@ def get_user_stories(
     # Extract work item IDs
     work_item_ids = [item["id"] for item in wiql_data.get("workItems", [])]
     
-    if not work_item_ids:
-        return {"user_stories": []}
-    
-    # Limit the number of work items
-    work_item_ids = work_item_ids[:top]
+    # Limit the number of work items, in case $top was not applied
+    work_item_ids = work_item_ids[:limit]
     
     # Get work item details
-    work_items_url = f"{base_url}/_apis/wit/workitems?ids={','.join(map(str, work_item_ids))}&api-version=6.0&$expand=all"
-    work_items_response = requests.get(work_items_url, headers=headers)
-    
-    if work_items_response.status_code != 200:
-        ctx.error(f"Error fetching work items: {work_items_response.status_code}, {work_items_response.text}")
-        return {"error": f"Failed to fetch work items: {work_items_response.text}"}
+    work_items, error = await _fetch_work_items(work_item_ids, ctx)
     
-    work_items_data = work_items_response.json()
+    if error:
+        return {"error": f"Failed to fetch work items: {error}"}
     
     # Process and return the work items
-    user_stories = []
-    for item in work_items_data.get("value", []):
-        fields = item.get("fields", {})
-        user_story = {
-            "id": item.get("id"),
-            "title": fields.get("System.Title"),
-            "state": fields.get("System.State"),
-            "assigned_to": fields.get("System.AssignedTo", {}).get("displayName") if fields.get("System.AssignedTo") else None,
-            "created_date": fields.get("System.CreatedDate"),
-            "description": fields.get("System.Description"),
-            "url": item.get("url")
-        }
-        user_stories.append(user_story)
+    user_stories = [_user_story_from_work_item(item) for item in work_items]
+    
+    result = {"user_stories": user_stories}
+    if paged:
+        # A full page means there may be more stories after the last id
+        more = len(work_item_ids) == page_size
+        result["continuation_token"] = _encode_continuation_token(work_item_ids[-1], query_filter) if more else None
+    cache.set(cache_key, result, STORIES_TTL)
+    return result
+
+def _query_filter_hash(*filters: Optional[str]) -> str:
+    """Short hash of the query filters, used to reject tokens from a different query."""
+    return hashlib.sha256(json.dumps(filters).encode()).hexdigest()[:16]
+
+def _encode_continuation_token(after_id: int, query_filter: str) -> str:
+    """Create an opaque token pointing after the given work item id."""
+    payload = json.dumps({"after": after_id, "filter": query_filter}).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+def _decode_continuation_token(token: str, query_filter: str) -> Optional[int]:
+    """Return the work item id a continuation token points after, or None if it is invalid."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if payload["filter"] != query_filter:
+            return None
+        return int(payload["after"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+async def _fetch_work_items(work_item_ids: List[int], ctx: Context) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fetch work items in batches of at most 200 ids, concurrently.
+    
+    Args:
+        work_item_ids: Work item ids in the order they should be returned
+        ctx: MCP context
+        
+    Returns:
+        Tuple of the work items in the order of work_item_ids and an error message or None
+    """
+    batches = [work_item_ids[i:i + WORK_ITEM_BATCH_SIZE] for i in range(0, len(work_item_ids), WORK_ITEM_BATCH_SIZE)]
+    if not work_item_ids:
+        return [], None
+    
+    await ctx.debug(f"Fetching {len(work_item_ids)} work items in {len(batches)} batches")
+    
+    responses = await asyncio.gather(*(_fetch_work_item_batch(batch) for batch in batches))
+    
+    items_by_id = {}
+    for response in responses:
+        if response.status_code != 200:
+            await ctx.error(f"Error fetching work items: {response.status_code}, {response.text}")
+            return [], response.text
+        # errorPolicy=omit returns null for items deleted since the WIQL query ran
+        for item in response.json().get("value", []):
+            if item:
+                items_by_id[item.get("id")] = item
     
-    return {"user_stories": user_stories}
+    # Keep the WIQL order regardless of how each batch was returned
+    return [items_by_id[work_item_id] for work_item_id in work_item_ids if work_item_id in items_by_id], None
+
+async def _fetch_work_item_batch(batch: List[int]):
+    """Fetch a single batch of work items with only the projected fields."""
+    params = {
+        "ids": ",".join(map(str, batch)),
+        "fields": ",".join(USER_STORY_FIELDS),
+        "errorPolicy": "omit",
+        "api-version": "6.0",
+    }
+    async with request_slots:
+        return await client.get("_apis/wit/workitems", params=params)
 
 @mcp.tool()
-def get_teams(
+async def get_teams(
     team_project: Optional[str] = Field(description="The team project name (optional)", default=None),
     ctx: Context = Field(description="MCP context"),
 ) -> Dict[str, Any]:
@@ -134,21 +261,27 @@ def get_teams(
     If team_project is provided, returns teams for that project.
     Otherwise, returns all teams in the organization.
     """
-    # Construct the base URL for Azure DevOps API
-    base_url = f"https://dev.azure.com/{AZURE_DEVOPS_ORG}"
+    cache_key = f"teams:{team_project or ''}"
+    cached = cache.get(cache_key)
+    if cached and cached.fresh:
+        await ctx.debug("Returning cached teams")
+        return cached.value
     
     # API URL for teams
     if team_project:
-        teams_url = f"{base_url}/_apis/projects/{team_project}/teams?api-version=6.0"
+        teams_url = f"_apis/projects/{team_project}/teams?api-version=6.0"
     else:
-        teams_url = f"{base_url}/_apis/teams?api-version=6.0"
+        teams_url = "_apis/teams?api-version=6.0"
     
-    headers = _get_auth_header()
+    teams_response = await _conditional_get(teams_url, cached)
     
-    teams_response = requests.get(teams_url, headers=headers)
+    if teams_response.status_code == 304:
+        await ctx.debug("Teams not modified, extending cached copy")
+        cache.touch(cache_key, TEAMS_TTL)
+        return cached.value
     
     if teams_response.status_code != 200:
-        ctx.error(f"Error fetching teams: {teams_response.status_code}, {teams_response.text}")
+        await ctx.error(f"Error fetching teams: {teams_response.status_code}, {teams_response.text}")
         return {"error": f"Failed to fetch teams: {teams_response.text}"}
     
     teams_data = teams_response.json()
@@ -165,28 +298,36 @@ def get_teams(
         }
         teams.append(team_info)
     
-    return {"teams": teams}
+    result = {"teams": teams}
+    cache.set(cache_key, result, TEAMS_TTL, etag=teams_response.headers.get("ETag"))
+    return result
 
 @mcp.tool()
-def get_team_projects(
+async def get_team_projects(
     ctx: Context = Field(description="MCP context"),
 ) -> Dict[str, Any]:
     """Get team projects from Azure DevOps.
     
     Returns a list of all team projects in the organization.
     """
-    # Construct the base URL for Azure DevOps API
-    base_url = f"https://dev.azure.com/{AZURE_DEVOPS_ORG}"
+    cache_key = "projects:"
+    cached = cache.get(cache_key)
+    if cached and cached.fresh:
+        await ctx.debug("Returning cached projects")
+        return cached.value
     
     # API URL for projects
-    projects_url = f"{base_url}/_apis/projects?api-version=6.0"
+    projects_url = "_apis/projects?api-version=6.0"
     
-    headers = _get_auth_header()
+    projects_response = await _conditional_get(projects_url, cached)
     
-    projects_response = requests.get(projects_url, headers=headers)
+    if projects_response.status_code == 304:
+        await ctx.debug("Projects not modified, extending cached copy")
+        cache.touch(cache_key, PROJECTS_TTL)
+        return cached.value
     
     if projects_response.status_code != 200:
-        ctx.error(f"Error fetching projects: {projects_response.status_code}, {projects_response.text}")
+        await ctx.error(f"Error fetching projects: {projects_response.status_code}, {projects_response.text}")
         return {"error": f"Failed to fetch projects: {projects_response.text}"}
     
     projects_data = projects_response.json()
@@ -204,10 +345,12 @@ def get_team_projects(
         }
         projects.append(project_info)
     
-    return {"projects": projects}
+    result = {"projects": projects}
+    cache.set(cache_key, result, PROJECTS_TTL, etag=projects_response.headers.get("ETag"))
+    return result
 
 @mcp.tool()
-def create_user_story(
+async def create_user_story(
     team_project: str = Field(description="The team project name"),
     title: str = Field(description="Title of the user story"),
     description: Optional[str] = Field(description="Description of the user story", default=None),
@@ -218,16 +361,117 @@ def create_user_story(
     
     Returns the created user story details.
     """
-    # Construct the base URL for Azure DevOps API
-    base_url = f"https://dev.azure.com/{AZURE_DEVOPS_ORG}"
-    
     # API URL for creating work item
-    create_url = f"{base_url}/{team_project}/_apis/wit/workitems/$User Story?api-version=6.0"
+    create_url = f"{team_project}/_apis/wit/workitems/$User Story?api-version=6.0"
     
-    headers = _get_auth_header()
-    headers["Content-Type"] = "application/json-patch+json"
+    headers = {"Content-Type": "application/json-patch+json"}
     
     # Prepare the document for creating a work item
+    document = _user_story_document(title, description, assigned_to)
+    
+    await ctx.debug(f"Creating user story: {document}")
+    
+    # Not idempotent: only throttled (429) requests are retried
+    create_response = await client.post(create_url, json=document, headers=headers)
+    
+    if create_response.status_code not in (200, 201):
+        await ctx.error(f"Error creating user story: {create_response.status_code}, {create_response.text}")
+        return {"error": f"Failed to create user story: {create_response.text}"}
+    
+    created_item = create_response.json()
+    
+    # Cached story queries for the project no longer include the new story
+    cache.invalidate(_stories_cache_key(team_project))
+    
+    # Process and return the created work item
+    return {"user_story": _user_story_from_work_item(created_item)}
+
+class UserStoryInput(BaseModel):
+    title: str = Field(description="Title of the user story")
+    description: Optional[str] = Field(description="Description of the user story", default=None)
+    assigned_to: Optional[str] = Field(description="Email of the user to assign the story to", default=None)
+
+@mcp.tool()
+async def create_user_stories_bulk(
+    team_project: str = Field(description="The team project name"),
+    stories: List[UserStoryInput] = Field(description="The user stories to create"),
+    idempotency_key: Optional[str] = Field(description="Unique key for this set of stories (optional). Retrying with the same key only creates stories that were not created before", default=None),
+    ctx: Context = Field(description="MCP context"),
+) -> Dict[str, Any]:
+    """Create many user stories in Azure DevOps at once, e.g. when breaking an epic into stories.
+    
+    Returns a result per story in the order given, with either the created user story or an error.
+    A failing story does not stop the others from being created.
+    """
+    # Stories created by an earlier call with the same idempotency key are not created again.
+    # The key is claimed before anything is created, so concurrent retries can't both create them.
+    ledger_key = None
+    created: Dict[str, Dict[str, Any]] = {}
+    if idempotency_key:
+        ledger_key = f"{team_project}:{idempotency_key}"
+        stories_hash = hashlib.sha256(json.dumps([story.model_dump() for story in stories]).encode()).hexdigest()
+        claim = ledger.claim(ledger_key, stories_hash)
+        if claim.status == CONFLICT:
+            return {"error": f"Idempotency key '{idempotency_key}' was already used for a different set of stories"}
+        if claim.status != CLAIMED:
+            return {"error": f"Idempotency key '{idempotency_key}' is in use by a call that is still creating stories, retry later"}
+        created = claim.created
+    
+    pending = [index for index in range(len(stories)) if str(index) not in created]
+    await ctx.debug(f"Creating {len(pending)} user stories, {len(created)} already created for this idempotency key")
+    
+    results: Dict[int, Dict[str, Any]] = {}
+    try:
+        for start in range(0, len(pending), CREATE_BATCH_SIZE):
+            chunk = pending[start:start + CREATE_BATCH_SIZE]
+            chunk_results = await _create_user_story_batch(team_project, chunk, stories, ctx)
+            results.update(chunk_results)
+            for index, result in chunk_results.items():
+                if "user_story" in result:
+                    created[str(index)] = result["user_story"]
+            if ledger_key:
+                # Recorded per batch, a retry after a crash doesn't create these again
+                ledger.record(ledger_key, created)
+    finally:
+        if ledger_key:
+            ledger.release(ledger_key, created)
+        if results:
+            # Cached story queries for the project no longer include the new stories
+            cache.invalidate(_stories_cache_key(team_project))
+    
+    output = []
+    for index in range(len(stories)):
+        if str(index) in created:
+            output.append({"index": index, "user_story": created[str(index)]})
+        else:
+            output.append({"index": index, "error": results[index]["error"]})
+    
+    return {
+        "results": output,
+        "created": len(created),
+        "failed": len(stories) - len(created),
+    }
+
+@mcp.tool()
+async def invalidate_cache(
+    scope: Optional[str] = Field(description="What to invalidate: 'projects', 'teams' or 'stories'. Invalidates everything if omitted", default=None),
+    ctx: Context = Field(description="MCP context"),
+) -> Dict[str, Any]:
+    """Invalidate cached Azure DevOps data so the next call fetches fresh data.
+    
+    Use this when projects, teams or user stories were changed outside of this server.
+    """
+    if scope and scope not in ("projects", "teams", "stories"):
+        return {"error": f"Unknown cache scope '{scope}'. Use 'projects', 'teams' or 'stories'"}
+    
+    scopes = [scope] if scope else ["projects", "teams", "stories"]
+    removed = sum(cache.invalidate(f"{name}:") for name in scopes)
+    await ctx.debug(f"Invalidated {removed} cache entries for scope {scope or 'all'}")
+    
+    return {"invalidated": removed, "cache": cache.stats()}
+
+def _user_story_document(title: str, description: Optional[str], assigned_to: Optional[str]) -> List[Dict[str, Any]]:
+    """Build the JSON patch document used to create a user story."""
     document = [
         {
             "op": "add",
@@ -250,29 +494,85 @@ def create_user_story(
             "value": assigned_to
         })
     
-    ctx.debug(f"Creating user story: {document}")
-    
-    create_response = requests.post(create_url, json=document, headers=headers)
-    
-    if create_response.status_code not in (200, 201):
-        ctx.error(f"Error creating user story: {create_response.status_code}, {create_response.text}")
-        return {"error": f"Failed to create user story: {create_response.text}"}
-    
-    created_item = create_response.json()
-    
-    # Process and return the created work item
-    fields = created_item.get("fields", {})
-    user_story = {
-        "id": created_item.get("id"),
+    return document
+
+def _user_story_from_work_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Project a work item onto the user story fields returned by the tools."""
+    fields = item.get("fields", {})
+    return {
+        "id": item.get("id"),
         "title": fields.get("System.Title"),
         "state": fields.get("System.State"),
         "assigned_to": fields.get("System.AssignedTo", {}).get("displayName") if fields.get("System.AssignedTo") else None,
         "created_date": fields.get("System.CreatedDate"),
         "description": fields.get("System.Description"),
-        "url": created_item.get("url")
+        "url": item.get("url")
     }
+
+async def _create_user_story_batch(team_project: str, indexes: List[int], stories: List[UserStoryInput], ctx: Context) -> Dict[int, Dict[str, Any]]:
+    """Create up to 200 user stories with one $batch request.
+    
+    Falls back to parallel single requests when the $batch endpoint isn't available.
+    
+    Returns:
+        Dictionary from story index to either {"user_story": ...} or {"error": ...}
+    """
+    create_uri = f"/{team_project}/_apis/wit/workitems/$User Story?api-version=6.0"
+    operations = [
+        {
+            "method": "PATCH",
+            "uri": create_uri,
+            "headers": {"Content-Type": "application/json-patch+json"},
+            "body": _user_story_document(stories[index].title, stories[index].description, stories[index].assigned_to),
+        }
+        for index in indexes
+    ]
     
-    return {"user_story": user_story}
+    # Not idempotent: only throttled (429) requests are retried
+    batch_response = await client.post("_apis/wit/$batch?api-version=6.0", json=operations)
+    
+    if batch_response.status_code in (404, 405):
+        await ctx.debug("The $batch endpoint is not available, creating user stories with parallel requests")
+        responses = await asyncio.gather(*(_create_user_story_single(create_uri, operation) for operation in operations))
+        results = {}
+        for index, response in zip(indexes, responses):
+            if response.status_code in (200, 201):
+                results[index] = {"user_story": _user_story_from_work_item(response.json())}
+            else:
+                results[index] = {"error": f"Failed to create user story: {response.text}"}
+        return results
+    
+    if batch_response.status_code != 200:
+        await ctx.error(f"Error creating user stories: {batch_response.status_code}, {batch_response.text}")
+        return {index: {"error": f"Failed to create user story: {batch_response.text}"} for index in indexes}
+    
+    # Each operation in the batch succeeds or fails on its own
+    results = {}
+    for index, operation_result in zip(indexes, batch_response.json().get("value", [])):
+        body = operation_result.get("body")
+        if operation_result.get("code") in (200, 201):
+            results[index] = {"user_story": _user_story_from_work_item(json.loads(body) if isinstance(body, str) else body)}
+        else:
+            results[index] = {"error": f"Failed to create user story: {body}"}
+    for index in indexes:
+        results.setdefault(index, {"error": "No result returned for this user story"})
+    return results
+
+async def _create_user_story_single(create_uri: str, operation: Dict[str, Any]):
+    """Create one user story from a $batch operation, used when $batch isn't available."""
+    async with request_slots:
+        return await client.post(create_uri, json=operation["body"], headers=operation["headers"])
+
+def _stories_cache_key(team_project: str) -> str:
+    """Cache key prefix shared by all story queries for a project."""
+    return f"stories:{team_project}:"
+
+async def _conditional_get(url: str, cached: Optional[CacheEntry]):
+    """GET a URL, revalidating an expired cache entry with If-None-Match when it has an ETag."""
+    headers = {}
+    if cached and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    return await client.get(url, headers=headers)
 
 if __name__ == "__main__":
     mcp.run(transport="sse")
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Generator, List
+
+import pytest
+
+from devops_client import AzureDevOpsClient, _parse_retry_after
+
+
+class _ScriptedHandler(BaseHTTPRequestHandler):
+    """Replies with the next scripted (status, headers) and records each request."""
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            self.rfile.read(length)
+        server = self.server
+        server.requests.append((self.command, self.path, self.headers.get("Authorization"), self.client_address[1]))
+        status, headers = server.script.pop(0) if server.script else (200, {})
+        body = b'{"value": []}'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fake_devops() -> Generator[ThreadingHTTPServer, None, None]:
+    """Start a local HTTP server standing in for dev.azure.com."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ScriptedHandler)
+    server.script: List = []
+    server.requests: List = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _run(fake_devops, scenario):
+    """Run a scenario against a client pointed at the local fake server with fast backoff."""
+    async def main():
+        client = AzureDevOpsClient("test-org", "test-pat", pool_size=4, max_retries=3, backoff_factor=0.01)
+        client.base_url = f"http://127.0.0.1:{fake_devops.server_port}/test-org"
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+def test_auth_header_sent(fake_devops):
+    """Test that the PAT is sent as basic auth on every request."""
+    async def scenario(client):
+        await client.get("_apis/projects?api-version=6.0")
+    _run(fake_devops, scenario)
+    assert fake_devops.requests[0][2] == "Basic OnRlc3QtcGF0"
+
+
+def test_connections_are_reused(fake_devops):
+    """Test that consecutive calls reuse the same keep-alive connection."""
+    async def scenario(client):
+        for _ in range(5):
+            assert (await client.get("_apis/projects")).status_code == 200
+    _run(fake_devops, scenario)
+    client_ports = {request[3] for request in fake_devops.requests}
+    assert len(client_ports) == 1, "All requests should share one pooled connection"
+
+
+def test_throttled_request_is_retried(fake_devops):
+    """Test that 429 responses are retried for any method, honoring Retry-After."""
+    fake_devops.script = [(429, {"Retry-After": "0"}), (429, {"Retry-After": "0"})]
+    async def scenario(client):
+        return await client.post("_apis/wit/workitems/$User Story", json=[])
+    assert _run(fake_devops, scenario).status_code == 200
+    assert len(fake_devops.requests) == 3
+
+
+def test_server_error_retried_only_when_idempotent(fake_devops):
+    """Test that 5xx is retried for reads but not for work item creation."""
+    async def scenario(client):
+        fake_devops.script = [(503, {}), (200, {})]
+        assert (await client.get("_apis/teams")).status_code == 200
+        assert len(fake_devops.requests) == 2
+
+        fake_devops.script = [(500, {})]
+        assert (await client.post("_apis/wit/workitems/$User Story", json=[])).status_code == 500
+        assert len(fake_devops.requests) == 3
+    _run(fake_devops, scenario)
+
+
+def test_retries_are_bounded(fake_devops):
+    """Test that the last error response is returned once retries are exhausted."""
+    fake_devops.script = [(503, {})] * 10
+    async def scenario(client):
+        return await client.get("_apis/teams")
+    assert _run(fake_devops, scenario).status_code == 503
+    assert len(fake_devops.requests) == 4
+
+
+def test_cancellation_propagates(fake_devops):
+    """Test that cancelling a tool call cancels a pending retry instead of finishing it."""
+    fake_devops.script = [(429, {"Retry-After": "10"})]
+    async def scenario(client):
+        task = asyncio.create_task(client.get("_apis/teams"))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    _run(fake_devops, scenario)
+    assert len(fake_devops.requests) == 1
+
+
+def test_parse_retry_after():
+    """Test that Retry-After accepts seconds and HTTP dates."""
+    assert _parse_retry_after("7") == 7.0
+    assert _parse_retry_after(None) is None
+    assert _parse_retry_after("not a date") is None
+    assert _parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
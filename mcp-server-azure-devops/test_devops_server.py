@@ -0,0 +1,284 @@
+import asyncio
+import os
+import re
+from typing import Dict, List
+
+import pytest
+
+# server.py validates credentials at import time
+os.environ.setdefault("AZURE_DEVOPS_ORG", "TEST_ORG_FOR_TESTING_ONLY")
+os.environ.setdefault("AZURE_DEVOPS_PAT", "TEST_PAT_FOR_TESTING_ONLY")
+os.environ.setdefault("AZURE_DEVOPS_IDEMPOTENCY_PATH", ":memory:")
+
+import server  # noqa: E402
+from idempotency_ledger import IdempotencyLedger  # noqa: E402
+
+
+class FakeContext:
+    """Stand-in for the MCP context that records log messages."""
+
+    def __init__(self):
+        self.messages: List[str] = []
+
+    async def debug(self, message):
+        self.messages.append(message)
+
+    async def error(self, message):
+        self.messages.append(message)
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, payload: Dict, headers: Dict = None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+        self.text = str(payload)
+
+    def json(self):
+        return self._payload
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """Replace the shared client with an in-memory Azure DevOps backlog."""
+    calls = {"wiql": [], "workitems": [], "projects": [], "create": [], "batch": []}
+    backlog = {"ids": [], "projects_etag": '"v1"', "batch_available": True, "next_id": 100}
+    server.cache.invalidate()
+    monkeypatch.setattr(server, "ledger", IdempotencyLedger(":memory:"))
+
+    async def post(path, json=None, **kwargs):
+        if "$batch" in path:
+            calls["batch"].append(json)
+            if not backlog["batch_available"]:
+                return FakeResponse(404, {})
+            value = []
+            for operation in json:
+                title = operation["body"][0]["value"]
+                if title.startswith("bad"):
+                    value.append({"code": 400, "body": '{"message": "invalid"}'})
+                else:
+                    backlog["next_id"] += 1
+                    value.append({"code": 200, "body": '{"id": %d, "fields": {"System.Title": "%s"}}' % (backlog["next_id"], title)})
+            return FakeResponse(200, {"count": len(value), "value": value})
+        if "wiql" not in path:
+            calls["create"].append(json)
+            return FakeResponse(200, {"id": 42, "fields": {"System.Title": json[0]["value"]}})
+        calls["wiql"].append((path, json, kwargs))
+        ids = backlog["ids"]
+        after = re.search(r"\[System.Id\] < (\d+)", json["query"])
+        if after:
+            ids = [i for i in ids if i < int(after.group(1))]
+        top = re.search(r"\$top=(\d+)", path)
+        if top:
+            ids = ids[:int(top.group(1))]
+        return FakeResponse(200, {"workItems": [{"id": i} for i in ids]})
+
+    async def get(path, params=None, headers=None, **kwargs):
+        if path.startswith("_apis/projects"):
+            calls["projects"].append(headers)
+            if headers and headers.get("If-None-Match") == backlog["projects_etag"]:
+                return FakeResponse(304, {})
+            return FakeResponse(200, {"value": [{"id": "p1", "name": "Project"}]}, {"ETag": backlog["projects_etag"]})
+        calls["workitems"].append(params)
+        ids = [int(i) for i in params["ids"].split(",")]
+        # Return each batch in reverse to prove the tool restores WIQL order
+        value = [{"id": i, "fields": {"System.Title": f"Story {i}"}, "url": f"https://example/{i}"} for i in reversed(ids)]
+        return FakeResponse(200, {"value": value})
+
+    monkeypatch.setattr(server.client, "post", post)
+    monkeypatch.setattr(server.client, "get", get)
+    return backlog, calls
+
+
+def _get_user_stories(**kwargs):
+    args = {"team_project": "Project", "team": None, "state": None, "assigned_to": None, "top": 100,
+            "page_size": None, "continuation_token": None}
+    args.update(kwargs)
+    return asyncio.run(server.get_user_stories(ctx=FakeContext(), **args))
+
+
+def test_hydration_is_batched_and_ordered(fake_api):
+    """Test that ids are fetched in batches of at most 200 and returned in WIQL order."""
+    backlog, calls = fake_api
+    backlog["ids"] = list(range(1000, 500, -1))
+
+    result = _get_user_stories(top=450)
+
+    assert [story["id"] for story in result["user_stories"]] == backlog["ids"][:450]
+    batch_sizes = [len(params["ids"].split(",")) for params in calls["workitems"]]
+    assert sorted(batch_sizes) == [50, 200, 200]
+
+
+def test_hydration_requests_projected_fields_only(fake_api):
+    """Test that only the projected fields are requested instead of $expand=all."""
+    backlog, calls = fake_api
+    backlog["ids"] = [1, 2, 3]
+
+    _get_user_stories()
+
+    params = calls["workitems"][0]
+    assert "$expand" not in params
+    assert params["fields"].split(",") == server.USER_STORY_FIELDS
+
+
+def test_top_pushed_down_to_wiql(fake_api):
+    """Test that top is sent as the WIQL $top parameter."""
+    backlog, calls = fake_api
+    backlog["ids"] = list(range(100, 0, -1))
+
+    result = _get_user_stories(top=5)
+
+    assert "$top=5" in calls["wiql"][0][0]
+    assert len(result["user_stories"]) == 5
+
+
+def test_paging_with_continuation_token(fake_api):
+    """Test that pages are fetched lazily and chained with continuation tokens."""
+    backlog, calls = fake_api
+    backlog["ids"] = list(range(25, 0, -1))
+
+    seen = []
+    token = None
+    for _ in range(5):
+        page = _get_user_stories(page_size=10, continuation_token=token)
+        seen.extend(story["id"] for story in page["user_stories"])
+        token = page["continuation_token"]
+        if token is None:
+            break
+
+    assert seen == backlog["ids"]
+    assert len(calls["wiql"]) == 3
+    assert all(len(params["ids"].split(",")) <= 10 for params in calls["workitems"])
+
+
+def test_continuation_token_bound_to_query(fake_api):
+    """Test that a token from one query is rejected for a query with other filters."""
+    backlog, _ = fake_api
+    backlog["ids"] = list(range(30, 0, -1))
+
+    token = _get_user_stories(page_size=10)["continuation_token"]
+
+    assert "error" in _get_user_stories(state="Active", continuation_token=token)
+    assert "error" in _get_user_stories(continuation_token="not-a-token")
+
+
+def test_story_queries_cached_until_story_created(fake_api):
+    """Test that repeated story queries are served from cache and invalidated by create_user_story."""
+    backlog, calls = fake_api
+    backlog["ids"] = [1, 2]
+
+    first = _get_user_stories()
+    assert _get_user_stories() == first
+    assert len(calls["wiql"]) == 1
+
+    asyncio.run(server.create_user_story(team_project="Project", title="New story", description=None, assigned_to=None, ctx=FakeContext()))
+    _get_user_stories()
+    assert len(calls["wiql"]) == 2
+
+
+def test_projects_revalidated_with_etag(fake_api, monkeypatch):
+    """Test that expired projects are revalidated with If-None-Match and reused on 304."""
+    _, calls = fake_api
+    monkeypatch.setattr(server, "PROJECTS_TTL", 0)
+
+    first = asyncio.run(server.get_team_projects(ctx=FakeContext()))
+    second = asyncio.run(server.get_team_projects(ctx=FakeContext()))
+
+    assert second == first
+    assert calls["projects"][0] == {}
+    assert calls["projects"][1] == {"If-None-Match": '"v1"'}
+
+
+def _create_bulk(titles, idempotency_key=None):
+    stories = [server.UserStoryInput(title=title) for title in titles]
+    return asyncio.run(server.create_user_stories_bulk(team_project="Project", stories=stories, idempotency_key=idempotency_key, ctx=FakeContext()))
+
+
+def test_bulk_create_reports_per_item_results(fake_api):
+    """Test that stories are created through $batch with a result per story."""
+    _, calls = fake_api
+
+    result = _create_bulk(["one", "bad two", "three"])
+
+    assert len(calls["batch"]) == 1
+    assert result["created"] == 2 and result["failed"] == 1
+    assert [r["index"] for r in result["results"]] == [0, 1, 2]
+    assert result["results"][0]["user_story"]["title"] == "one"
+    assert "error" in result["results"][1]
+
+
+def test_bulk_create_chunks_large_sets(fake_api):
+    """Test that more than 200 stories are split over several $batch requests."""
+    _, calls = fake_api
+
+    result = _create_bulk([f"story {i}" for i in range(450)])
+
+    assert [len(batch) for batch in calls["batch"]] == [200, 200, 50]
+    assert result["created"] == 450
+
+
+def test_bulk_create_idempotency_key(fake_api):
+    """Test that a retried call with the same key only creates the stories that failed."""
+    _, calls = fake_api
+
+    first = _create_bulk(["one", "bad two"], idempotency_key="epic-1")
+    second = _create_bulk(["one", "bad two"], idempotency_key="epic-1")
+
+    assert [len(batch) for batch in calls["batch"]] == [2, 1]
+    assert second["results"][0] == first["results"][0]
+    assert "error" in _create_bulk(["other"], idempotency_key="epic-1")
+
+
+def test_bulk_create_idempotency_survives_cache_eviction(fake_api):
+    """Test that the idempotency ledger is kept when the cache is cleared or evicts entries."""
+    _, calls = fake_api
+
+    _create_bulk(["one", "two"], idempotency_key="epic-2")
+    server.cache.invalidate()
+    retry = _create_bulk(["one", "two"], idempotency_key="epic-2")
+
+    assert len(calls["batch"]) == 1
+    assert retry["created"] == 2
+
+
+def test_bulk_create_rejects_concurrent_call_with_same_key(fake_api):
+    """Test that a key claimed by a call still creating stories isn't used by another call."""
+    _, calls = fake_api
+    stories = [server.UserStoryInput(title="one")]
+    stories_hash = server.hashlib.sha256(server.json.dumps([story.model_dump() for story in stories]).encode()).hexdigest()
+    server.ledger.claim("Project:epic-3", stories_hash)
+
+    result = _create_bulk(["one"], idempotency_key="epic-3")
+
+    assert "error" in result and "in use" in result["error"]
+    assert calls["batch"] == []
+
+
+def test_bulk_create_falls_back_without_batch_endpoint(fake_api):
+    """Test that stories are created one by one when $batch isn't available."""
+    backlog, calls = fake_api
+    backlog["batch_available"] = False
+
+    result = _create_bulk(["one", "two", "three"])
+
+    assert len(calls["create"]) == 3
+    assert result["created"] == 3
+
+
+def test_invalidate_cache(fake_api):
+    """Test that invalidate_cache forces the next call to fetch fresh data."""
+    _, calls = fake_api
+
+    asyncio.run(server.get_team_projects(ctx=FakeContext()))
+    asyncio.run(server.get_team_projects(ctx=FakeContext()))
+    assert len(calls["projects"]) == 1
+
+    result = asyncio.run(server.invalidate_cache(scope="projects", ctx=FakeContext()))
+    assert result["invalidated"] == 1
+    asyncio.run(server.get_team_projects(ctx=FakeContext()))
+    assert len(calls["projects"]) == 2
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
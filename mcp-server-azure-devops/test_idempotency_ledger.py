@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from idempotency_ledger import CLAIMED, CONFLICT, IN_PROGRESS, IdempotencyLedger
+
+
+def test_claim_is_exclusive_until_released():
+    """Test that a claimed key blocks other calls until it is released."""
+    ledger = IdempotencyLedger(":memory:")
+
+    assert ledger.claim("epic", "h1").status == CLAIMED
+    assert ledger.claim("epic", "h1").status == IN_PROGRESS
+    assert ledger.claim("epic", "h2").status == CONFLICT
+
+    ledger.release("epic", {"0": {"id": 1}})
+    claim = ledger.claim("epic", "h1")
+    assert claim.status == CLAIMED
+    assert claim.created == {"0": {"id": 1}}
+
+
+def test_progress_survives_restart_and_lease_expiry(tmp_path):
+    """Test that stories recorded by a call that never finished are kept for the next claim."""
+    db_path = str(tmp_path / "ledger.sqlite3")
+    ledger = IdempotencyLedger(db_path, lease=0.05)
+    ledger.claim("epic", "h1")
+    ledger.record("epic", {"0": {"id": 1}})
+
+    restarted = IdempotencyLedger(db_path, lease=0.05)
+    assert restarted.claim("epic", "h1").status == IN_PROGRESS
+    time.sleep(0.1)
+    claim = restarted.claim("epic", "h1")
+    assert claim.status == CLAIMED
+    assert claim.created == {"0": {"id": 1}}
+
+
+def test_expired_keys_are_forgotten():
+    """Test that a key can be used for other stories once its TTL has passed."""
+    ledger = IdempotencyLedger(":memory:", ttl=0.05)
+    ledger.claim("epic", "h1")
+    ledger.release("epic", {})
+    time.sleep(0.1)
+
+    assert ledger.claim("epic", "h2").status == CLAIMED
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
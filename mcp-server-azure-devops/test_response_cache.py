@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+def test_expired_entries_kept_for_revalidation():
+    """Test that expired entries are returned as stale so they can be revalidated."""
+    cache = ResponseCache()
+    cache.set("projects:", {"projects": []}, ttl=0, etag='"abc"')
+
+    entry = cache.get("projects:")
+    assert entry is not None and not entry.fresh
+    assert entry.etag == '"abc"'
+
+    cache.touch("projects:", ttl=60)
+    assert cache.get("projects:").fresh
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    """Test that the least recently used entries are evicted when limits are exceeded."""
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.get("a")
+    cache.set("c", 3, ttl=60)
+    assert cache.get("b") is None
+    assert cache.get("a").value == 1
+
+    cache = ResponseCache(max_bytes=30)
+    cache.set("a", "x" * 10, ttl=60)
+    cache.set("b", "y" * 10, ttl=60)
+    cache.set("c", "z" * 10, ttl=60)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] <= 30
+
+
+def test_invalidate_by_prefix():
+    """Test that invalidation only removes keys with the given prefix."""
+    cache = ResponseCache()
+    cache.set("stories:A:[1]", 1, ttl=60)
+    cache.set("stories:A:[2]", 2, ttl=60)
+    cache.set("stories:AB:[1]", 3, ttl=60)
+    assert cache.invalidate("stories:A:") == 2
+    assert cache.get("stories:AB:[1]").value == 3
+
+
+def test_sqlite_backing_survives_restart(tmp_path):
+    """Test that entries persisted to sqlite are loaded by a new cache instance."""
+    db_path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(db_path=db_path)
+    cache.set("teams:", {"teams": [{"name": "Team"}]}, ttl=60, etag='"t1"')
+    cache.set("projects:", {"projects": []}, ttl=60)
+    cache.invalidate("projects:")
+
+    restarted = ResponseCache(db_path=db_path)
+    entry = restarted.get("teams:")
+    assert entry.value == {"teams": [{"name": "Team"}]}
+    assert entry.etag == '"t1"'
+    assert entry.expires_at > time.time()
+    assert restarted.get("projects:") is None
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
@@ -0,0 +1,15 @@
+import hashlib
+
+import pytest
+
+from template_store import Template
+
+
+@pytest.fixture
+def make_template():
+    """Factory for in-memory templates, as the store would read them from <template_id>.md."""
+
+    def make(template_id, content):
+        return Template(template_id, f"{template_id}.md", content, hashlib.sha256(content.encode()).hexdigest(), (0, len(content)))
+
+    return make
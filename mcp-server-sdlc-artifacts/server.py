@@ -1,11 +1,15 @@
 """MCP server for important templates in the Software Delivery Lifecycle (SDLC) for the team."""
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Union
 
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP, Context
 from pydantic import Field
 
+from template_index import TemplateIndex
+from template_render import DOCUMENT, OUTPUTS, TemplateRenderer
+from template_store import TemplateStore
+
 # Load environment variables
 #load_dotenv()
 
@@ -18,82 +22,122 @@ mcp = FastMCP(
     port=8080
 )
 
-template_file_map = {
-    "decision-log": "decision-log.md",
-    "incident-report-postmortem": "incident-report-postmortem.md",
-    "user-story": "user-story.md",
-    "release-notes": "release-notes.md"
-}
-    
+TEMPLATE_DIR = os.getenv("SDLC_TEMPLATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
+TEMPLATE_POLL_SECONDS = float(os.getenv("SDLC_TEMPLATE_POLL_SECONDS", "2"))
+
+# Templates are read once and kept in memory, a watcher reloads the ones that change on disk
+template_store = TemplateStore(TEMPLATE_DIR, TEMPLATE_POLL_SECONDS).start()
+# Sections of the templates, rebuilt when the store reloads templates
+template_index = TemplateIndex()
+# Templates compiled for rendering, cached per template version
+template_renderer = TemplateRenderer()
+
+# The templates are exposed both as tools and as resources, as support for resources is generally lacking in MCP clients.
+# The tool schema is generated once from the templates discovered at startup, so it doesn't grow with the number of templates.
+TEMPLATE_ID_DESCRIPTION = (
+    "Id of the template, see list_templates for all templates. "
+    f"For example: {', '.join(list(template_store.templates())[:10])}"
+)
 
-# The templates could be implemented in MCP with resources and prompts. As support for this is generally lacking, we use tools instead.
+@mcp.tool()
+async def list_templates(
+    ctx: Context = Field(description="MCP context"),
+) -> Dict[str, Any]:
+    """List the templates used in the Software delivery lifecycle of this IT delivery.
+    Returns the id, description, version and SHA-256 content hash of every template.
+    A template that was fetched before only needs to be fetched again when its hash has changed.
+    """
+    return {"templates": list(template_store.index())}
 
 @mcp.tool()
-def get_template_decision_log(
+async def get_template(
+    template_id: str = Field(description=TEMPLATE_ID_DESCRIPTION),
     ctx: Context = Field(description="MCP context"),
 ) -> Dict[str, Any]:
-    """Get the template used for decision logs in the Software delivery lifecycle of this IT delivery.
-    The template is mainly used for Architecture Decision Records (ADRs), but can also be used for other decisions within the delivery.
+    """Get a template used in the Software delivery lifecycle of this IT delivery,
+    such as decision logs (ADRs), incident reports (postmortems), user stories and release notes.
+    Returns the markdown content of the template with its version and SHA-256 content hash.
     """
-    return _read_template("decision-log", ctx)
+    return await _read_template(template_id, ctx)
 
 @mcp.tool()
-def get_template_incident_report(
+async def get_template_section(
+    template_id: str = Field(description=TEMPLATE_ID_DESCRIPTION),
+    section: str = Field(description="Heading of the section, or the path of headings separated by ' > ', for example 'Acceptance Criteria' or 'Notes > Testing Notes'. The start of a heading is enough, like 'Timeline'"),
     ctx: Context = Field(description="MCP context"),
 ) -> Dict[str, Any]:
-    """Get the template used for incident reports (aka. postmortem) in the Software delivery lifecycle of this IT delivery.
-    The incident report captures the details of an incident, including the timeline, root cause analysis, and action items.
-    It is used to document the incident and share the learnings with the team and stakeholders.
+    """Get one section of a template, including its subsections, instead of the whole template.
+    If the section isn't found, the headings of all sections of the template are returned.
     """
-    return _read_template("incident-report-postmortem", ctx)    
+    await ctx.debug(f"Reading section '{section}' of template {template_id}")
+    template = template_store.get(template_id)
+    if template is None:
+        await ctx.error(f"Unknown template: {template_id}")
+        return {"error": f"Template '{template_id}' not found. Use list_templates to get the available templates"}
+    template_index.update(template_store.templates())
+    found = template_index.section(template_id, section)
+    if found is None:
+        return {"error": f"Section '{section}' not found in template '{template_id}'", "sections": template_index.outline(template_id)}
+    return {"id": template_id, "version": template.version, "section": found.path_text, "content": found.content}
 
 @mcp.tool()
-def get_template_user_story(
+async def search_templates(
+    query: str = Field(description="Words to search for in the templates"),
+    template_id: Optional[str] = Field(description="Only search this template. Default: all templates", default=None),
+    limit: int = Field(description="Maximum number of sections to return. Default: 5", default=5),
     ctx: Context = Field(description="MCP context"),
 ) -> Dict[str, Any]:
-    """Get the template used for user stories in the Software delivery lifecycle of this IT delivery.
-    The user story template is used to capture the requirements and acceptance criteria for a feature or functionality.
-    It is used to communicate the needs of the users and stakeholders to the development team.
+    """Search the sections of all templates and return the best matching sections, most relevant first.
+    Every result has the template id, the section heading path, a relevance score and a snippet.
+    Use get_template_section to get the content of a section.
     """
-    return _read_template("user-story", ctx)
+    await ctx.debug(f"Searching templates for '{query}'")
+    template_index.update(template_store.templates())
+    return {"results": template_index.search(query, template_id, max(1, limit))}
 
 @mcp.tool()
-def get_template_release_notes(
+async def render_template(
+    template_id: str = Field(description=TEMPLATE_ID_DESCRIPTION),
+    values: Dict[str, Union[str, List[str]]] = Field(description="Values of the placeholders by the text inside their brackets, for example {\"Title\": \"Export to CSV\", \"role/persona\": \"analyst\"} for [Title] and [role/persona]. A list of values fills repeated placeholders in order"),
+    output: str = Field(description="document for the rendered document, or diff for only the changes as a unified diff against the template. Default: document", default=DOCUMENT),
     ctx: Context = Field(description="MCP context"),
 ) -> Dict[str, Any]:
-    """Get the template used for release notes in the Software delivery lifecycle of this IT delivery.
-    The release notes template is used to capture the details of a release, including the features, bug fixes, and known issues.
-    The release notes will be based on release please and details are in the CHANGELOG.md file.
+    """Fill in the placeholders of a template, like [Title] or {Insert incident report title}, with the given values.
+    Use this instead of writing out the whole template when creating decision logs, incident reports, user stories or release notes.
+    Returns the rendered document or a diff, the placeholders that are still missing a value and the value names that didn't match a placeholder.
+    Call it with no values to get all placeholders of a template as missing.
     """
-    return _read_template("release-notes", ctx)    
-
-def _read_template(template_id: str, ctx: Context):   
-    ctx.debug(f"Preparing reading template {template_id}")  
-
-
-    # Get the file name for the requested template type
-    file_name= template_file_map.get(template_id)
-
-    if not file_name:
-        ctx.error(f"Unknown template type: {template_id}")
-        return f"Error: Template type '{template_id}' not supported"
-    
-    # Build the file path
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    template_path = os.path.join(base_dir, "templates", file_name)
-    
-    ctx.debug(f"Reading template from {template_path}")
-    
-    try:
-        with open(template_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        return content
-    except FileNotFoundError:
-        ctx.error(f"Template file not found: {template_path}")
-        return f"Error: Template file '{file_name}' not found"
-    except Exception as e:
-        ctx.error(f"Error reading template: {str(e)}")
-        return f"Error reading template: {str(e)}"
+    await ctx.debug(f"Rendering template {template_id} with {len(values)} values")
+    if output not in OUTPUTS:
+        return {"error": f"Unknown output '{output}'. Use one of: {', '.join(OUTPUTS)}"}
+    template = template_store.get(template_id)
+    if template is None:
+        await ctx.error(f"Unknown template: {template_id}")
+        return {"error": f"Template '{template_id}' not found. Use list_templates to get the available templates"}
+    return {"id": template_id, "version": template.version, **template_renderer.render(template, values, output)}
+
+@mcp.resource("sdlc://templates", name="templates", description="Id, description, version and hash of every SDLC template", mime_type="application/json")
+def templates_index() -> Dict[str, Any]:
+    """Index of the templates."""
+    return {"templates": list(template_store.index())}
+
+@mcp.resource("sdlc://templates/{template_id}", name="template", description="Markdown content of one SDLC template", mime_type="text/markdown")
+def template_content(template_id: str) -> str:
+    """Content of one template."""
+    template = template_store.get(template_id)
+    if template is None:
+        raise ValueError(f"Template '{template_id}' not found")
+    return template.content
+
+async def _read_template(template_id: str, ctx: Context) -> Dict[str, Any]:
+    await ctx.debug(f"Reading template {template_id}")
+
+    # Served from memory, without any file I/O
+    template = template_store.get(template_id)
+    if template is None:
+        await ctx.error(f"Unknown template: {template_id}")
+        return {"error": f"Template '{template_id}' not found. Use list_templates to get the available templates"}
+    return {**template.summary(), "content": template.content}
 
 
 if __name__ == "__main__":
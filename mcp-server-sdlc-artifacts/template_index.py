@@ -0,0 +1,212 @@
+"""Section index and full-text search over the templates.
+
+Every template is parsed once per version into its markdown sections, so a tool
+can return a single section, like the timeline of an incident report, instead of
+the whole file. A section runs from its heading to the next heading of the same
+or a higher level, and is addressed by the path of headings leading to it, with
+" > " between the headings. Search ranks sections with BM25 over their own text,
+with the words of the heading counting extra.
+"""
+import math
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from template_store import Template
+
+PATH_SEPARATOR = " > "
+HEADING_WEIGHT = 3
+SNIPPET_LENGTH = 200
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_WORD = re.compile(r"\w+")
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+
+@dataclass(frozen=True)
+class Section:
+    template_id: str
+    path: Tuple[str, ...]
+    level: int
+    # The section with its subsections
+    content: str
+    # The section without its subsections, which is what search ranks
+    text: str
+
+    @property
+    def path_text(self) -> str:
+        return PATH_SEPARATOR.join(self.path)
+
+
+def parse_sections(template_id: str, content: str) -> List[Section]:
+    """Split markdown into its sections in document order. Headings in code blocks are ignored."""
+    lines = content.split("\n")
+    headings: List[Tuple[int, int, str]] = []
+    in_fence = False
+    for number, line in enumerate(lines):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+            continue
+        match = None if in_fence else _HEADING.match(line)
+        if match:
+            headings.append((number, len(match.group(1)), match.group(2)))
+
+    sections = []
+    stack: List[Tuple[int, str]] = []
+    for position, (number, level, title) in enumerate(headings):
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, title))
+        end = next((other for other, other_level, _ in headings[position + 1:] if other_level <= level), len(lines))
+        own_end = headings[position + 1][0] if position + 1 < len(headings) else len(lines)
+        sections.append(Section(
+            template_id=template_id,
+            path=tuple(title for _, title in stack),
+            level=level,
+            content="\n".join(lines[number:end]).strip("\n"),
+            text="\n".join(lines[number:own_end]).strip("\n"),
+        ))
+    return sections
+
+
+@dataclass(frozen=True)
+class _IndexState:
+    sections: Mapping[str, List[Section]]
+    terms: List[Tuple[Section, Counter, int]]
+    document_frequency: Counter
+    average_length: float
+
+
+class TemplateIndex:
+    """Sections and search statistics of a snapshot of the template store.
+
+    Call update() with the current snapshot before using the index. The index is
+    only rebuilt when the store swapped in a new snapshot, and templates are only
+    parsed again when their content hash changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._source: Optional[Mapping[str, Template]] = None
+        self._parsed: Dict[str, List[Section]] = {}
+        # Replaced as a whole, so readers never see a half updated index
+        self._state = _IndexState({}, [], Counter(), 0.0)
+
+    def update(self, templates: Mapping[str, Template]) -> None:
+        """Rebuild the index if templates isn't the snapshot it was built from."""
+        if templates is self._source:
+            return
+        with self._lock:
+            if templates is self._source:
+                return
+            parsed = {}
+            for template in templates.values():
+                key = f"{template.template_id}:{template.sha256}"
+                parsed[key] = self._parsed.get(key) or parse_sections(template.template_id, template.content)
+            sections = {template.template_id: parsed[f"{template.template_id}:{template.sha256}"] for template in templates.values()}
+
+            terms = []
+            document_frequency: Counter = Counter()
+            for template_sections in sections.values():
+                for section in template_sections:
+                    counts = Counter(_words(section.text))
+                    for word in _words(section.path[-1]):
+                        counts[word] += HEADING_WEIGHT - 1
+                    terms.append((section, counts, sum(counts.values())))
+                    document_frequency.update(counts.keys())
+
+            average_length = sum(length for _, _, length in terms) / len(terms) if terms else 0.0
+            self._parsed = parsed
+            self._state = _IndexState(sections, terms, document_frequency, average_length)
+            self._source = templates
+
+    def outline(self, template_id: str) -> Optional[List[str]]:
+        """The section paths of a template in document order, or None for an unknown template."""
+        sections = self._state.sections.get(template_id)
+        return None if sections is None else [section.path_text for section in sections]
+
+    def section(self, template_id: str, path: str) -> Optional[Section]:
+        """Find a section of a template by its path, or by the last headings of its path.
+
+        Headings are compared case-insensitively. A heading also matches the start of a
+        longer heading, so "Timeline" finds "Timeline / Response". Exact matches win.
+        """
+        wanted = [_normalize(part) for part in re.split(r"\s*>\s*", path) if part.strip()]
+        if not wanted:
+            return None
+        best: Optional[Section] = None
+        best_rank = 0
+        for section in self._state.sections.get(template_id, []):
+            rank = _path_rank([_normalize(heading) for heading in section.path], wanted)
+            if rank > best_rank:
+                best, best_rank = section, rank
+        return best
+
+    def search(self, query: str, template_id: Optional[str] = None, limit: int = 5) -> List[Dict[str, Any]]:
+        """Sections ranked by BM25 relevance to the query, optionally within one template."""
+        words = set(_words(query))
+        if not words:
+            return []
+        state = self._state
+        total = len(state.terms)
+        scored = []
+        for section, counts, length in state.terms:
+            if template_id and section.template_id != template_id:
+                continue
+            score = 0.0
+            for word in words:
+                frequency = counts.get(word)
+                if not frequency:
+                    continue
+                documents = state.document_frequency[word]
+                idf = math.log(1 + (total - documents + 0.5) / (documents + 0.5))
+                score += idf * frequency * (_K1 + 1) / (frequency + _K1 * (1 - _B + _B * length / state.average_length))
+            if score > 0:
+                scored.append((score, section))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [
+            {
+                "id": section.template_id,
+                "section": section.path_text,
+                "score": round(score, 3),
+                "snippet": _snippet(section.text, words),
+            }
+            for score, section in scored[:limit]
+        ]
+
+
+def _path_rank(path: List[str], wanted: List[str]) -> int:
+    # 3 for an exact match of the whole path, 2 for matching the last headings, 1 for matching their start
+    if path == wanted:
+        return 3
+    if len(wanted) > len(path):
+        return 0
+    tail = path[-len(wanted):]
+    if tail == wanted:
+        return 2
+    if all(heading.startswith(part) for heading, part in zip(tail, wanted)):
+        return 1
+    return 0
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _snippet(text: str, words: set) -> str:
+    # The first line of the section body mentioning a query word, or the start of the body
+    lines = [line.strip() for line in text.split("\n")[1:] if line.strip()]
+    for line in lines:
+        if words & set(_words(line)):
+            return line[:SNIPPET_LENGTH]
+    return lines[0][:SNIPPET_LENGTH] if lines else ""
@@ -0,0 +1,128 @@
+"""Server-side rendering of templates with field values.
+
+Placeholders in the templates are bracketed texts like [Title] or
+{Insert incident report title}. The text inside the brackets is the field name.
+Markdown links like [CHANGELOG.md](link) and task list boxes like [ ] are not
+placeholders. A template is compiled once per version into a list of literal
+text and placeholders, so rendering is a single join without scanning the
+markdown again.
+
+A field value can be a string, used for every occurrence of the placeholder, or
+a list of strings filling the occurrences in order.
+"""
+import difflib
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from template_store import Template
+
+_PLACEHOLDER = re.compile(
+    r"(?<!\])\[(?!\s*[xX]?\s*\])([^\[\]\n]+)\](?![\(\[])"  # [field], but not [ ], [x], [text](link) or either part of [text][ref]
+    r"|\{([^{}\n]+)\}"  # {field}
+)
+
+FieldValue = Union[str, List[str]]
+
+DOCUMENT = "document"
+DIFF = "diff"
+OUTPUTS = (DOCUMENT, DIFF)
+
+
+@dataclass(frozen=True)
+class Placeholder:
+    name: str
+    # The name as matched against the names of the values, see field_key
+    key: str
+    # The placeholder as written in the template, kept when no value is given
+    source: str
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    template_id: str
+    sha256: str
+    parts: Tuple[Union[str, Placeholder], ...]
+    # Field names in order of first appearance
+    fields: Tuple[str, ...]
+
+    def render(self, values: Dict[str, FieldValue]) -> Tuple[str, List[str], List[str]]:
+        """Substitute the values. Returns the document, the fields without a value and the unknown value names."""
+        normalized = {field_key(name): value for name, value in values.items()}
+        occurrences: Dict[str, int] = {}
+        missing: Dict[str, None] = {}
+        output = []
+        for part in self.parts:
+            if isinstance(part, str):
+                output.append(part)
+                continue
+            key = part.key
+            value = normalized.get(key)
+            if isinstance(value, list):
+                occurrence = occurrences.get(key, 0)
+                occurrences[key] = occurrence + 1
+                value = value[occurrence] if occurrence < len(value) else None
+            if value is None:
+                missing[part.name] = None
+                output.append(part.source)
+            else:
+                output.append(str(value))
+        known = {part.key for part in self.parts if isinstance(part, Placeholder)}
+        unknown = [name for name in values if field_key(name) not in known]
+        return "".join(output), list(missing), unknown
+
+
+def compile_template(template: Template) -> CompiledTemplate:
+    """Split the template content into literal text and placeholders."""
+    parts: List[Union[str, Placeholder]] = []
+    fields: Dict[str, None] = {}
+    position = 0
+    for match in _PLACEHOLDER.finditer(template.content):
+        name = (match.group(1) or match.group(2)).strip()
+        if match.start() > position:
+            parts.append(template.content[position:match.start()])
+        parts.append(Placeholder(name, field_key(name), match.group(0)))
+        fields[name] = None
+        position = match.end()
+    if position < len(template.content):
+        parts.append(template.content[position:])
+    return CompiledTemplate(template.template_id, template.sha256, tuple(parts), tuple(fields))
+
+
+def field_key(name: str) -> str:
+    """Field names match case-insensitively, with or without their brackets."""
+    name = name.strip()
+    if len(name) > 1 and (name[0], name[-1]) in (("[", "]"), ("{", "}")):
+        name = name[1:-1]
+    return " ".join(name.lower().split())
+
+
+def unified_diff(template: Template, rendered: str) -> str:
+    """The changes of the rendered document against the template as a unified diff."""
+    return "".join(difflib.unified_diff(
+        template.content.splitlines(keepends=True),
+        rendered.splitlines(keepends=True),
+        fromfile=f"{template.template_id}.md",
+        tofile=f"{template.template_id}.rendered.md",
+    ))
+
+
+class TemplateRenderer:
+    """Compiled templates, cached per template id and content hash."""
+
+    def __init__(self):
+        self._compiled: Dict[str, CompiledTemplate] = {}
+
+    def compiled(self, template: Template) -> CompiledTemplate:
+        compiled: Optional[CompiledTemplate] = self._compiled.get(template.template_id)
+        if compiled is None or compiled.sha256 != template.sha256:
+            # Replaces the compiled previous version of the template
+            compiled = compile_template(template)
+            self._compiled[template.template_id] = compiled
+        return compiled
+
+    def render(self, template: Template, values: Dict[str, FieldValue], output: str = DOCUMENT) -> Dict[str, Any]:
+        """Render the template as a document or a diff, with the fields that are still missing and the unknown value names."""
+        document, missing, unknown = self.compiled(template).render(values)
+        rendered = unified_diff(template, document) if output == DIFF else document
+        return {output: rendered, "missing": missing, "unknown": unknown}
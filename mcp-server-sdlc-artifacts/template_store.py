@@ -0,0 +1,183 @@
+"""Memory-resident store of the markdown templates.
+
+All templates are read once at startup into an immutable snapshot, so tool calls
+are served without any file I/O. A background thread polls the modification time
+and size of the files under the templates directory and swaps in a new snapshot
+when a template is added, changed or removed. Readers always see a complete
+snapshot, never a partially reloaded one.
+
+Templates describe themselves with a frontmatter block of "key: value" lines:
+
+    ---
+    id: user-story
+    description: Requirements and acceptance criteria of a feature
+    version: 1.2.0
+    ---
+
+The id defaults to the file name without .md. The frontmatter is not part of
+the template content, and the index of all templates is built once per snapshot.
+"""
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+TEMPLATE_SUFFIX = ".md"
+FRONTMATTER_DELIMITER = "---"
+
+
+@dataclass(frozen=True)
+class Template:
+    template_id: str
+    file_name: str
+    content: str
+    sha256: str
+    # (mtime_ns, size) of the file when it was read, to detect changes
+    signature: Tuple[int, int]
+    description: str = ""
+    version: str = ""
+    metadata: Mapping[str, str] = field(default_factory=dict)
+
+    def summary(self) -> Dict[str, Any]:
+        """Id, description, version and hash of the template, without the content."""
+        return {
+            "id": self.template_id,
+            "description": self.description,
+            "version": self.version,
+            "sha256": self.sha256,
+        }
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    by_file: Mapping[str, Template]
+    by_id: Mapping[str, Template]
+    index: Tuple[Dict[str, Any], ...]
+
+
+_EMPTY = _Snapshot(MappingProxyType({}), MappingProxyType({}), ())
+
+
+class TemplateStore:
+    """Immutable snapshot of the templates in a directory, refreshed when files change.
+
+    Args:
+        directory: Directory with the .md templates. The template id is the file name without .md
+        poll_seconds: Seconds between checks for changed files, 0 disables the watcher
+    """
+
+    def __init__(self, directory: str, poll_seconds: float = 2.0):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self._snapshot = _EMPTY
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.refresh()
+
+    def get(self, template_id: str) -> Optional[Template]:
+        """The template with the given id from the current snapshot, or None."""
+        return self._snapshot.by_id.get(template_id)
+
+    def templates(self) -> Mapping[str, Template]:
+        """The current snapshot, a read-only mapping from template id to template."""
+        return self._snapshot.by_id
+
+    def index(self) -> Tuple[Dict[str, Any], ...]:
+        """Summaries of all templates sorted by id, built once per snapshot."""
+        return self._snapshot.index
+
+    def refresh(self) -> bool:
+        """Reload the templates that were added, changed or removed. Returns True if anything changed."""
+        with self._refresh_lock:
+            current = self._snapshot.by_file
+            signatures = self._scan()
+            if signatures.keys() == current.keys() and all(
+                current[file_name].signature == signature for file_name, signature in signatures.items()
+            ):
+                return False
+
+            by_file: Dict[str, Template] = {}
+            for file_name, signature in sorted(signatures.items()):
+                previous = current.get(file_name)
+                if previous is not None and previous.signature == signature:
+                    by_file[file_name] = previous
+                    continue
+                template = self._read(file_name, signature)
+                if template is not None:
+                    by_file[file_name] = template
+            by_id: Dict[str, Template] = {}
+            for template in by_file.values():
+                # With duplicate ids the first file in name order wins
+                by_id.setdefault(template.template_id, template)
+            index = tuple(template.summary() for _, template in sorted(by_id.items()))
+            self._snapshot = _Snapshot(MappingProxyType(by_file), MappingProxyType(by_id), index)
+            return True
+
+    def start(self) -> "TemplateStore":
+        """Start the background thread watching the directory for changes."""
+        if self.poll_seconds > 0 and self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name="template-watcher", daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.refresh()
+            except OSError:
+                # The directory may be replaced while it's scanned, try again on the next poll
+                pass
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        signatures = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(TEMPLATE_SUFFIX):
+                    stat = entry.stat()
+                    signatures[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def _read(self, file_name: str, signature: Tuple[int, int]) -> Optional[Template]:
+        try:
+            with open(os.path.join(self.directory, file_name), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            # Removed between the scan and the read
+            return None
+        # Universal newlines, as when the file was read in text mode
+        metadata, content = parse_frontmatter(data.decode("utf-8").replace("\r\n", "\n"))
+        return Template(
+            template_id=metadata.get("id") or file_name[:-len(TEMPLATE_SUFFIX)],
+            file_name=file_name,
+            content=content,
+            sha256=hashlib.sha256(data).hexdigest(),
+            signature=signature,
+            description=metadata.get("description", ""),
+            version=metadata.get("version", ""),
+            metadata=MappingProxyType(metadata),
+        )
+
+
+def parse_frontmatter(text: str) -> Tuple[Dict[str, str], str]:
+    """Split a leading frontmatter block of "key: value" lines from the content."""
+    lines = text.split("\n")
+    if not lines or lines[0].strip() != FRONTMATTER_DELIMITER:
+        return {}, text
+    metadata: Dict[str, str] = {}
+    for number, line in enumerate(lines[1:], start=1):
+        if line.strip() == FRONTMATTER_DELIMITER:
+            return metadata, "\n".join(lines[number + 1:]).lstrip("\n")
+        key, separator, value = line.partition(":")
+        if separator and key.strip():
+            metadata[key.strip()] = value.strip().strip("\"'")
+    # No closing delimiter, so it wasn't frontmatter
+    return {}, text
@@ -0,0 +1,121 @@
+from types import MappingProxyType
+
+import pytest
+
+from template_index import TemplateIndex, parse_sections
+
+INCIDENT = """# Incident Report
+
+## Summary
+Short description of the incident and its customer impact.
+
+## Timeline / Response
+- 10:00 Alert fired
+- 10:05 On-call engineer paged
+
+### Detection
+How the incident was detected.
+
+## Root Cause
+The database connection pool was exhausted.
+
+```
+# Not a heading
+```
+"""
+
+RELEASE = """# Release Notes
+
+## Summary
+Highlights of the release.
+
+## Breaking Changes
+Changes that need action from users, like removed endpoints.
+"""
+
+
+@pytest.fixture
+def make_index(make_template):
+    def make(**templates):
+        index = TemplateIndex()
+        index.update(MappingProxyType({template_id: make_template(template_id, content) for template_id, content in templates.items()}))
+        return index
+
+    return make
+
+
+def test_parse_sections_nesting_and_code_blocks():
+    """Test that sections get the path of their headings and headings in code blocks are ignored."""
+    sections = parse_sections("incident", INCIDENT)
+    assert [section.path for section in sections] == [
+        ("Incident Report",),
+        ("Incident Report", "Summary"),
+        ("Incident Report", "Timeline / Response"),
+        ("Incident Report", "Timeline / Response", "Detection"),
+        ("Incident Report", "Root Cause"),
+    ]
+    timeline = sections[2]
+    assert "### Detection" in timeline.content
+    assert "Detection" not in timeline.text
+    assert "# Not a heading" in sections[4].content
+
+
+def test_section_path_matching(make_index):
+    """Test that full paths, trailing headings and heading prefixes find sections, exact matches first."""
+    index = make_index(incident=INCIDENT)
+    assert index.section("incident", "Incident Report > Summary").path_text == "Incident Report > Summary"
+    assert index.section("incident", "detection").path_text == "Incident Report > Timeline / Response > Detection"
+    assert index.section("incident", "timeline").path_text == "Incident Report > Timeline / Response"
+    assert index.section("incident", "Timeline > Detection").path[-1] == "Detection"
+    assert index.section("incident", "root  CAUSE").path[-1] == "Root Cause"
+    assert index.section("incident", "Lessons learned") is None
+    assert index.section("missing", "Summary") is None
+    assert index.outline("incident")[0] == "Incident Report"
+    assert index.outline("missing") is None
+
+
+def test_search_ranks_with_bm25_and_heading_weight(make_index):
+    """Test that search ranks rare words and heading matches first, and filters by template."""
+    index = make_index(incident=INCIDENT, release=RELEASE)
+
+    results = index.search("database pool")
+    assert results[0]["id"] == "incident" and results[0]["section"] == "Incident Report > Root Cause"
+    assert results[0]["snippet"] == "The database connection pool was exhausted."
+
+    # "summary" is in both templates, in the heading of one section each
+    summary = index.search("summary")
+    assert {result["id"] for result in summary} == {"incident", "release"}
+    assert all(result["section"].endswith("Summary") for result in summary)
+    assert [result["id"] for result in index.search("summary", template_id="release")] == ["release"]
+
+    # A word in the heading outranks the same word in the body of a section of the same length
+    weighted = make_index(plan="# Plan\n\n## Rollback\nRevert the deployment.\n\n## Steps\nRollback if needed.\n")
+    rollback = weighted.search("rollback")
+    assert [result["section"] for result in rollback] == ["Plan > Rollback", "Plan > Steps"]
+    assert rollback[0]["score"] > rollback[1]["score"]
+
+    assert index.search("kubernetes") == []
+    assert index.search("") == []
+    assert len(index.search("the", limit=2)) <= 2
+
+
+def test_update_reuses_parsed_templates(make_template):
+    """Test that the index is only rebuilt for a new snapshot and unchanged templates aren't parsed again."""
+    index = TemplateIndex()
+    incident = make_template("incident", INCIDENT)
+    snapshot = MappingProxyType({"incident": incident})
+    index.update(snapshot)
+    sections = index._state.sections["incident"]
+
+    index.update(snapshot)
+    assert index._state.sections["incident"] is sections
+
+    changed = make_template("release", RELEASE)
+    index.update(MappingProxyType({"incident": incident, "release": changed}))
+    assert index._state.sections["incident"] is sections
+    assert index.outline("release")[-1] == "Release Notes > Breaking Changes"
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
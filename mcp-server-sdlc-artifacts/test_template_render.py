@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from template_render import DIFF, TemplateRenderer, compile_template, field_key
+from template_store import TemplateStore
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+RELEASE = """# Release Notes - [Version]
+
+See [CHANGELOG.md](CHANGELOG.md) and the [docs][docs-link] for details.
+
+## Features
+- [Feature]
+- [Feature]
+
+## Checklist
+- [ ] Tests pass
+- [x] Docs updated
+
+Owner: {Release owner}, version [Version]
+"""
+
+
+@pytest.fixture
+def release(make_template):
+    return make_template("release-notes", RELEASE)
+
+
+def test_placeholders_exclude_links_and_task_boxes(release):
+    """Test that markdown links, reference links and task list boxes are not placeholders."""
+    compiled = compile_template(release)
+    assert compiled.fields == ("Version", "Feature", "Release owner")
+
+
+def test_list_values_fill_occurrences_in_order(release):
+    """Test that a list value fills the occurrences of a placeholder in order and a string fills all of them."""
+    document, missing, unknown = compile_template(release).render({
+        "version": "2.1.0",
+        "[Feature]": ["Dark mode", "CSV export"],
+        "release owner": "Kari",
+    })
+    assert document.startswith("# Release Notes - 2.1.0\n")
+    assert "- Dark mode\n- CSV export\n" in document
+    assert "Owner: Kari, version 2.1.0" in document
+    assert "[CHANGELOG.md](CHANGELOG.md)" in document and "[docs][docs-link]" in document
+    assert "- [ ] Tests pass" in document and "- [x] Docs updated" in document
+    assert missing == [] and unknown == []
+
+
+def test_missing_and_unknown_fields(release):
+    """Test that placeholders without a value are kept and reported, and unknown names are reported."""
+    document, missing, unknown = compile_template(release).render({
+        "Feature": ["Dark mode"],
+        "Reviewer": "Ola",
+    })
+    assert "- Dark mode\n- [Feature]\n" in document
+    assert "# Release Notes - [Version]" in document and "{Release owner}" in document
+    assert missing == ["Version", "Feature", "Release owner"]
+    assert unknown == ["Reviewer"]
+
+
+def test_field_key():
+    """Test that field names match case-insensitively with or without brackets and extra spaces."""
+    assert field_key("[Release  Owner]") == field_key("{release owner}") == field_key(" Release owner ") == "release owner"
+
+
+def test_renderer_diff_and_cache(release, make_template):
+    """Test that the renderer returns a diff on request and recompiles only when the template changes."""
+    renderer = TemplateRenderer()
+    template = release
+    result = renderer.render(template, {"Version": "2.1.0"}, output=DIFF)
+    assert "-# Release Notes - [Version]" in result[DIFF]
+    assert "+# Release Notes - 2.1.0" in result[DIFF]
+    assert result["missing"] == ["Feature", "Release owner"]
+
+    compiled = renderer.compiled(template)
+    assert renderer.compiled(template) is compiled
+    changed = make_template("release-notes", RELEASE.replace("[Feature]", "[Fix]"))
+    assert renderer.compiled(changed).fields == ("Version", "Fix", "Release owner")
+
+
+def test_render_decision_log():
+    """Test that the decision log template shipped with the server renders an ADR."""
+    template = TemplateStore(TEMPLATE_DIR, poll_seconds=0).get("decision-log")
+    document, missing, unknown = compile_template(template).render({
+        "Short title": "Use PostgreSQL for the order service",
+        "use case or component": "the order service",
+        "chosen option": "PostgreSQL",
+        "Date": "17-10-2026",
+        "Persons involved": "Kari, Ola",
+        "Context": "Orders need transactions across several tables.",
+        "Decision": "Store orders in PostgreSQL.",
+        "Alternative": ["MongoDB", "DynamoDB"],
+        "Title": "unused",
+    })
+    assert document.startswith("# Use PostgreSQL for the order service\n")
+    assert "`In the context of` **the order service**," in document
+    assert "`we decided for` **PostgreSQL**" in document
+    assert document.count("Date: 17-10-2026") == 2
+    assert "### MongoDB\n" in document and "### DynamoDB\n" in document
+    assert "## Context\nOrders need transactions across several tables.\n" in document
+    assert "non-functional concern or desire" in missing and "Short title" not in missing
+    assert unknown == ["Title"]
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import os
+import time
+
+import pytest
+
+# Tests swap in their own store, the server's watcher isn't needed
+os.environ.setdefault("SDLC_TEMPLATE_POLL_SECONDS", "0")
+
+import server
+from template_store import TemplateStore, parse_frontmatter
+
+ADR = """---
+id: decision-log
+description: "Architecture decision record"
+version: 1.2.0
+---
+
+# [Short title]
+"""
+
+
+def _write(directory, file_name, content):
+    path = directory / file_name
+    path.write_text(content, encoding="utf-8")
+    return path
+
+
+def _sha256(content):
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+@pytest.fixture
+def directory(tmp_path):
+    _write(tmp_path, "incident.md", "# Incident Report\n")
+    _write(tmp_path, "release.md", "# Release Notes\n")
+    return tmp_path
+
+
+def test_refresh_reloads_only_changed_templates(directory):
+    """Test that a changed file gets a new hash while unchanged templates are reused."""
+    store = TemplateStore(str(directory), poll_seconds=0)
+    incident, release = store.get("incident"), store.get("release")
+    assert incident.sha256 == _sha256("# Incident Report\n")
+    assert store.refresh() is False
+
+    path = _write(directory, "incident.md", "# Incident Report\n\n## Summary\n")
+    # Change the modification time too, on file systems with a coarse timestamp resolution
+    os.utime(path, ns=(time.time_ns(), incident.signature[0] + 1_000_000_000))
+    assert store.refresh() is True
+
+    assert store.get("incident").sha256 == _sha256("# Incident Report\n\n## Summary\n")
+    assert store.get("incident").content == "# Incident Report\n\n## Summary\n"
+    assert store.get("release") is release
+    assert store.refresh() is False
+
+
+def test_added_and_removed_templates_update_the_index(directory):
+    """Test that added and removed files show up in the index and replace the whole snapshot."""
+    store = TemplateStore(str(directory), poll_seconds=0)
+    before = store.templates()
+    assert [summary["id"] for summary in store.index()] == ["incident", "release"]
+
+    _write(directory, "user-story.md", "# User Story\n")
+    _write(directory, "notes.txt", "Not a template")
+    (directory / "release.md").unlink()
+    assert store.refresh() is True
+
+    assert [summary["id"] for summary in store.index()] == ["incident", "user-story"]
+    assert store.get("release") is None
+    assert store.index()[1]["sha256"] == _sha256("# User Story\n")
+    # Readers holding the earlier snapshot still see it unchanged
+    assert sorted(before) == ["incident", "release"]
+
+
+def test_watcher_picks_up_changes(directory):
+    """Test that the background watcher reloads the templates without an explicit refresh."""
+    store = TemplateStore(str(directory), poll_seconds=0.05).start()
+    try:
+        _write(directory, "user-story.md", "# User Story\n")
+        deadline = time.monotonic() + 5
+        while store.get("user-story") is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert store.get("user-story").content == "# User Story\n"
+    finally:
+        store.stop()
+
+
+def test_parse_frontmatter():
+    """Test that a frontmatter block is split from the content, and kept when it isn't closed."""
+    metadata, content = parse_frontmatter(ADR)
+    assert metadata == {"id": "decision-log", "description": "Architecture decision record", "version": "1.2.0"}
+    assert content == "# [Short title]\n"
+
+    unclosed = "---\nid: decision-log\n\n# [Short title]\n"
+    assert parse_frontmatter(unclosed) == ({}, unclosed)
+    assert parse_frontmatter("# No frontmatter\n---\n") == ({}, "# No frontmatter\n---\n")
+
+
+def test_id_defaults_to_file_name_and_first_file_wins(tmp_path):
+    """Test that the id is the file name without frontmatter, and the first file in name order wins a duplicate id."""
+    _write(tmp_path, "adr.md", ADR)
+    _write(tmp_path, "incident.md", "# Incident Report\n")
+    _write(tmp_path, "zz-adr-copy.md", ADR.replace("1.2.0", "9.9.9"))
+    store = TemplateStore(str(tmp_path), poll_seconds=0)
+
+    assert store.get("incident").file_name == "incident.md"
+    assert store.get("incident").version == ""
+    assert store.get("decision-log").file_name == "adr.md"
+    assert store.get("decision-log").version == "1.2.0"
+    assert store.get("adr") is None
+    assert [summary["id"] for summary in store.index()] == ["decision-log", "incident"]
+    # The hash is of the file, so a frontmatter change is a new version too
+    assert store.get("decision-log").sha256 == _sha256(ADR)
+
+
+class _Context:
+    async def debug(self, message):
+        pass
+
+    async def error(self, message):
+        pass
+
+
+def test_served_content_has_no_frontmatter(tmp_path, monkeypatch):
+    """Test that get_template and the sdlc://templates/{id} resource serve the content without frontmatter."""
+    _write(tmp_path, "adr.md", ADR.replace("\n", "\r\n"))
+    monkeypatch.setattr(server, "template_store", TemplateStore(str(tmp_path), poll_seconds=0))
+
+    result = asyncio.run(server.get_template(template_id="decision-log", ctx=_Context()))
+    assert result["content"] == "# [Short title]\n"
+    assert result["version"] == "1.2.0"
+    assert server.template_content("decision-log") == "# [Short title]\n"
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))
@@ -0,0 +1,272 @@
+"""Durable outbound queue for messages to the Slack workflow webhook.
+
+Messages are written to a sqlite file before the tool returns, so they survive
+a slow or failing Slack and restarts of the server. A background thread sends
+them: messages queued within a short window are coalesced into one post, posts
+are paced with a token bucket to stay under the Slack rate limits, and failed
+posts are retried with exponential backoff. Throttled posts (429) wait for
+Retry-After. Every message keeps its own delivery id, which can be used to look
+up its status.
+
+Delivery is at least once: a post that was in flight when the server stopped is
+sent again on the next start.
+"""
+import email.utils
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+COALESCE_SEPARATOR = "\n\n"
+MAX_BACKOFF_SECONDS = 300
+
+
+class TokenBucket:
+    """Allows rate posts per second on average, with bursts of up to capacity posts."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def delay(self) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def take(self) -> None:
+        self._tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """Hand out no tokens for the given seconds, as asked by a Retry-After header."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class Outbox:
+    """sqlite backed queue of Slack messages with a background sender.
+
+    Args:
+        db_path: sqlite file with the queued and delivered messages
+        post: Posts the content of one message to Slack and returns the response
+        rate_per_second: Average posts per second
+        burst: Posts that can be sent at once after an idle period
+        coalesce_seconds: Messages queued within this window after the first one are sent as one post
+        max_chars: Maximum length of a coalesced post
+        max_attempts: Attempts before a message is marked as failed
+        backoff_seconds: Delay before the first retry, doubled for every further attempt
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        post: Callable[[str], httpx.Response],
+        rate_per_second: float = 1.0,
+        burst: float = 1.0,
+        coalesce_seconds: float = 2.0,
+        max_chars: int = 3000,
+        max_attempts: int = 5,
+        backoff_seconds: float = 2.0,
+    ):
+        self.post = post
+        self.coalesce_seconds = coalesce_seconds
+        self.max_chars = max_chars
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._sender: Optional[threading.Thread] = None
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id TEXT PRIMARY KEY, content TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, next_attempt_at REAL NOT NULL, sent_at REAL, batch_id TEXT, last_error TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt_at)")
+            # Posts interrupted by a restart are sent again
+            self._db.execute("UPDATE messages SET status = ? WHERE status = ?", (QUEUED, SENDING))
+
+    def enqueue(self, content: str) -> str:
+        """Persist a message for sending and return its delivery id."""
+        delivery_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO messages (id, content, status, created_at, next_attempt_at) VALUES (?, ?, ?, ?, ?)",
+                (delivery_id, content, QUEUED, now, now),
+            )
+        self._wakeup.set()
+        return delivery_id
+
+    def status(self, delivery_id: str) -> Optional[Dict[str, Any]]:
+        """Delivery status of a message, or None if the id is unknown."""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM messages WHERE id = ?", (delivery_id,)).fetchone()
+            batch_size = None
+            if row is not None and row["batch_id"]:
+                batch_size = self._db.execute("SELECT COUNT(*) FROM messages WHERE batch_id = ?", (row["batch_id"],)).fetchone()[0]
+        if row is None:
+            return None
+        return {
+            "deliveryId": row["id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "createdAt": _iso(row["created_at"]),
+            "nextAttemptAt": _iso(row["next_attempt_at"]) if row["status"] == QUEUED else None,
+            "sentAt": _iso(row["sent_at"]),
+            "coalescedWith": batch_size - 1 if batch_size else 0,
+            "lastError": row["last_error"],
+        }
+
+    def pending(self) -> int:
+        """Messages that are queued or being sent."""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM messages WHERE status IN (?, ?)", (QUEUED, SENDING)).fetchone()[0]
+
+    def start(self) -> "Outbox":
+        """Start the background sender thread."""
+        if self._sender is None:
+            self._sender = threading.Thread(target=self._run, name="slack-outbox", daemon=True)
+            self._sender.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._sender is not None:
+            self._sender.join(timeout)
+            self._sender = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                wait = self.send_due()
+            except Exception:
+                # Keep the sender alive, the messages stay queued in the database
+                wait = self.backoff_seconds
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def send_due(self) -> Optional[float]:
+        """Send the next post if it's due. Returns the seconds until the next post is due, None if nothing is queued."""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, content, created_at, attempts FROM messages WHERE status = ? AND next_attempt_at <= ? ORDER BY created_at",
+                (QUEUED, now),
+            ).fetchall()
+            if not rows:
+                upcoming = self._db.execute("SELECT MIN(next_attempt_at) FROM messages WHERE status = ?", (QUEUED,)).fetchone()[0]
+                return None if upcoming is None else max(0.0, upcoming - now)
+
+        # Wait for messages following the first one in quick succession, unless it's a retry
+        coalesce_wait = rows[0]["created_at"] + self.coalesce_seconds - now
+        if rows[0]["attempts"] == 0 and coalesce_wait > 0:
+            return coalesce_wait
+        delay = self.bucket.delay()
+        if delay > 0:
+            return delay
+
+        batch = _coalesce(rows, self.max_chars)
+        ids = [row["id"] for row in batch]
+        batch_id = uuid.uuid4().hex
+        content = COALESCE_SEPARATOR.join(row["content"] for row in batch)
+        self._update(ids, "status = ?, batch_id = ?", (SENDING, batch_id))
+        self.bucket.take()
+        try:
+            response = self.post(content)
+        except Exception as e:
+            # Any error, not only network errors, so the messages never stay in flight
+            self._retry(batch, f"{type(e).__name__}: {e}")
+            return 0.0
+
+        if response.status_code == 200:
+            self._update(ids, "status = ?, attempts = attempts + 1, sent_at = ?, last_error = NULL", (SENT, time.time()))
+        elif response.status_code == 429:
+            retry_after = _retry_after(response)
+            self.bucket.block(retry_after)
+            self._retry(batch, f"Throttled by Slack, retrying after {retry_after:.0f}s", retry_after)
+        elif response.status_code >= 500:
+            self._retry(batch, f"{response.status_code}: {response.text[:200]}")
+        else:
+            # Other client errors won't succeed when repeated
+            self._update(ids, "status = ?, attempts = attempts + 1, last_error = ?", (FAILED, f"{response.status_code}: {response.text[:200]}"))
+        return 0.0
+
+    def _retry(self, batch: List[sqlite3.Row], error: str, delay: Optional[float] = None) -> None:
+        now = time.time()
+        for row in batch:
+            attempts = row["attempts"] + 1
+            if attempts >= self.max_attempts:
+                self._update([row["id"]], "status = ?, attempts = ?, last_error = ?", (FAILED, attempts, error))
+            else:
+                retry_delay = delay if delay is not None else min(MAX_BACKOFF_SECONDS, self.backoff_seconds * 2 ** (attempts - 1))
+                self._update(
+                    [row["id"]],
+                    "status = ?, attempts = ?, next_attempt_at = ?, batch_id = NULL, last_error = ?",
+                    (QUEUED, attempts, now + retry_delay, error),
+                )
+
+    def _update(self, ids: List[str], assignments: str, parameters: tuple) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                f"UPDATE messages SET {assignments} WHERE id IN ({', '.join('?' for _ in ids)})",
+                (*parameters, *ids),
+            )
+
+
+def _coalesce(rows: List[sqlite3.Row], max_chars: int) -> List[sqlite3.Row]:
+    # The oldest message, followed by the next ones while the post stays within max_chars
+    batch = [rows[0]]
+    length = len(rows[0]["content"])
+    for row in rows[1:]:
+        length += len(COALESCE_SEPARATOR) + len(row["content"])
+        if length > max_chars:
+            break
+        batch.append(row)
+    return batch
+
+
+def _retry_after(response: httpx.Response) -> float:
+    seconds = _parse_retry_after(response.headers.get("Retry-After"))
+    return 30.0 if seconds is None else min(MAX_BACKOFF_SECONDS, max(1.0, seconds))
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
@@ -2,11 +2,13 @@
 import os
 from typing import Dict, Any, Optional
 
-import requests
+import httpx
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP, Context
 from pydantic import Field
 
+from outbox import Outbox
+
 # Load environment variables
 load_dotenv()
 
@@ -18,6 +20,31 @@ MY_SLACK_MEMBER_ID = os.getenv("MY_SLACK_MEMBER_ID")
 if not SLACK_WORKFLOW_SECRET_WEB_REQUEST_URI or not MY_SLACK_MEMBER_ID:
     raise ValueError("SLACK_WORKFLOW_SECRET_WEB_REQUEST_URI and MY_SLACK_MEMBER_ID must be set in .env file")
 
+# HTTP client of the outbox sender thread, tool calls never wait for Slack
+http_client = httpx.Client(timeout=httpx.Timeout(30.0, connect=10.0))
+
+
+def _post_to_slack(content: str) -> httpx.Response:
+    payload = {
+        "content": content,
+        "posted-by": MY_SLACK_MEMBER_ID
+    }
+    return http_client.post(SLACK_WORKFLOW_SECRET_WEB_REQUEST_URI, json=payload)
+
+
+# Messages are persisted in a local queue and sent by a background thread, coalescing
+# messages posted in quick succession and pacing the posts to the Slack rate limits
+outbox = Outbox(
+    os.getenv("SLACK_OUTBOX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "slack-outbox.sqlite3")),
+    _post_to_slack,
+    rate_per_second=float(os.getenv("SLACK_OUTBOX_RATE_PER_SECOND", "1")),
+    burst=float(os.getenv("SLACK_OUTBOX_BURST", "3")),
+    coalesce_seconds=float(os.getenv("SLACK_OUTBOX_COALESCE_SECONDS", "2")),
+    max_chars=int(os.getenv("SLACK_OUTBOX_MAX_CHARS", "3000")),
+    max_attempts=int(os.getenv("SLACK_OUTBOX_MAX_ATTEMPTS", "8")),
+    backoff_seconds=float(os.getenv("SLACK_OUTBOX_BACKOFF_SECONDS", "2")),
+).start()
+
 # Create an MCP server
 mcp = FastMCP(
     name="ShareWithTeamSlack", 
@@ -28,7 +55,7 @@ mcp = FastMCP(
 
 
 @mcp.tool()
-def share_with_team_slack(
+async def share_with_team_slack(
     content: str = Field(description="The content to share with the team slack channel. It could be a quick message or a more technical analysis. Strive for high readability on slack and emojis are ok to use. Markdown syntax such as bold and italic must be avoided as it's not supported in Slack webhook"), 
     ctx: Context = Field(description="MCP context"),
 ) -> Dict[str, Any]:
@@ -37,31 +64,30 @@ def share_with_team_slack(
     The team has solid technical knowledge and understanding.
     Do not add any additional information such as inferred urgency or importance. 
     Use short precise content with high readability on slack (emojis are ok to use. Markdown syntax such as bold and italic must be avoided as it's not supported in Slack webhook)
+    The content is queued and delivered in the background. Returns a delivery id that can be checked with share_with_team_slack_status.
     """
-    return _slack_workflow_call(content, ctx)
-
-
-def _slack_workflow_call(content: str, ctx: Context):
+    return await _slack_workflow_call(content, ctx)
 
-    # Construct the REST API URL
-    url = SLACK_WORKFLOW_SECRET_WEB_REQUEST_URI
 
-    ctx.debug(f"Preparing request to slack webhook")
-
-    # Set the parameters and headers, including the API key
-    payload = {
-        "content": content,
-        "posted-by": MY_SLACK_MEMBER_ID
-    }
+@mcp.tool()
+async def share_with_team_slack_status(
+    delivery_id: str = Field(description="The delivery id returned by share_with_team_slack"),
+    ctx: Context = Field(description="MCP context"),
+) -> Dict[str, Any]:
+    """Get the delivery status of content shared with share_with_team_slack.
+    The status is queued (waiting to be sent or retried), sending, sent or failed, with the number of attempts and the last error.
+    """
+    status = outbox.status(delivery_id)
+    if status is None:
+        return {"error": f"Unknown delivery id '{delivery_id}'"}
+    return status
 
-    # Make the POST request - using json parameter to send JSON data in the request body
-    response = requests.post(url, json=payload)
 
-    if response.status_code == 200:
-        return response.json()
-    else:
-        ctx.error(f"Error: {response.status_code}, {response.text}")
-        return None
+async def _slack_workflow_call(content: str, ctx: Context) -> Dict[str, Any]:
+    # Persisting the message is all that happens in the tool call, the outbox sender posts it
+    delivery_id = outbox.enqueue(content)
+    await ctx.debug(f"Queued message {delivery_id} for the slack webhook, {outbox.pending()} pending")
+    return {"deliveryId": delivery_id, "status": "queued"}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+import email.utils
+import time
+
+import httpx
+import pytest
+
+from outbox import COALESCE_SEPARATOR, FAILED, QUEUED, SENT, Outbox, TokenBucket
+
+
+class FakeSlack:
+    """Records posts and answers with the queued responses, then with 200."""
+
+    def __init__(self, *responses):
+        self.posts = []
+        self.responses = list(responses)
+
+    def __call__(self, content):
+        self.posts.append(content)
+        response = self.responses.pop(0) if self.responses else httpx.Response(200)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def _outbox(tmp_path, slack, **settings):
+    settings = {"rate_per_second": 1000, "burst": 1000, "coalesce_seconds": 0, "backoff_seconds": 0, **settings}
+    return Outbox(str(tmp_path / "outbox.sqlite3"), slack, **settings)
+
+
+def test_messages_are_coalesced_within_max_chars(tmp_path):
+    """Test that queued messages go out as one post, split when the post would exceed max_chars."""
+    slack = FakeSlack()
+    outbox = _outbox(tmp_path, slack, max_chars=12)
+    ids = [outbox.enqueue(content) for content in ("one", "two", "three-long")]
+
+    while outbox.send_due() is not None:
+        pass
+
+    assert slack.posts == [COALESCE_SEPARATOR.join(["one", "two"]), "three-long"]
+    assert [outbox.status(delivery_id)["status"] for delivery_id in ids] == [SENT, SENT, SENT]
+    assert outbox.status(ids[0])["coalescedWith"] == 1
+    assert outbox.status(ids[2])["coalescedWith"] == 0
+    assert outbox.status(ids[0])["attempts"] == 1
+
+
+def test_coalesce_window_waits_for_more_messages(tmp_path):
+    """Test that the first message waits for the coalesce window before it is sent."""
+    slack = FakeSlack()
+    outbox = _outbox(tmp_path, slack, coalesce_seconds=60)
+    outbox.enqueue("one")
+
+    wait = outbox.send_due()
+
+    assert 0 < wait <= 60
+    assert slack.posts == []
+
+
+def test_server_errors_and_network_errors_are_retried_with_backoff(tmp_path):
+    """Test that 5xx responses and network errors are retried with growing backoff until max_attempts."""
+    slack = FakeSlack(httpx.Response(503, text="unavailable"), httpx.ConnectError("refused"))
+    outbox = _outbox(tmp_path, slack, backoff_seconds=10)
+    delivery_id = outbox.enqueue("hello")
+
+    outbox.send_due()
+    status = outbox.status(delivery_id)
+    assert status["status"] == QUEUED and status["attempts"] == 1
+    assert status["lastError"].startswith("503")
+    # Not due before the backoff has passed
+    assert outbox.send_due() == pytest.approx(10, abs=1)
+
+    outbox._update([delivery_id], "next_attempt_at = ?", (time.time(),))
+    outbox.send_due()
+    status = outbox.status(delivery_id)
+    assert status["attempts"] == 2 and "ConnectError" in status["lastError"]
+    assert outbox.send_due() == pytest.approx(20, abs=1)
+
+    outbox._update([delivery_id], "next_attempt_at = ?", (time.time(),))
+    outbox.send_due()
+    assert outbox.status(delivery_id)["status"] == SENT
+    assert slack.posts == ["hello"] * 3
+
+
+def test_unexpected_errors_requeue_the_batch(tmp_path):
+    """Test that an error other than an httpx error while posting queues the messages again instead of leaving them in flight."""
+    slack = FakeSlack(ValueError("bad payload"))
+    outbox = _outbox(tmp_path, slack)
+    delivery_id = outbox.enqueue("hello")
+
+    outbox.send_due()
+
+    status = outbox.status(delivery_id)
+    assert status["status"] == QUEUED and status["attempts"] == 1
+    assert status["lastError"] == "ValueError: bad payload"
+    outbox._update([delivery_id], "next_attempt_at = ?", (time.time(),))
+    outbox.send_due()
+    assert outbox.status(delivery_id)["status"] == SENT
+
+
+def test_gives_up_after_max_attempts_and_on_client_errors(tmp_path):
+    """Test that a message fails after max_attempts, and right away on a 4xx other than 429."""
+    slack = FakeSlack(httpx.Response(500), httpx.Response(500), httpx.Response(400, text="invalid_payload"))
+    outbox = _outbox(tmp_path, slack, max_attempts=2)
+    retried = outbox.enqueue("retried")
+    outbox.send_due()
+    outbox.send_due()
+    assert outbox.status(retried)["status"] == FAILED
+    assert outbox.status(retried)["attempts"] == 2
+
+    rejected = outbox.enqueue("rejected")
+    outbox.send_due()
+    assert outbox.status(rejected)["status"] == FAILED
+    assert outbox.status(rejected)["attempts"] == 1
+    assert outbox.pending() == 0
+
+
+@pytest.mark.parametrize("retry_after", ["7", email.utils.formatdate(time.time() + 7, usegmt=True)])
+def test_throttled_posts_wait_for_retry_after(tmp_path, retry_after):
+    """Test that a 429 retries after Retry-After, given in seconds or as an HTTP date, and pauses all posts."""
+    slack = FakeSlack(httpx.Response(429, headers={"Retry-After": retry_after}))
+    outbox = _outbox(tmp_path, slack)
+    delivery_id = outbox.enqueue("hello")
+
+    outbox.send_due()
+
+    status = outbox.status(delivery_id)
+    assert status["status"] == QUEUED and "Throttled" in status["lastError"]
+    assert outbox.send_due() == pytest.approx(7, abs=1.5)
+    assert outbox.bucket.delay() == pytest.approx(7, abs=1.5)
+
+
+def test_queued_messages_survive_restart(tmp_path):
+    """Test that messages queued or in flight when the server stopped are sent after a restart."""
+    slack = FakeSlack()
+    first = _outbox(tmp_path, slack)
+    queued = first.enqueue("queued")
+    in_flight = first.enqueue("in flight")
+    first._update([in_flight], "status = 'sending'", ())
+
+    restarted = _outbox(tmp_path, slack)
+    assert restarted.pending() == 2
+    restarted.send_due()
+    assert restarted.status(queued)["status"] == SENT
+    assert restarted.status(in_flight)["status"] == SENT
+
+
+def test_token_bucket_paces_posts():
+    """Test that the token bucket allows a burst and then one post per 1/rate seconds."""
+    bucket = TokenBucket(rate=2, capacity=2)
+    for _ in range(2):
+        assert bucket.delay() == 0
+        bucket.take()
+    assert bucket.delay() == pytest.approx(0.5, abs=0.05)
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(["-v", __file__]))